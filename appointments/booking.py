@@ -0,0 +1,99 @@
+"""
+Race-free booking.
+
+Serializer validation checks a slot against the in-process slot index, which
+rejects most conflicts cheaply. Two requests for the same slot can still both
+pass that check, so every write that makes an appointment hold a slot goes
+through ``run_locked``. It takes the ScheduleDay row of each (doctor, date)
+involved, checks again against the database and only then writes. Bookings of
+the same doctor and day queue behind each other. Other doctors and days are
+not affected.
+
+The lock is taken with an UPDATE that bumps the row's version. On PostgreSQL
+this is the same row lock as SELECT ... FOR UPDATE. SQLite ignores FOR UPDATE,
+but the UPDATE takes its write lock before the check runs. Lock timeouts,
+deadlocks and "database is locked" errors roll the attempt back and retry it a
+bounded number of times with jittered backoff.
+"""
+import random
+import time
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+from django.db.models import F, Q
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+from .conflicts import to_date
+from .models import Appointment, ScheduleDay
+
+# Two query parameters per day; stays under SQLite's variable limit
+LOCK_BATCH_SIZE = 400
+
+
+class ScheduleBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "The doctor's schedule is busy, please try again."
+    default_code = 'schedule_busy'
+
+
+def max_attempts():
+    return getattr(settings, 'BOOKING_MAX_ATTEMPTS', 5)
+
+
+def lock_days(keys):
+    """Create missing ScheduleDay rows for ``keys`` and lock them until the transaction ends."""
+    keys = sorted({(doctor_id, to_date(day)) for doctor_id, day in keys})
+    ScheduleDay.objects.bulk_create(
+        [ScheduleDay(doctor_id=doctor_id, date=day) for doctor_id, day in keys],
+        ignore_conflicts=True
+    )
+    # Locks are taken in key order, so two multi-day writers cannot deadlock
+    for start in range(0, len(keys), LOCK_BATCH_SIZE):
+        batch = keys[start:start + LOCK_BATCH_SIZE]
+        ScheduleDay.objects.filter(
+            reduce(or_, (Q(doctor_id=doctor_id, date=day) for doctor_id, day in batch))
+        ).update(version=F('version') + 1)
+
+
+def run_locked(keys, operation):
+    """Run ``operation`` in a transaction holding the schedule locks of ``keys``."""
+    attempts = max_attempts()
+    # Inside an outer transaction a failed attempt cannot be retried on its own
+    retry = not connection.in_atomic_block
+    for attempt in range(1, attempts + 1):
+        try:
+            with transaction.atomic():
+                lock_days(keys)
+                return operation()
+        except OperationalError:
+            if not retry:
+                raise
+            if attempt == attempts:
+                raise ScheduleBusy()
+            time.sleep(random.uniform(0, 0.01 * 2 ** attempt))
+
+
+def overlapping(doctor_id, appointment_date, start_time, end_time, exclude_id=None):
+    """Authoritative overlap check against the database, for use under the day lock."""
+    appointments = Appointment.objects.filter(
+        doctor_id=doctor_id,
+        appointment_date=appointment_date,
+        status__in=Appointment.ACTIVE_STATUSES,
+        start_time__lt=end_time,
+        end_time__gt=start_time
+    )
+    if exclude_id is not None:
+        appointments = appointments.exclude(pk=exclude_id)
+    return appointments.exists()
+
+
+def book(doctor_id, appointment_date, start_time, end_time, save, exclude_id=None):
+    """Call ``save`` under the day lock unless an active appointment overlaps the slot."""
+    def check_and_save():
+        if overlapping(doctor_id, appointment_date, start_time, end_time, exclude_id):
+            raise ValidationError({'non_field_errors': ["This time slot is already booked"]})
+        return save()
+    return run_locked([(doctor_id, appointment_date)], check_and_save)
@@ -0,0 +1,206 @@
+"""
+Interval index used to detect double bookings without a range scan per request.
+
+Active appointments are grouped into one bucket per (doctor, date). A bucket keeps
+its intervals sorted by start time, so an overlap check is a binary search plus a
+short walk back bounded by the longest appointment of that day.
+
+Buckets live in process memory and are loaded lazily with a single query on the
+(doctor, appointment_date, start_time) index. Saves and deletes update them
+incrementally once the transaction commits. Every change also bumps a version
+counter in Django's cache, so with a shared cache (e.g. Redis) a worker notices
+changes made by other workers and reloads the affected bucket.
+
+Bulk writes skip model signals; call ``slot_index.invalidate`` after them.
+"""
+import threading
+from bisect import bisect_left
+from datetime import date, time
+
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from .models import Appointment
+
+VERSION_KEY = 'appointments:slots:{doctor_id}:{date}'
+
+
+def to_seconds(value):
+    if isinstance(value, str):
+        value = time.fromisoformat(value)
+    return value.hour * 3600 + value.minute * 60 + value.second
+
+
+def to_date(value):
+    if isinstance(value, str):
+        return date.fromisoformat(value)
+    return value
+
+
+class DaySlots:
+    """Active appointments of one doctor on one day, sorted by start time."""
+
+    __slots__ = ('entries', 'starts', 'by_id', 'max_length', 'version')
+
+    def __init__(self, rows=(), version=None):
+        self.entries = sorted((start, end, pk) for pk, start, end in rows)
+        self.starts = [entry[0] for entry in self.entries]
+        self.by_id = {pk: (start, end) for start, end, pk in self.entries}
+        self.max_length = max((end - start for start, end, _ in self.entries), default=0)
+        self.version = version
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, pk, start, end):
+        self.discard(pk)
+        entry = (start, end, pk)
+        position = bisect_left(self.entries, entry)
+        self.entries.insert(position, entry)
+        self.starts.insert(position, start)
+        self.by_id[pk] = (start, end)
+        self.max_length = max(self.max_length, end - start)
+
+    def discard(self, pk):
+        interval = self.by_id.pop(pk, None)
+        if interval is None:
+            return
+        position = bisect_left(self.entries, (interval[0], interval[1], pk))
+        del self.entries[position]
+        del self.starts[position]
+
+    def overlaps(self, start, end, exclude_id=None):
+        # Last interval that starts before the candidate ends
+        position = bisect_left(self.starts, end) - 1
+        # Nothing starting at or before this point can reach the candidate's start
+        lower_bound = start - self.max_length
+        while position >= 0 and self.starts[position] > lower_bound:
+            _, other_end, pk = self.entries[position]
+            if other_end > start and pk != exclude_id:
+                return True
+            position -= 1
+        return False
+
+
+class SlotIndex:
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.RLock()
+
+    def has_conflict(self, doctor_id, appointment_date, start_time, end_time, exclude_id=None):
+        bucket = self.bucket(doctor_id, appointment_date)
+        return bucket.overlaps(to_seconds(start_time), to_seconds(end_time), exclude_id)
+
+    def bucket(self, doctor_id, appointment_date):
+        key = (doctor_id, to_date(appointment_date))
+        version = self._current_version(key)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is not None and bucket.version == version:
+                return bucket
+        bucket = self._load(key, version)
+        # Rows read inside an open transaction may still be rolled back, so only
+        # cache buckets loaded from committed state.
+        if not connection.in_atomic_block:
+            with self._lock:
+                self._buckets[key] = bucket
+        return bucket
+
+    def record(self, appointment, previous_key=None):
+        """Reflect a saved appointment once its transaction commits."""
+        pk = appointment.pk
+        key = (appointment.doctor_id, to_date(appointment.appointment_date))
+        interval = None
+        if appointment.is_active:
+            interval = (to_seconds(appointment.start_time), to_seconds(appointment.end_time))
+        previous_key = self._normalize(previous_key)
+
+        def apply():
+            if previous_key is not None and previous_key != key:
+                self._apply(previous_key, pk, None)
+            self._apply(key, pk, interval)
+        transaction.on_commit(apply)
+
+    def forget(self, appointment, previous_key=None):
+        """Drop a deleted appointment once its transaction commits."""
+        pk = appointment.pk
+        keys = {
+            (appointment.doctor_id, to_date(appointment.appointment_date)),
+            self._normalize(previous_key),
+        }
+        keys.discard(None)
+
+        def apply():
+            for key in keys:
+                self._apply(key, pk, None)
+        transaction.on_commit(apply)
+
+    def invalidate(self, doctor_id, appointment_date):
+        key = (doctor_id, to_date(appointment_date))
+
+        def apply():
+            self._bump(key)
+            with self._lock:
+                self._buckets.pop(key, None)
+        transaction.on_commit(apply)
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+    def _apply(self, key, pk, interval):
+        version = self._bump(key)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                return
+            if bucket.version + 1 != version:
+                # Another process changed this bucket since we loaded it
+                del self._buckets[key]
+                return
+            if interval is None:
+                bucket.discard(pk)
+            else:
+                bucket.add(pk, *interval)
+            bucket.version = version
+
+    def _load(self, key, version):
+        doctor_id, appointment_date = key
+        rows = Appointment.objects.filter(
+            doctor_id=doctor_id,
+            appointment_date=appointment_date,
+            status__in=Appointment.ACTIVE_STATUSES
+        ).values_list('id', 'start_time', 'end_time')
+        return DaySlots(
+            ((pk, to_seconds(start), to_seconds(end)) for pk, start, end in rows),
+            version=version
+        )
+
+    def _current_version(self, key):
+        cache_key = self._cache_key(key)
+        version = cache.get(cache_key)
+        if version is None:
+            cache.add(cache_key, 0, timeout=None)
+            version = cache.get(cache_key, 0)
+        return version
+
+    def _bump(self, key):
+        cache_key = self._cache_key(key)
+        try:
+            return cache.incr(cache_key)
+        except ValueError:
+            cache.add(cache_key, 0, timeout=None)
+            return cache.incr(cache_key)
+
+    @staticmethod
+    def _normalize(key):
+        if key is None or key[0] is None or key[1] is None:
+            return None
+        return (key[0], to_date(key[1]))
+
+    @staticmethod
+    def _cache_key(key):
+        return VERSION_KEY.format(doctor_id=key[0], date=key[1].isoformat())
+
+
+slot_index = SlotIndex()
@@ -0,0 +1,85 @@
+"""
+Coalescing dispatcher for appointment confirmation tasks.
+
+Instead of one broker round-trip per new appointment, ids are handed over when
+their transaction commits and buffered in process memory. The buffer is sent
+to ``send_appointment_confirmations`` in chunks as soon as it holds
+``APPOINTMENT_CONFIRMATION_FLUSH_SIZE`` ids, and otherwise by a timer at most
+``APPOINTMENT_CONFIRMATION_FLUSH_INTERVAL`` seconds after the first id arrived.
+Appointments from rolled-back transactions never reach the buffer.
+"""
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+
+class ConfirmationDispatcher:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = []
+        self._timer = None
+
+    @property
+    def flush_size(self):
+        return max(settings.APPOINTMENT_CONFIRMATION_FLUSH_SIZE, 1)
+
+    @property
+    def flush_interval(self):
+        return settings.APPOINTMENT_CONFIRMATION_FLUSH_INTERVAL
+
+    def queue(self, appointment_id):
+        transaction.on_commit(lambda: self.add(appointment_id))
+
+    def queue_many(self, appointment_ids):
+        appointment_ids = list(appointment_ids)
+        transaction.on_commit(lambda: self.add(*appointment_ids))
+
+    def add(self, *appointment_ids):
+        with self._lock:
+            self._pending.extend(appointment_ids)
+            full = len(self._pending) >= self.flush_size
+            if not full:
+                self._start_timer()
+        if full or self.flush_interval <= 0:
+            self.flush()
+
+    def _start_timer(self):
+        # Called with the lock held
+        if self.flush_interval > 0 and self._timer is None:
+            self._timer = threading.Timer(self.flush_interval, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def pending(self):
+        with self._lock:
+            return list(self._pending)
+
+    def flush(self):
+        """Send everything buffered so far, one task per ``flush_size`` ids."""
+        from .tasks import send_appointment_confirmations
+
+        with self._lock:
+            pending, self._pending = self._pending, []
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        for start in range(0, len(pending), self.flush_size):
+            chunk = pending[start:start + self.flush_size]
+            try:
+                send_appointment_confirmations.delay(chunk)
+            except Exception:
+                # Keep the rest and retry on the timer rather than losing confirmations
+                logger.exception("Could not enqueue %d appointment confirmations", len(pending) - start)
+                with self._lock:
+                    self._pending[:0] = pending[start:]
+                    self._start_timer()
+                return
+
+
+confirmation_dispatcher = ConfirmationDispatcher()
+atexit.register(confirmation_dispatcher.flush)
@@ -0,0 +1,147 @@
+"""
+Set-based validation and bulk creation for appointment imports.
+
+Rows are first checked field by field without touching the database. The
+referenced doctors and patients, the doctors' weekly availability and the
+existing bookings of every (doctor, date) in the batch are then loaded with a
+fixed number of queries, and each row is checked in memory. Accepted rows are
+added to the same day buckets, so later rows that clash with an earlier row of
+the batch are rejected too. Valid rows are written with chunked bulk_create.
+
+The database checks and the insert run under the schedule locks of every day
+that gains a booking, so concurrent single bookings cannot slip in between.
+"""
+from doctors.availability import get_weekly_availabilities
+from doctors.calendar import invalidate_day as invalidate_calendar_day
+from doctors.models import Doctor
+from patients.models import Patient
+from .booking import run_locked
+from .conflicts import DaySlots, slot_index, to_seconds
+from .dispatch import confirmation_dispatcher
+from .models import Appointment
+from .serializers import AppointmentImportRowSerializer
+
+CHUNK_SIZE = 1000
+
+
+def chunks(values, size=CHUNK_SIZE):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def existing_ids(model, ids):
+    found = set()
+    for chunk in chunks(ids):
+        found.update(model.objects.filter(id__in=chunk).values_list('id', flat=True))
+    return found
+
+
+def existing_bookings(keys):
+    """Return {(doctor_id, date): DaySlots} of active appointments for the given keys."""
+    buckets = {key: DaySlots() for key in keys}
+    if not keys:
+        return buckets
+    dates = [appointment_date for _, appointment_date in keys]
+    for doctor_ids in chunks({doctor_id for doctor_id, _ in keys}):
+        rows = Appointment.objects.filter(
+            doctor_id__in=doctor_ids,
+            appointment_date__range=(min(dates), max(dates)),
+            status__in=Appointment.ACTIVE_STATUSES
+        ).values_list('id', 'doctor_id', 'appointment_date', 'start_time', 'end_time')
+        for pk, doctor_id, appointment_date, start_time, end_time in rows:
+            bucket = buckets.get((doctor_id, appointment_date))
+            if bucket is not None:
+                bucket.add(pk, to_seconds(start_time), to_seconds(end_time))
+    return buckets
+
+
+def parse_rows(rows):
+    """Field-level validation only: return ([(index, data)], {index: errors})."""
+    errors = {}
+    parsed = []
+    for index, row in enumerate(rows):
+        serializer = AppointmentImportRowSerializer(data=row)
+        if serializer.is_valid():
+            parsed.append((index, serializer.validated_data))
+        else:
+            errors[index] = serializer.errors
+    return parsed, errors
+
+
+def validate_rows(rows):
+    """Return ([(index, data)] of valid rows, {index: errors})."""
+    parsed, errors = parse_rows(rows)
+    return check_rows(parsed, errors, existing_ids(Doctor, {data['doctor'] for _, data in parsed}))
+
+
+def check_rows(parsed, errors, doctors):
+    """Check parsed rows against the database; ``doctors`` are the ids that exist."""
+    patients = existing_ids(Patient, {data['patient'] for _, data in parsed})
+    availability = get_weekly_availabilities(doctors)
+    # Completed and cancelled rows (e.g. history) do not hold a slot
+    buckets = existing_bookings({
+        (data['doctor'], data['appointment_date'])
+        for _, data in parsed
+        if data['status'] in Appointment.ACTIVE_STATUSES and data['doctor'] in doctors
+    })
+
+    valid = []
+    for index, data in parsed:
+        if data['doctor'] not in doctors:
+            errors[index] = {'doctor': ["Doctor not found"]}
+            continue
+        if data['patient'] not in patients:
+            errors[index] = {'patient': ["Patient not found"]}
+            continue
+        if data['status'] in Appointment.ACTIVE_STATUSES:
+            if not availability[data['doctor']].covers(data['appointment_date'], data['start_time'], data['end_time']):
+                errors[index] = {'non_field_errors': ["Doctor is not available at this time"]}
+                continue
+            bucket = buckets[(data['doctor'], data['appointment_date'])]
+            start, end = to_seconds(data['start_time']), to_seconds(data['end_time'])
+            if bucket.overlaps(start, end):
+                errors[index] = {'non_field_errors': ["This time slot is already booked"]}
+                continue
+            # Negative keys keep batch rows apart from stored appointment ids
+            bucket.add(-index - 1, start, end)
+        valid.append((index, data))
+    return valid, errors
+
+
+def import_appointments(rows):
+    """Create every valid row and return (created appointments, {index: errors})."""
+    parsed, errors = parse_rows(rows)
+    doctors = existing_ids(Doctor, {data['doctor'] for _, data in parsed})
+    # Every day that gains a booking stays locked from the overlap check to the insert
+    days = {
+        (data['doctor'], data['appointment_date'])
+        for _, data in parsed
+        if data['status'] in Appointment.ACTIVE_STATUSES and data['doctor'] in doctors
+    }
+    return run_locked(days, lambda: create_rows(parsed, dict(errors), doctors))
+
+
+def create_rows(parsed, errors, doctors):
+    valid, errors = check_rows(parsed, errors, doctors)
+    created = []
+    for chunk in chunks(valid):
+        created += Appointment.objects.bulk_create([
+            Appointment(
+                doctor_id=data['doctor'],
+                patient_id=data['patient'],
+                appointment_date=data['appointment_date'],
+                start_time=data['start_time'],
+                end_time=data['end_time'],
+                status=data['status'],
+                reason=data['reason'],
+                notes=data['notes']
+            )
+            for _, data in chunk
+        ])
+    # bulk_create skips the model signals that maintain these
+    for key in {(data['doctor'], data['appointment_date']) for _, data in valid}:
+        slot_index.invalidate(*key)
+        invalidate_calendar_day(*key)
+    confirmation_dispatcher.queue_many(appointment.id for appointment in created)
+    return created, errors
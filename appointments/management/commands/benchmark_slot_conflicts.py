@@ -0,0 +1,107 @@
+import random
+import time
+from datetime import date, time as dtime, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from appointments.conflicts import slot_index, to_seconds
+from appointments.models import Appointment
+from doctors.models import Doctor, Specialization
+from patients.models import Patient
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = "Compare the slot index against the range-scan query for double-booking checks"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--appointments', type=int, default=10000,
+                            help='Appointments seeded for the benchmarked doctor')
+        parser.add_argument('--days', type=int, default=20,
+                            help='Number of days the appointments are spread over')
+        parser.add_argument('--probes', type=int, default=2000,
+                            help='Number of conflict checks timed per strategy')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        # Everything is seeded inside a transaction that is rolled back at the end
+        with transaction.atomic():
+            doctor, days = self.seed(options['appointments'], options['days'])
+            probes = [self.random_probe(rng, doctor.id, days) for _ in range(options['probes'])]
+
+            query_time, query_hits = self.time_queries(probes)
+            # Buckets loaded in an open transaction are not cached, so warm them by hand
+            buckets = {day: slot_index._load((doctor.id, day), version=None) for day in days}
+            index_time, index_hits = self.time_index(probes, buckets)
+
+            transaction.set_rollback(True)
+
+        if query_hits != index_hits:
+            self.stderr.write(self.style.ERROR(
+                f"Mismatch: query path found {query_hits} conflicts, index found {index_hits}"
+            ))
+        per_day = options['appointments'] // max(options['days'], 1)
+        self.stdout.write(f"{options['appointments']} appointments, ~{per_day} per day, "
+                          f"{len(probes)} probes, {query_hits} conflicts")
+        self.stdout.write(f"range query: {query_time / len(probes) * 1e6:9.1f} us/check")
+        self.stdout.write(f"slot index:  {index_time / len(probes) * 1e6:9.1f} us/check")
+        if index_time:
+            self.stdout.write(self.style.SUCCESS(f"speedup: {query_time / index_time:.1f}x"))
+
+    def seed(self, count, day_count):
+        user = User.objects.create_user(username='bench-doctor', password='x', user_type='doctor')
+        specialization, _ = Specialization.objects.get_or_create(name='Benchmark')
+        doctor = Doctor.objects.create(user=user, specialization=specialization,
+                                       license_number='BENCH-0001', consultation_fee=100)
+        patient_user = User.objects.create_user(username='bench-patient', password='x', user_type='patient')
+        patient = Patient.objects.create(user=patient_user, blood_type='O+')
+
+        start_day = date.today() + timedelta(days=1)
+        days = [start_day + timedelta(days=offset) for offset in range(day_count)]
+        per_day = -(-count // day_count)
+        # Back-to-back slots that fill the day evenly, second resolution
+        slot = max(86400 // per_day, 2)
+        rows = []
+        for index in range(count):
+            day = days[index // per_day]
+            offset = (index % per_day) * slot
+            rows.append(Appointment(
+                patient=patient,
+                doctor=doctor,
+                appointment_date=day,
+                start_time=seconds_to_time(offset),
+                end_time=seconds_to_time(offset + slot // 2),
+                status='scheduled'
+            ))
+        Appointment.objects.bulk_create(rows, batch_size=1000)
+        return doctor, days
+
+    def random_probe(self, rng, doctor_id, days):
+        start = rng.randrange(0, 86400 - 120)
+        return doctor_id, rng.choice(days), seconds_to_time(start), seconds_to_time(start + 60)
+
+    def time_queries(self, probes):
+        hits = 0
+        started = time.perf_counter()
+        for doctor_id, day, start_time, end_time in probes:
+            hits += Appointment.objects.filter(
+                doctor_id=doctor_id,
+                appointment_date=day,
+                start_time__lt=end_time,
+                end_time__gt=start_time,
+                status__in=Appointment.ACTIVE_STATUSES
+            ).exists()
+        return time.perf_counter() - started, hits
+
+    def time_index(self, probes, buckets):
+        hits = 0
+        started = time.perf_counter()
+        for _, day, start_time, end_time in probes:
+            hits += buckets[day].overlaps(to_seconds(start_time), to_seconds(end_time))
+        return time.perf_counter() - started, hits
+
+
+def seconds_to_time(seconds):
+    return dtime(seconds // 3600, seconds % 3600 // 60, seconds % 60)
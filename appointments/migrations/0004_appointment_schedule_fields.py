@@ -0,0 +1,69 @@
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0003_initial'),
+        ('doctors', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='appointment',
+            name='date',
+        ),
+        migrations.AddField(
+            model_name='appointment',
+            name='appointment_date',
+            field=models.DateField(default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='appointment',
+            name='start_time',
+            field=models.TimeField(default='00:00'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='appointment',
+            name='end_time',
+            field=models.TimeField(default='00:00'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='appointment',
+            name='status',
+            field=models.CharField(choices=[('scheduled', 'Scheduled'), ('confirmed', 'Confirmed'), ('completed', 'Completed'), ('cancelled', 'Cancelled')], default='scheduled', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='appointment',
+            name='reason',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='appointment',
+            name='notes',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='appointment',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='appointment',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AlterModelOptions(
+            name='appointment',
+            options={'ordering': ['appointment_date', 'start_time']},
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['doctor', 'appointment_date', 'start_time'], name='appt_doctor_date_start_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.10 on 2026-10-18 11:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0005_appointment_created_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(condition=models.Q(('status__in', ('scheduled', 'confirmed'))), fields=['doctor', 'appointment_date', 'start_time'], name='appt_active_doctor_day_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(condition=models.Q(('status__in', ('scheduled', 'confirmed'))), fields=['appointment_date', 'start_time'], name='appt_active_day_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.10 on 2026-10-18 11:53
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0007_scheduleday'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AppointmentReminder',
+            fields=[
+                ('appointment', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='reminder', serialize=False, to='appointments.appointment')),
+                ('sent_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ReminderWatermark',
+            fields=[
+                ('shard', models.PositiveIntegerField(primary_key=True, serialize=False)),
+                ('reached', models.DateTimeField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='appointment',
+            name='appt_active_day_idx',
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(condition=models.Q(('status__in', ('scheduled', 'confirmed'))), fields=['appointment_date', 'start_time', 'doctor'], name='appt_active_day_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.10 on 2026-10-18 12:29
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0008_appointment_reminders'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='appointment',
+            name='appt_active_doctor_day_idx',
+        ),
+    ]
@@ -1,20 +1,129 @@
 from django.db import models
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_init, post_save
 from django.dispatch import receiver
-from .tasks import send_appointment_confirmation
+from patients.models import prefetch_recent_records
 
 # Create your models here.
 
+class AppointmentQuerySet(models.QuerySet):
+    def visible_to(self, user):
+        # Staff see every appointment, doctors and patients only their own
+        if user.is_staff or user.user_type == 'admin':
+            return self
+        if user.user_type == 'doctor':
+            return self.filter(doctor__user_id=user.id)
+        return self.filter(patient__user_id=user.id)
+
+    def for_listing(self):
+        # AppointmentSerializer renders full doctor and patient details
+        return self.select_related(
+            'doctor__user', 'doctor__specialization', 'patient__user'
+        ).prefetch_related(prefetch_recent_records('patient__medical_records'))
+
 class Appointment(models.Model):
-    # Define your fields here
-    # For example:
-    date = models.DateTimeField()
+    STATUS_CHOICES = (
+        ('scheduled', 'Scheduled'),
+        ('confirmed', 'Confirmed'),
+        ('completed', 'Completed'),
+        ('cancelled', 'Cancelled'),
+    )
+    # Statuses that hold the doctor's time slot
+    ACTIVE_STATUSES = ('scheduled', 'confirmed')
+
     patient = models.ForeignKey('patients.Patient', on_delete=models.CASCADE)
     doctor = models.ForeignKey('doctors.Doctor', on_delete=models.CASCADE)
-    # Add other fields as needed
+    appointment_date = models.DateField()
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='scheduled')
+    reason = models.TextField(blank=True)
+    notes = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = AppointmentQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['appointment_date', 'start_time']
+        indexes = [
+            # Conflict checks, free-slot search and a doctor's day, active or not
+            models.Index(fields=['doctor', 'appointment_date', 'start_time'],
+                         name='appt_doctor_date_start_idx'),
+            models.Index(fields=['created_at', 'id'], name='appt_created_id_idx'),
+            # The doctor column lets the sharded reminder scan filter a time bucket inside the index
+            models.Index(fields=['appointment_date', 'start_time', 'doctor'],
+                         condition=models.Q(status__in=('scheduled', 'confirmed')),
+                         name='appt_active_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.patient} with {self.doctor} on {self.appointment_date} at {self.start_time}"
+
+    @property
+    def is_active(self):
+        return self.status in self.ACTIVE_STATUSES
+
+class ScheduleDay(models.Model):
+    """One row per (doctor, date) that bookings lock before checking for overlaps."""
+    doctor = models.ForeignKey('doctors.Doctor', on_delete=models.CASCADE, related_name='+')
+    date = models.DateField()
+    # Bumped by every booking that takes the lock
+    version = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('doctor', 'date')
+
+    def __str__(self):
+        return f"{self.doctor_id} on {self.date} (v{self.version})"
+
+class AppointmentReminder(models.Model):
+    """Marks a booking whose reminder has been sent; the primary key rules out a second one."""
+    appointment = models.OneToOneField(Appointment, on_delete=models.CASCADE, primary_key=True,
+                                       related_name='reminder')
+    sent_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Reminder for appointment {self.appointment_id}"
+
+class ReminderWatermark(models.Model):
+    """How far the reminder scan of one doctor id shard has got, see appointments/reminders.py."""
+    shard = models.PositiveIntegerField(primary_key=True)
+    # Start of the first time bucket not scanned yet
+    reached = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Shard {self.shard} reached {self.reached}"
 
 @receiver(post_save, sender=Appointment)
 def appointment_created(sender, instance, created, **kwargs):
     if created:
-        # Send confirmation email asynchronously
-        send_appointment_confirmation.delay(instance.id)
+        # Send confirmation email asynchronously, batched with other new bookings
+        from .dispatch import confirmation_dispatcher
+        confirmation_dispatcher.queue(instance.id)
+
+@receiver(post_init, sender=Appointment)
+def remember_appointment_slot(sender, instance, **kwargs):
+    # Keep the (doctor, date) the row was loaded with so a move can clear the old bucket
+    instance._slot_key = (instance.doctor_id, instance.appointment_date)
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+def invalidate_calendar_days(sender, instance, **kwargs):
+    # Registered before update_slot_index, which moves _slot_key on to the new day
+    from doctors.calendar import invalidate_day
+    for doctor_id, appointment_date in {instance._slot_key, (instance.doctor_id, instance.appointment_date)}:
+        # Appointments built empty and filled in before save() start from (None, None)
+        if doctor_id is not None and appointment_date is not None:
+            invalidate_day(doctor_id, appointment_date)
+
+@receiver(post_save, sender=Appointment)
+def update_slot_index(sender, instance, **kwargs):
+    from .conflicts import slot_index
+    slot_index.record(instance, previous_key=instance._slot_key)
+    instance._slot_key = (instance.doctor_id, instance.appointment_date)
+
+@receiver(post_delete, sender=Appointment)
+def remove_from_slot_index(sender, instance, **kwargs):
+    from .conflicts import slot_index
+    slot_index.forget(instance, previous_key=instance._slot_key)
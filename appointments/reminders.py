@@ -0,0 +1,129 @@
+"""
+Appointment reminders, sent about ``APPOINTMENT_REMINDER_LEAD_HOURS`` ahead.
+
+The ``schedule_appointment_reminders`` beat task fans out one
+``send_appointment_reminders`` task per shard of doctor ids: shard ``n``
+covers doctors ``n * APPOINTMENT_REMINDER_SHARD_SIZE`` up to the next shard,
+so shards run in parallel on separate workers.
+
+A shard scans active bookings in time buckets of
+``APPOINTMENT_REMINDER_BUCKET_MINUTES`` by their start, aligned to midnight.
+A bucket is one range read of the (appointment_date, start_time, doctor)
+index of active bookings, so a scan never touches other days or cancelled
+rows. Its ReminderWatermark holds the start of the first bucket the shard has
+not scanned, and each run only scans from there to the bucket that starts
+within the lead time.
+
+Each bucket is one transaction: the watermark row is locked, an
+AppointmentReminder is recorded per booking and the watermark moves past the
+bucket. An overlapping run of the same shard waits for the lock and then finds
+the bucket done, and AppointmentReminder's primary key rules out a second
+reminder for a booking either way. Emails go out after the commit, so a crash
+can lose a reminder but never repeat one. Bookings made after their bucket was
+scanned get the booking confirmation only.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from doctors.models import Doctor
+from .models import Appointment, AppointmentReminder, ReminderWatermark
+
+
+def bucket_size():
+    return timedelta(minutes=settings.APPOINTMENT_REMINDER_BUCKET_MINUTES)
+
+
+def floor_bucket(moment):
+    """Start of the bucket holding ``moment``."""
+    moment = timezone.localtime(moment)
+    midnight = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    return midnight + (moment - midnight) // bucket_size() * bucket_size()
+
+
+def horizon(now):
+    return now + timedelta(hours=settings.APPOINTMENT_REMINDER_LEAD_HOURS)
+
+
+def shard_range(shard):
+    size = settings.APPOINTMENT_REMINDER_SHARD_SIZE
+    return shard * size, (shard + 1) * size
+
+
+def shard_count():
+    last = Doctor.objects.aggregate(last=Max('id'))['last']
+    return 0 if last is None else last // settings.APPOINTMENT_REMINDER_SHARD_SIZE + 1
+
+
+def bucket_appointments(shard, start):
+    """Active bookings of ``shard`` starting in the bucket at ``start`` that have no reminder yet."""
+    start = timezone.localtime(start)
+    end = timezone.localtime(start + bucket_size())
+    low, high = shard_range(shard)
+    lookups = {'appointment_date': start.date(), 'start_time__gte': start.time()}
+    # The last bucket of a day ends at midnight
+    if end.date() == start.date():
+        lookups['start_time__lt'] = end.time()
+    return Appointment.objects.filter(
+        status__in=Appointment.ACTIVE_STATUSES,
+        doctor_id__gte=low,
+        doctor_id__lt=high,
+        reminder__isnull=True,
+        **lookups
+    )
+
+
+def remind_shard(shard, now=None):
+    """Scan the due buckets of ``shard`` and send their reminders; returns how many were sent."""
+    now = now or timezone.now()
+    ReminderWatermark.objects.get_or_create(shard=shard, defaults={'reached': floor_bucket(now)})
+    sent = 0
+    done = False
+    while not done:
+        with transaction.atomic():
+            watermark = ReminderWatermark.objects.select_for_update().get(shard=shard)
+            # Buckets that have already started have nothing left worth reminding
+            start = max(watermark.reached, floor_bucket(now))
+            if start > horizon(now):
+                return sent
+            appointment_ids = list(bucket_appointments(shard, start).order_by().values_list('id', flat=True))
+            if appointment_ids:
+                AppointmentReminder.objects.bulk_create(
+                    [AppointmentReminder(appointment_id=appointment_id) for appointment_id in appointment_ids]
+                )
+            watermark.reached = start + bucket_size()
+            watermark.save(update_fields=['reached', 'updated_at'])
+            done = watermark.reached > horizon(now)
+        if appointment_ids:
+            sent += send_reminders(appointment_ids)
+    return sent
+
+
+def send_reminders(appointment_ids):
+    appointments = Appointment.objects.filter(id__in=appointment_ids).select_related(
+        'patient__user', 'doctor__user'
+    )
+    messages = [
+        reminder_message(appointment)
+        for appointment in appointments
+        if appointment.patient.user.email
+    ]
+    if messages:
+        get_connection().send_messages(messages)
+    return len(messages)
+
+
+def reminder_message(appointment):
+    patient = appointment.patient.user
+    doctor = appointment.doctor.user
+    body = (
+        f"Dear {patient.get_full_name() or patient.username},\n\n"
+        f"This is a reminder of your appointment with Dr. {doctor.get_full_name()} on "
+        f"{appointment.appointment_date:%A, %d %B %Y} from "
+        f"{appointment.start_time:%H:%M} to {appointment.end_time:%H:%M}.\n"
+    )
+    return EmailMessage('Appointment reminder', body, to=[patient.email])
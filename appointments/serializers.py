@@ -1,11 +1,19 @@
 from rest_framework import serializers
 from .models import Appointment
+from .booking import book
+from .conflicts import slot_index
+from doctors.availability import is_available
 from doctors.serializers import DoctorSerializer
+from patients.models import Patient
 from patients.serializers import PatientSerializer
+from healthcaresystem.fieldsets import SparseFieldsetMixin
 
-class AppointmentSerializer(serializers.ModelSerializer):
+class AppointmentSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    # Patients booking for themselves may omit it; the view fills it in
+    patient = serializers.PrimaryKeyRelatedField(queryset=Patient.objects.all(), required=False)
     doctor_details = DoctorSerializer(source='doctor', read_only=True)
     patient_details = PatientSerializer(source='patient', read_only=True)
+    expandable_fields = ('doctor_details', 'patient_details')
 
     class Meta:
         model = Appointment
@@ -14,34 +22,76 @@ class AppointmentSerializer(serializers.ModelSerializer):
                  'reason', 'notes', 'created_at', 'updated_at')
         read_only_fields = ('id', 'created_at', 'updated_at')
 
+    def validate_status(self, value):
+        # Bookings start out scheduled, so a new one always goes through the slot checks
+        if self.instance is None and value != 'scheduled':
+            raise serializers.ValidationError("New appointments must be scheduled")
+        # Status changes have their own rules, see AppointmentStatusUpdateSerializer
+        if self.instance is not None and value != self.instance.status:
+            raise serializers.ValidationError("Use the appointment status endpoint to change the status")
+        return value
+
     def validate(self, attrs):
         # Check if the appointment time is within doctor's availability
-        doctor = attrs['doctor']
-        appointment_date = attrs['appointment_date']
-        start_time = attrs['start_time']
-        end_time = attrs['end_time']
+        doctor = self.current(attrs, 'doctor')
+        appointment_date = self.current(attrs, 'appointment_date')
+        start_time = self.current(attrs, 'start_time')
+        end_time = self.current(attrs, 'end_time')
+
+        if start_time >= end_time:
+            raise serializers.ValidationError("End time must be after start time")
+
+        if self.instance is not None and self.instance.status == 'completed':
+            raise serializers.ValidationError("Cannot change a completed appointment")
+
+        # Cancelled bookings hold no slot
+        if self.resulting_status(attrs) not in Appointment.ACTIVE_STATUSES:
+            return attrs
 
         # Check if doctor is available at the requested time
-        if not doctor.availabilities.filter(
-            day=appointment_date.strftime('%A').lower(),
-            start_time__lte=start_time,
-            end_time__gte=end_time,
-            is_available=True
-        ).exists():
+        if not is_available(doctor.id, appointment_date, start_time, end_time):
             raise serializers.ValidationError("Doctor is not available at this time")
 
         # Check for scheduling conflicts
-        if Appointment.objects.filter(
-            doctor=doctor,
-            appointment_date=appointment_date,
-            start_time__lt=end_time,
-            end_time__gt=start_time,
-            status__in=['scheduled', 'confirmed']
-        ).exclude(id=self.instance.id if self.instance else None).exists():
+        if slot_index.has_conflict(
+            doctor.id,
+            appointment_date,
+            start_time,
+            end_time,
+            exclude_id=self.instance.id if self.instance else None
+        ):
             raise serializers.ValidationError("This time slot is already booked")
 
         return attrs
 
+    def resulting_status(self, attrs):
+        return attrs.get('status', self.instance.status if self.instance else 'scheduled')
+
+    def current(self, attrs, field):
+        # Partial updates validate against the stored value of omitted fields
+        if field in attrs or self.instance is None:
+            return attrs[field]
+        return getattr(self.instance, field)
+
+    def create(self, validated_data):
+        return self.book(validated_data, lambda: super(AppointmentSerializer, self).create(validated_data))
+
+    def update(self, instance, validated_data):
+        return self.book(validated_data, lambda: super(AppointmentSerializer, self).update(instance, validated_data))
+
+    def book(self, validated_data, save):
+        # validate() checked the slot index; recheck under the day lock before writing
+        if self.resulting_status(validated_data) not in Appointment.ACTIVE_STATUSES:
+            return save()
+        return book(
+            self.current(validated_data, 'doctor').id,
+            self.current(validated_data, 'appointment_date'),
+            self.current(validated_data, 'start_time'),
+            self.current(validated_data, 'end_time'),
+            save,
+            exclude_id=self.instance.id if self.instance else None
+        )
+
 class AppointmentStatusUpdateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Appointment
@@ -50,4 +100,40 @@ class AppointmentStatusUpdateSerializer(serializers.ModelSerializer):
     def validate_status(self, value):
         if self.instance and self.instance.status == 'completed' and value != 'completed':
             raise serializers.ValidationError("Cannot change status of a completed appointment")
-        return value 
\ No newline at end of file
+        request = self.context.get('request')
+        if request and request.user.user_type == 'patient' and value != 'cancelled':
+            raise serializers.ValidationError("Patients can only cancel appointments")
+        return value
+
+    def update(self, instance, validated_data):
+        def save():
+            return super(AppointmentStatusUpdateSerializer, self).update(instance, validated_data)
+        reactivated = validated_data.get('status') in Appointment.ACTIVE_STATUSES and not instance.is_active
+        if not reactivated:
+            return save()
+        # A cancelled slot may have been booked by someone else since
+        return book(instance.doctor_id, instance.appointment_date, instance.start_time, instance.end_time,
+                    save, exclude_id=instance.id)
+
+class AppointmentImportRowSerializer(serializers.Serializer):
+    """Field-level checks for one imported row; cross-row checks live in imports.py."""
+    patient = serializers.IntegerField(min_value=1)
+    doctor = serializers.IntegerField(min_value=1)
+    appointment_date = serializers.DateField()
+    start_time = serializers.TimeField()
+    end_time = serializers.TimeField()
+    status = serializers.ChoiceField(choices=Appointment.STATUS_CHOICES, default='scheduled')
+    reason = serializers.CharField(required=False, allow_blank=True, default='')
+    notes = serializers.CharField(required=False, allow_blank=True, default='')
+
+    def validate(self, attrs):
+        if attrs['start_time'] >= attrs['end_time']:
+            raise serializers.ValidationError("End time must be after start time")
+        return attrs
+
+class AppointmentImportSerializer(serializers.Serializer):
+    appointments = serializers.ListField(
+        child=serializers.DictField(),
+        allow_empty=False,
+        max_length=10000
+    ) 
\ No newline at end of file
@@ -1,6 +1,48 @@
 from celery import shared_task
+from django.core.mail import EmailMessage, get_connection
 
 @shared_task
 def send_appointment_confirmation(appointment_id):
-    # Logic to send confirmation email
-    pass 
\ No newline at end of file
+    send_appointment_confirmations([appointment_id])
+
+@shared_task
+def send_appointment_confirmations(appointment_ids):
+    """Render and send confirmations for a batch of appointments over one mail connection."""
+    from .models import Appointment
+
+    appointments = Appointment.objects.filter(id__in=appointment_ids).select_related(
+        'patient__user', 'doctor__user'
+    )
+    messages = [
+        confirmation_message(appointment)
+        for appointment in appointments
+        if appointment.patient.user.email
+    ]
+    if messages:
+        get_connection().send_messages(messages)
+    return len(messages)
+
+@shared_task
+def schedule_appointment_reminders():
+    """Fan the reminder scan out to one task per shard of doctor ids; run by celery beat."""
+    from .reminders import shard_count
+    shards = shard_count()
+    for shard in range(shards):
+        send_appointment_reminders.delay(shard)
+    return shards
+
+@shared_task
+def send_appointment_reminders(shard):
+    from .reminders import remind_shard
+    return remind_shard(shard)
+
+def confirmation_message(appointment):
+    patient = appointment.patient.user
+    doctor = appointment.doctor.user
+    body = (
+        f"Dear {patient.get_full_name() or patient.username},\n\n"
+        f"Your appointment with Dr. {doctor.get_full_name()} is booked for "
+        f"{appointment.appointment_date:%A, %d %B %Y} from "
+        f"{appointment.start_time:%H:%M} to {appointment.end_time:%H:%M}.\n"
+    )
+    return EmailMessage('Appointment confirmation', body, to=[patient.email])
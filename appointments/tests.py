@@ -1,11 +1,24 @@
-from django.test import TestCase
+import threading
+from unittest import mock
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.core import mail
+from django.core.cache import cache
+from django.db import OperationalError, connection, transaction
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework.test import APITestCase
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
 from django.contrib.auth import get_user_model
 from django.utils import timezone
-from datetime import timedelta
-from .models import Appointment
+from datetime import datetime, timedelta
+from .booking import ScheduleBusy
+from .models import Appointment, AppointmentReminder, ReminderWatermark, ScheduleDay
+from .conflicts import DaySlots, slot_index
+from .dispatch import confirmation_dispatcher
+from .reminders import remind_shard
+from .tasks import schedule_appointment_reminders, send_appointment_confirmations
+from .serializers import AppointmentSerializer, AppointmentStatusUpdateSerializer
 from users.models import User
 from doctors.models import Doctor, Specialization, DoctorAvailability
 from patients.models import Patient
@@ -104,6 +117,24 @@ class AppointmentTests(APITestCase):
         self.assertEqual(self.appointment.status, 'confirmed')
         self.assertEqual(self.appointment.notes, 'Appointment confirmed')
 
+    def test_status_cannot_be_changed_through_the_detail_endpoint(self):
+        response = self.client.patch(self.appointment_detail_url, {'status': 'completed'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.appointment.refresh_from_db()
+        self.assertEqual(self.appointment.status, 'scheduled')
+
+    def test_patients_cannot_delete_appointments(self):
+        response = self.client.delete(self.appointment_detail_url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertTrue(Appointment.objects.filter(pk=self.appointment.pk).exists())
+
+    def test_cancelled_appointments_skip_slot_checks(self):
+        Appointment.objects.filter(pk=self.appointment.pk).update(status='cancelled')
+        self.availability.delete()
+        self.client.force_authenticate(user=self.doctor_user)
+        response = self.client.patch(self.appointment_detail_url, {'notes': 'Patient called in'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
     def test_cannot_schedule_outside_availability(self):
         new_appointment_data = {
             'doctor': self.doctor.id,
@@ -115,6 +146,18 @@ class AppointmentTests(APITestCase):
         response = self.client.post(self.appointment_url, new_appointment_data, format='json')
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_new_appointments_cannot_skip_the_slot_checks(self):
+        for status_value in ('cancelled', 'completed'):
+            response = self.client.post(self.appointment_url, {
+                'doctor': self.doctor.id,
+                'appointment_date': (timezone.now().date() + timedelta(days=2)).isoformat(),
+                'start_time': '08:00:00',  # Before doctor's availability
+                'end_time': '09:00:00',
+                'status': status_value,
+            }, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('status', response.data)
+
     def test_cannot_schedule_conflicting_appointment(self):
         # Create another appointment at the same time
         Appointment.objects.create(
@@ -137,3 +180,458 @@ class AppointmentTests(APITestCase):
         }
         response = self.client.post(self.appointment_url, new_appointment_data, format='json')
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_fields_select_nested_fields(self):
+        response = self.client.get(self.appointment_url, {'fields': 'id,status,doctor_details.user.first_name'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(dict(response.data['results'][0]), {
+            'id': self.appointment.id,
+            'status': 'scheduled',
+            'doctor_details': {'user': {'first_name': ''}},
+        })
+
+    def test_unexpanded_relations_are_not_fetched(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(self.appointment_url, {'expand': ''})
+        appointment = response.data['results'][0]
+        self.assertNotIn('doctor_details', appointment)
+        self.assertNotIn('patient_details', appointment)
+
+    def test_expand_controls_nested_expansions(self):
+        response = self.client.get(self.appointment_detail_url, {'expand': 'patient_details'})
+        self.assertNotIn('doctor_details', response.data)
+        self.assertNotIn('medical_records', response.data['patient_details'])
+        response = self.client.get(self.appointment_detail_url, {'expand': 'patient_details.medical_records'})
+        self.assertEqual(response.data['patient_details']['medical_records'], [])
+
+    def test_unknown_fields_are_rejected(self):
+        response = self.client.get(self.appointment_url, {'fields': 'id,doctor_details.fax'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['fields'], ['Unknown field: doctor_details.fax'])
+
+class DaySlotsTests(TestCase):
+    def test_overlap_checks(self):
+        slots = DaySlots([(1, 600, 1200), (2, 1200, 1800), (3, 3000, 3600)])
+        self.assertTrue(slots.overlaps(900, 1000))
+        self.assertTrue(slots.overlaps(1700, 3100))
+        self.assertFalse(slots.overlaps(1800, 3000))
+        self.assertFalse(slots.overlaps(0, 600))
+        self.assertFalse(slots.overlaps(600, 1200, exclude_id=1))
+
+    def test_long_interval_is_found_behind_short_ones(self):
+        slots = DaySlots([(1, 0, 7200), (2, 3600, 3660)])
+        self.assertTrue(slots.overlaps(5000, 5100))
+
+    def test_add_and_discard(self):
+        slots = DaySlots()
+        slots.add(1, 600, 1200)
+        self.assertTrue(slots.overlaps(900, 1000))
+        slots.add(1, 2000, 2400)
+        self.assertFalse(slots.overlaps(900, 1000))
+        slots.discard(1)
+        self.assertEqual(len(slots), 0)
+
+class SlotIndexTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        slot_index.clear()
+        doctor_user = User.objects.create_user(
+            username='doctor',
+            password='doctorpass123',
+            user_type='doctor'
+        )
+        self.doctor = Doctor.objects.create(
+            user=doctor_user,
+            license_number='DOC123',
+            consultation_fee=100.00
+        )
+        patient_user = User.objects.create_user(
+            username='patient',
+            password='patientpass123',
+            user_type='patient'
+        )
+        self.patient = Patient.objects.create(user=patient_user, blood_type='A+')
+        self.day = timezone.now().date() + timedelta(days=1)
+        self.appointment = Appointment.objects.create(
+            patient=self.patient,
+            doctor=self.doctor,
+            appointment_date=self.day,
+            start_time='10:00:00',
+            end_time='11:00:00',
+            status='scheduled'
+        )
+
+    def test_detects_overlaps(self):
+        self.assertTrue(slot_index.has_conflict(self.doctor.id, self.day, '10:30:00', '11:30:00'))
+        self.assertFalse(slot_index.has_conflict(self.doctor.id, self.day, '11:00:00', '12:00:00'))
+        self.assertFalse(slot_index.has_conflict(
+            self.doctor.id, self.day, '10:30:00', '11:30:00', exclude_id=self.appointment.id
+        ))
+
+    def test_warm_lookups_skip_the_database(self):
+        slot_index.has_conflict(self.doctor.id, self.day, '09:00:00', '09:30:00')
+        with self.assertNumQueries(0):
+            self.assertTrue(slot_index.has_conflict(self.doctor.id, self.day, '10:30:00', '11:30:00'))
+
+    def test_index_follows_saves_and_deletes(self):
+        slot_index.has_conflict(self.doctor.id, self.day, '09:00:00', '09:30:00')
+        new_appointment = Appointment.objects.create(
+            patient=self.patient,
+            doctor=self.doctor,
+            appointment_date=self.day,
+            start_time='14:00:00',
+            end_time='15:00:00'
+        )
+        self.appointment.status = 'cancelled'
+        self.appointment.save()
+        with self.assertNumQueries(0):
+            self.assertTrue(slot_index.has_conflict(self.doctor.id, self.day, '14:30:00', '15:30:00'))
+            self.assertFalse(slot_index.has_conflict(self.doctor.id, self.day, '10:30:00', '11:30:00'))
+
+        new_appointment.delete()
+        with self.assertNumQueries(0):
+            self.assertFalse(slot_index.has_conflict(self.doctor.id, self.day, '14:30:00', '15:30:00'))
+
+    def test_moving_an_appointment_updates_both_days(self):
+        other_day = self.day + timedelta(days=1)
+        slot_index.has_conflict(self.doctor.id, self.day, '09:00:00', '09:30:00')
+        slot_index.has_conflict(self.doctor.id, other_day, '09:00:00', '09:30:00')
+        self.appointment.appointment_date = other_day
+        self.appointment.save()
+        self.assertFalse(slot_index.has_conflict(self.doctor.id, self.day, '10:30:00', '11:30:00'))
+        self.assertTrue(slot_index.has_conflict(self.doctor.id, other_day, '10:30:00', '11:30:00'))
+
+    def test_serializer_rejects_double_booking(self):
+        DoctorAvailability.objects.create(
+            doctor=self.doctor,
+            day=self.day.strftime('%A').lower(),
+            start_time='09:00:00',
+            end_time='17:00:00'
+        )
+        data = {
+            'patient': self.patient.id,
+            'doctor': self.doctor.id,
+            'appointment_date': self.day.isoformat(),
+            'start_time': '10:30:00',
+            'end_time': '11:30:00'
+        }
+        serializer = AppointmentSerializer(data=data)
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('already booked', str(serializer.errors))
+
+        data.update(start_time='11:00:00', end_time='12:00:00')
+        self.assertTrue(AppointmentSerializer(data=data).is_valid())
+
+@override_settings(APPOINTMENT_CONFIRMATION_FLUSH_SIZE=2, APPOINTMENT_CONFIRMATION_FLUSH_INTERVAL=60)
+class ConfirmationDispatchTests(TestCase):
+    def setUp(self):
+        doctor_user = User.objects.create_user(
+            username='doctor',
+            password='doctorpass123',
+            first_name='Grace',
+            last_name='Otieno',
+            user_type='doctor'
+        )
+        self.doctor = Doctor.objects.create(
+            user=doctor_user,
+            license_number='DOC123',
+            consultation_fee=100.00
+        )
+        patient_user = User.objects.create_user(
+            username='patient',
+            email='patient@example.com',
+            password='patientpass123',
+            user_type='patient'
+        )
+        self.patient = Patient.objects.create(user=patient_user, blood_type='A+')
+        self.day = timezone.now().date() + timedelta(days=1)
+        delay = mock.patch.object(send_appointment_confirmations, 'delay')
+        self.delay = delay.start()
+        self.addCleanup(delay.stop)
+        self.addCleanup(confirmation_dispatcher.flush)
+
+    def book(self, hour):
+        return Appointment.objects.create(
+            patient=self.patient,
+            doctor=self.doctor,
+            appointment_date=self.day,
+            start_time=f'{hour:02d}:00:00',
+            end_time=f'{hour:02d}:30:00'
+        )
+
+    def test_bookings_are_sent_in_chunks_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ids = [self.book(hour).id for hour in range(9, 14)]
+            self.delay.assert_not_called()
+        self.assertEqual([call.args[0] for call in self.delay.call_args_list], [ids[0:2], ids[2:4]])
+        self.assertEqual(confirmation_dispatcher.pending(), ids[4:])
+
+        confirmation_dispatcher.flush()
+        self.assertEqual(self.delay.call_args.args[0], ids[4:])
+        self.assertEqual(confirmation_dispatcher.pending(), [])
+
+    def test_rolled_back_bookings_are_not_sent(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            kept = self.book(9)
+            with transaction.atomic():
+                self.book(10)
+                transaction.set_rollback(True)
+        self.assertEqual(confirmation_dispatcher.pending(), [kept.id])
+
+    def test_failed_enqueue_is_retried_on_the_timer(self):
+        appointment_id = self.book(9).id
+        self.delay.side_effect = [ConnectionError, None]
+        with override_settings(APPOINTMENT_CONFIRMATION_FLUSH_INTERVAL=0.5), \
+                self.assertLogs('appointments.dispatch', 'ERROR'):
+            confirmation_dispatcher.add(appointment_id)
+            confirmation_dispatcher.flush()
+            self.assertEqual(confirmation_dispatcher.pending(), [appointment_id])
+            timer = confirmation_dispatcher._timer
+            self.assertIsNotNone(timer)
+            timer.join(5)
+        self.assertEqual(self.delay.call_args.args[0], [appointment_id])
+        self.assertEqual(confirmation_dispatcher.pending(), [])
+
+    def test_batch_task_sends_one_email_per_appointment(self):
+        ids = [self.book(hour).id for hour in (9, 10)]
+        with self.assertNumQueries(1):
+            sent = send_appointment_confirmations(ids)
+        self.assertEqual(sent, 2)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertIn('Dr. Grace Otieno', mail.outbox[0].body)
+        self.assertEqual(mail.outbox[0].to, ['patient@example.com'])
+
+@override_settings(APPOINTMENT_REMINDER_LEAD_HOURS=24, APPOINTMENT_REMINDER_BUCKET_MINUTES=60,
+                   APPOINTMENT_REMINDER_SHARD_SIZE=1)
+class AppointmentReminderTests(TestCase):
+    def setUp(self):
+        self.doctors = []
+        for number in range(2):
+            doctor_user = User.objects.create_user(username=f'doctor{number}', password='doctorpass123',
+                                                   first_name='Grace', last_name=f'Otieno{number}', user_type='doctor')
+            self.doctors.append(Doctor.objects.create(user=doctor_user, license_number=f'DOC{number}',
+                                                      consultation_fee=100.00))
+        patient_user = User.objects.create_user(username='patient', email='patient@example.com',
+                                                password='patientpass123', user_type='patient')
+        self.patient = Patient.objects.create(user=patient_user, blood_type='A+')
+        self.now = timezone.make_aware(datetime(2030, 5, 6, 10, 15))
+        self.tomorrow = self.now.date() + timedelta(days=1)
+
+    def book(self, doctor, start_time, status='scheduled'):
+        return Appointment.objects.create(patient=self.patient, doctor=doctor, appointment_date=self.tomorrow,
+                                          start_time=start_time, end_time='23:59:00', status=status)
+
+    def test_buckets_within_the_lead_time_are_reminded_once(self):
+        doctor = self.doctors[0]
+        soon = self.book(doctor, '09:30:00')
+        edge = self.book(doctor, '10:45:00')
+        later = self.book(doctor, '11:00:00')
+        self.book(doctor, '09:45:00', status='cancelled')
+
+        self.assertEqual(remind_shard(doctor.id, now=self.now), 2)
+        self.assertEqual(set(AppointmentReminder.objects.values_list('appointment_id', flat=True)), {soon.id, edge.id})
+        self.assertIn('reminder of your appointment with Dr. Grace Otieno0', mail.outbox[0].body)
+        self.assertEqual(ReminderWatermark.objects.get(shard=doctor.id).reached,
+                         timezone.make_aware(datetime(2030, 5, 7, 11)))
+
+        # The next run only scans the buckets that came into range
+        with self.assertNumQueries(8):
+            self.assertEqual(remind_shard(doctor.id, now=self.now + timedelta(hours=1)), 1)
+        self.assertTrue(AppointmentReminder.objects.filter(appointment=later).exists())
+        self.assertEqual(remind_shard(doctor.id, now=self.now + timedelta(hours=1)), 0)
+        self.assertEqual(len(mail.outbox), 3)
+
+    def test_shards_only_see_their_doctors(self):
+        first = self.book(self.doctors[0], '09:00:00')
+        second = self.book(self.doctors[1], '09:00:00')
+        self.assertEqual(remind_shard(self.doctors[1].id, now=self.now), 1)
+        self.assertEqual(list(AppointmentReminder.objects.values_list('appointment_id', flat=True)), [second.id])
+        self.assertEqual(remind_shard(self.doctors[0].id, now=self.now), 1)
+        self.assertTrue(AppointmentReminder.objects.filter(appointment=first).exists())
+
+    def test_beat_task_fans_out_one_task_per_shard(self):
+        with mock.patch('appointments.tasks.send_appointment_reminders.delay') as delay:
+            shards = schedule_appointment_reminders()
+        self.assertEqual(shards, self.doctors[-1].id + 1)
+        self.assertEqual([call.args[0] for call in delay.call_args_list], list(range(shards)))
+
+class ConcurrentBookingTests(TransactionTestCase):
+    threads = 12
+    slots = [('09:00:00', '09:30:00'), ('09:15:00', '09:45:00'), ('10:00:00', '10:30:00'), ('10:00:00', '11:00:00')]
+
+    def setUp(self):
+        cache.clear()
+        slot_index.clear()
+        doctor_user = User.objects.create_user(username='doctor', password='doctorpass123', user_type='doctor')
+        self.doctor = Doctor.objects.create(user=doctor_user, license_number='DOC123', consultation_fee=100.00)
+        self.day = timezone.now().date() + timedelta(days=1)
+        DoctorAvailability.objects.create(doctor=self.doctor, day=self.day.strftime('%A').lower(),
+                                          start_time='08:00:00', end_time='18:00:00')
+        self.patients = [
+            Patient.objects.create(
+                user=User.objects.create_user(username=f'patient{index}', password='patientpass123',
+                                              user_type='patient'),
+                blood_type='A+'
+            )
+            for index in range(self.threads)
+        ]
+
+    def book_all(self, patient, barrier, outcomes):
+        try:
+            barrier.wait()
+            for start_time, end_time in self.slots:
+                serializer = AppointmentSerializer(data={
+                    'patient': patient.id,
+                    'doctor': self.doctor.id,
+                    'appointment_date': self.day.isoformat(),
+                    'start_time': start_time,
+                    'end_time': end_time,
+                })
+                try:
+                    serializer.is_valid(raise_exception=True)
+                    serializer.save()
+                    outcomes.append('booked')
+                except ValidationError:
+                    outcomes.append('taken')
+                except (ScheduleBusy, OperationalError):
+                    outcomes.append('busy')
+        finally:
+            connection.close()
+
+    @override_settings(BOOKING_MAX_ATTEMPTS=20)
+    def test_concurrent_bookings_never_overlap(self):
+        barrier = threading.Barrier(self.threads)
+        outcomes = []
+        # Every request gets past the in-memory pre-check, so only the day lock stands between them
+        with mock.patch.object(slot_index, 'has_conflict', return_value=False):
+            workers = [
+                threading.Thread(target=self.book_all, args=(patient, barrier, outcomes))
+                for patient in self.patients
+            ]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+
+        booked = list(Appointment.objects.filter(doctor=self.doctor, appointment_date=self.day)
+                      .order_by('start_time').values_list('start_time', 'end_time'))
+        for (_, end_time), (next_start, _) in zip(booked, booked[1:]):
+            self.assertLessEqual(end_time, next_start)
+        self.assertEqual(outcomes.count('booked'), len(booked))
+        self.assertEqual(len(outcomes), self.threads * len(self.slots))
+        self.assertGreaterEqual(len(booked), 1)
+        # Rejected attempts roll their version bump back
+        self.assertEqual(ScheduleDay.objects.get(doctor=self.doctor, date=self.day).version, len(booked))
+
+    def test_reactivating_a_cancelled_booking_rechecks_the_slot(self):
+        cancelled = Appointment.objects.create(patient=self.patients[0], doctor=self.doctor,
+                                               appointment_date=self.day, start_time='09:00:00',
+                                               end_time='09:30:00', status='cancelled')
+        Appointment.objects.create(patient=self.patients[1], doctor=self.doctor, appointment_date=self.day,
+                                   start_time='09:00:00', end_time='09:30:00')
+        serializer = AppointmentStatusUpdateSerializer(cancelled, data={'status': 'scheduled'}, partial=True)
+        self.assertTrue(serializer.is_valid())
+        with self.assertRaisesMessage(ValidationError, 'already booked'):
+            serializer.save()
+        cancelled.refresh_from_db()
+        self.assertEqual(cancelled.status, 'cancelled')
+
+class AppointmentImportTests(APITestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(
+            username='staff',
+            password='staffpass123',
+            user_type='admin',
+            is_staff=True
+        )
+        doctor_user = User.objects.create_user(
+            username='doctor',
+            password='doctorpass123',
+            user_type='doctor'
+        )
+        self.doctor = Doctor.objects.create(
+            user=doctor_user,
+            license_number='DOC123',
+            consultation_fee=100.00
+        )
+        for day in ('monday', 'tuesday', 'wednesday', 'thursday', 'friday'):
+            DoctorAvailability.objects.create(
+                doctor=self.doctor,
+                day=day,
+                start_time='09:00:00',
+                end_time='17:00:00'
+            )
+        patient_user = User.objects.create_user(
+            username='patient',
+            password='patientpass123',
+            user_type='patient'
+        )
+        self.patient = Patient.objects.create(user=patient_user, blood_type='A+')
+        today = timezone.now().date()
+        self.monday = today + timedelta(days=7 - today.weekday())
+        Appointment.objects.create(
+            patient=self.patient,
+            doctor=self.doctor,
+            appointment_date=self.monday,
+            start_time='10:00:00',
+            end_time='11:00:00'
+        )
+        self.client.force_authenticate(user=self.staff)
+        self.import_url = reverse('appointment-bulk-import')
+
+    def row(self, start, end, **overrides):
+        row = {
+            'patient': self.patient.id,
+            'doctor': self.doctor.id,
+            'appointment_date': self.monday.isoformat(),
+            'start_time': start,
+            'end_time': end,
+        }
+        row.update(overrides)
+        return row
+
+    def test_valid_rows_are_created_and_errors_reported_per_row(self):
+        rows = [
+            self.row('09:00:00', '09:30:00'),
+            self.row('10:30:00', '11:00:00'),
+            self.row('13:00:00', '14:00:00'),
+            self.row('13:30:00', '14:30:00'),
+            self.row('18:00:00', '19:00:00'),
+            self.row('09:00:00', '09:30:00', doctor=999999),
+            self.row('12:00:00', '11:00:00'),
+            self.row('10:00:00', '11:00:00', status='completed',
+                     appointment_date=(self.monday - timedelta(days=1)).isoformat()),
+        ]
+        response = self.client.post(self.import_url, {'appointments': rows}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 3)
+        errors = {error['index']: str(error['errors']) for error in response.data['errors']}
+        self.assertEqual(sorted(errors), [1, 3, 4, 5, 6])
+        self.assertIn('already booked', errors[1])
+        self.assertIn('already booked', errors[3])
+        self.assertIn('not available', errors[4])
+        self.assertIn('Doctor not found', errors[5])
+        self.assertEqual(Appointment.objects.count(), 4)
+        self.assertTrue(slot_index.has_conflict(self.doctor.id, self.monday, '13:15:00', '13:45:00'))
+
+    def test_query_count_does_not_grow_with_rows(self):
+        def import_rows(day_offsets):
+            rows = [
+                self.row(f'{hour:02d}:00:00', f'{hour:02d}:30:00',
+                         appointment_date=(self.monday + timedelta(days=7 * weeks)).isoformat())
+                for weeks in day_offsets
+                for hour in range(11, 17)
+            ]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(self.import_url, {'appointments': rows}, format='json')
+            self.assertEqual(response.data['created'], len(rows))
+            return len(queries)
+
+        # Stays under SQLite's variable limit, which splits larger inserts into several statements
+        self.assertEqual(import_rows(range(1, 3)), import_rows(range(3, 18)))
+
+    def test_only_staff_can_import(self):
+        self.client.force_authenticate(user=self.patient.user)
+        response = self.client.post(self.import_url, {'appointments': [self.row('09:00:00', '09:30:00')]},
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
@@ -1 +1,14 @@
- 
\ No newline at end of file
+from django.urls import path
+from .views import (
+    AppointmentListView,
+    AppointmentDetailView,
+    AppointmentStatusUpdateView,
+    AppointmentBulkImportView,
+)
+
+urlpatterns = [
+    path('', AppointmentListView.as_view(), name='appointment-list'),
+    path('<int:pk>/', AppointmentDetailView.as_view(), name='appointment-detail'),
+    path('<int:pk>/status/', AppointmentStatusUpdateView.as_view(), name='appointment-status-update'),
+    path('bulk/', AppointmentBulkImportView.as_view(), name='appointment-bulk-import'),
+]
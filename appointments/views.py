@@ -1,3 +1,71 @@
-from django.shortcuts import render
+from rest_framework import generics, permissions, status
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from django.shortcuts import get_object_or_404
+from healthcaresystem.fieldsets import SparseFieldsetViewMixin
+from healthcaresystem.pagination import KeysetPagination
+from patients.models import Patient
+from .imports import import_appointments
+from .models import Appointment
+from .serializers import (
+    AppointmentSerializer,
+    AppointmentStatusUpdateSerializer,
+    AppointmentImportSerializer
+)
 
-# Create your views here.
+class AppointmentListView(SparseFieldsetViewMixin, generics.ListCreateAPIView):
+    serializer_class = AppointmentSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        return Appointment.objects.visible_to(self.request.user).for_listing()
+
+    def perform_create(self, serializer):
+        user = self.request.user
+        if user.user_type == 'patient':
+            serializer.save(patient=get_object_or_404(Patient, user_id=user.id))
+        elif 'patient' not in serializer.validated_data:
+            raise ValidationError({'patient': ["This field is required."]})
+        else:
+            serializer.save()
+
+class AppointmentDetailView(SparseFieldsetViewMixin, generics.RetrieveUpdateDestroyAPIView):
+    serializer_class = AppointmentSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return Appointment.objects.visible_to(self.request.user).for_listing()
+
+    def perform_update(self, serializer):
+        # Patients cannot move their appointment to somebody else
+        if self.request.user.user_type == 'patient':
+            serializer.save(patient=serializer.instance.patient)
+        else:
+            serializer.save()
+
+    def perform_destroy(self, instance):
+        if self.request.user.user_type == 'patient':
+            raise PermissionDenied("Patients cancel appointments through the status endpoint")
+        instance.delete()
+
+class AppointmentStatusUpdateView(generics.UpdateAPIView):
+    serializer_class = AppointmentStatusUpdateSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return Appointment.objects.visible_to(self.request.user)
+
+class AppointmentBulkImportView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def post(self, request):
+        serializer = AppointmentImportSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        created, errors = import_appointments(serializer.validated_data['appointments'])
+        return Response({
+            'created': len(created),
+            'ids': [appointment.id for appointment in created],
+            'errors': [{'index': index, 'errors': errors[index]} for index in sorted(errors)],
+        }, status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST)
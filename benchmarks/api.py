@@ -0,0 +1,252 @@
+"""
+Endpoint scenarios and measurement for the API benchmark.
+
+Every named route in the appointments, doctors, patients and users URLconfs
+must have a scenario; ``uncovered_routes`` reports the ones that do not, so new endpoints
+cannot silently drop out of the benchmark. Write scenarios run inside a
+transaction that is rolled back after each request.
+"""
+import math
+import time
+from contextlib import nullcontext
+from datetime import date, timedelta
+from itertools import count
+
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from appointments import urls as appointment_urls
+from doctors import urls as doctor_urls
+from patients import urls as patient_urls
+from users import urls as user_urls
+from users.models import User
+
+BENCHMARKED_URLCONFS = (appointment_urls, doctor_urls, patient_urls, user_urls)
+ADMIN_USERNAME = 'benchmark-admin'
+ADMIN_PASSWORD = 'benchmark-pass-123'
+
+
+class Scenario:
+    def __init__(self, name, method='get', kwargs=None, params=None, data=None,
+                 authenticated=True, rollback=False, label=None):
+        self.name = name
+        # Results are reported under ``label`` when one route has several scenarios
+        self.label = label or name
+        self.method = method
+        self.kwargs = kwargs or {}
+        self.params = params
+        # ``data`` may be a callable taking the iteration number, for unique payloads
+        self.data = data
+        self.authenticated = authenticated
+        self.rollback = rollback
+
+    def payload(self, iteration):
+        if callable(self.data):
+            return self.data(iteration)
+        return self.data
+
+    def request(self, client, iteration):
+        url = reverse(self.name, kwargs=self.kwargs)
+        if self.method == 'get':
+            response = client.get(url, self.params)
+            if response.streaming:
+                # Exports do their work while the body is consumed
+                for _ in response.streaming_content:
+                    pass
+            return response
+        return getattr(client, self.method)(url, self.payload(iteration), format='json')
+
+
+def import_rows(ids):
+    # A free working week past the seeded appointments, eight bookings a day
+    start = date.today() + timedelta(days=150)
+    monday = start + timedelta(days=7 - start.weekday())
+    return [
+        {
+            'patient': ids['patient_id'],
+            'doctor': ids['doctor_id'],
+            'appointment_date': (monday + timedelta(days=day)).isoformat(),
+            'start_time': f'{hour:02d}:00:00',
+            'end_time': f'{hour:02d}:45:00',
+        }
+        for day in range(5)
+        for hour in range(9, 17)
+    ]
+
+
+def build_scenarios(ids, refresh_token):
+    doctor = {'doctor_id': ids['doctor_id']}
+    return [
+        Scenario('appointment-list'),
+        Scenario('appointment-list', params={'fields': 'id,appointment_date,start_time,status,doctor_details.user'},
+                 label='appointment-list-sparse'),
+        Scenario('appointment-detail', kwargs={'pk': ids['appointment_id']}),
+        Scenario('appointment-status-update', 'patch', kwargs={'pk': ids['appointment_id']},
+                 rollback=True, data={'notes': 'Checked in at reception'}),
+        Scenario('appointment-bulk-import', 'post', rollback=True, data={'appointments': import_rows(ids)}),
+        Scenario('specialization-list'),
+        Scenario('specialization-detail', kwargs={'pk': ids['specialization_id']}),
+        Scenario('doctor-list'),
+        Scenario('doctor-list', params={'search': 'amin otie'}, label='doctor-search'),
+        Scenario('doctor-list', params={'facets': 'true', 'fee': '100-199'}, label='doctor-list-facets'),
+        Scenario('doctor-detail', kwargs={'pk': ids['doctor_id']}),
+        Scenario('doctor-next-available', params={'specialization': ids['specialization_id'], 'limit': 10}),
+        Scenario('doctor-list-async'),
+        Scenario('doctor-detail-async', kwargs={'pk': ids['doctor_id']}),
+        Scenario('doctor-availability', kwargs=doctor),
+        Scenario('doctor-calendar', kwargs=doctor, params={'days': 31}),
+        Scenario('doctor-availability-async', kwargs=doctor),
+        Scenario('doctor-availability-bulk', 'post', kwargs=doctor, rollback=True, data={
+            'availabilities': [
+                {'day': 'saturday', 'start_time': '09:00:00', 'end_time': '13:00:00', 'is_available': True},
+                {'day': 'sunday', 'start_time': '09:00:00', 'end_time': '13:00:00', 'is_available': True},
+            ]
+        }),
+        Scenario('patient-list'),
+        Scenario('patient-list', params={'search': 'wang'}, label='patient-search'),
+        Scenario('patient-summary-list'),
+        Scenario('patient-detail', kwargs={'pk': ids['patient_id']}),
+        Scenario('medical-record-list', kwargs={'patient_id': ids['patient_id']}),
+        Scenario('medical-record-list-async', kwargs={'patient_id': ids['patient_id']}),
+        Scenario('medical-record-export', params={'patient': ids['patient_id']}),
+        Scenario('medical-record-export', params={'patient': ids['patient_id'], 'output': 'csv'},
+                 label='medical-record-export-csv'),
+        Scenario('medical-record-changes', kwargs={'patient_id': ids['patient_id']}),
+        Scenario('medical-record-detail', kwargs={'patient_id': ids['patient_id'], 'pk': ids['record_id']}),
+        Scenario('user-register', 'post', authenticated=False, rollback=True, data=lambda i: {
+            'username': f'benchmark-user-{i}',
+            'email': f'benchmark-user-{i}@example.com',
+            'password': 'Str0ng-benchmark-pass',
+            'password2': 'Str0ng-benchmark-pass',
+            'user_type': 'patient',
+        }),
+        Scenario('user-profile'),
+        Scenario('user-profile-update', 'patch', rollback=True, data={'phone_number': '0711111111'}),
+        Scenario('user-list'),
+        Scenario('token_obtain_pair', 'post', authenticated=False, data={
+            'username': ADMIN_USERNAME,
+            'password': ADMIN_PASSWORD,
+        }),
+        Scenario('token_refresh', 'post', authenticated=False, data={'refresh': refresh_token}),
+    ]
+
+
+def route_names():
+    return {
+        pattern.name
+        for urlconf in BENCHMARKED_URLCONFS
+        for pattern in urlconf.urlpatterns
+        if pattern.name
+    }
+
+
+def uncovered_routes(scenarios):
+    return sorted(route_names() - {scenario.name for scenario in scenarios})
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+
+def create_admin():
+    return User.objects.create_user(
+        username=ADMIN_USERNAME,
+        password=ADMIN_PASSWORD,
+        user_type='admin',
+        is_staff=True
+    )
+
+
+def obtain_tokens():
+    """Log the admin user in through the API and return its (access, refresh) tokens."""
+    response = APIClient().post(reverse('token_obtain_pair'), {
+        'username': ADMIN_USERNAME,
+        'password': ADMIN_PASSWORD,
+    }, format='json')
+    return response.data['access'], response.data['refresh']
+
+
+def authenticated_client():
+    """Return an APIClient carrying a real JWT for the admin user, plus its refresh token."""
+    access, refresh = obtain_tokens()
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+    return client, refresh
+
+
+def run_benchmarks(ids, iterations=20, only=None):
+    """Run every scenario and return {name: {'queries', 'p50_ms', 'p95_ms'}}."""
+    client, refresh_token = authenticated_client()
+    anonymous = APIClient()
+    scenarios = build_scenarios(ids, refresh_token)
+    missing = uncovered_routes(scenarios)
+    if missing:
+        raise ValueError(f"No benchmark scenario for: {', '.join(missing)}")
+
+    sequence = count()
+    results = {}
+    for scenario in scenarios:
+        if only and scenario.name not in only and scenario.label not in only:
+            continue
+        scenario_client = client if scenario.authenticated else anonymous
+        timings = []
+        queries = 0
+        # One untimed warm-up request fills caches the way a running server would have them
+        for iteration in range(iterations + 1):
+            elapsed, query_count = measure(scenario, scenario_client, next(sequence))
+            if iteration:
+                timings.append(elapsed)
+                queries = max(queries, query_count)
+        results[scenario.label] = {
+            'queries': queries,
+            'p50_ms': round(percentile(timings, 0.5) * 1000, 2),
+            'p95_ms': round(percentile(timings, 0.95) * 1000, 2),
+        }
+    return results
+
+
+def replay(scenario, client, iteration):
+    """Send one request and return (elapsed seconds, captured queries)."""
+    # Reads run in autocommit like a real request; writes are rolled back afterwards
+    with transaction.atomic() if scenario.rollback else nullcontext():
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = scenario.request(client, iteration)
+            elapsed = time.perf_counter() - started
+        if scenario.rollback:
+            transaction.set_rollback(True)
+    if response.status_code >= 400:
+        raise ValueError(f"{scenario.name} returned {response.status_code}: {getattr(response, 'data', '')}")
+    return elapsed, queries.captured_queries
+
+
+def measure(scenario, client, iteration):
+    elapsed, queries = replay(scenario, client, iteration)
+    return elapsed, len(queries)
+
+
+def compare(results, baseline, tolerance=0.25, slack_ms=1.0):
+    """
+    Return human-readable regressions of ``results`` against ``baseline``.
+
+    Query counts must not grow at all. Latencies may grow by ``tolerance`` (a
+    fraction) plus ``slack_ms`` to absorb timer noise on very fast endpoints.
+    A scenario missing from the baseline is reported too, so new endpoints are
+    gated from the commit that adds them.
+    """
+    regressions = []
+    for name, current in sorted(results.items()):
+        expected = baseline.get(name)
+        if expected is None:
+            regressions.append(f"{name}: no baseline")
+            continue
+        if current['queries'] > expected['queries']:
+            regressions.append(f"{name}: {current['queries']} queries (baseline {expected['queries']})")
+        for metric in ('p50_ms', 'p95_ms'):
+            limit = expected[metric] * (1 + tolerance) + slack_ms
+            if current[metric] > limit:
+                regressions.append(f"{name}: {metric} {current[metric]} (baseline {expected[metric]})")
+    return regressions
@@ -0,0 +1,80 @@
+"""
+Index advisor: EXPLAIN the SQL behind every benchmarked endpoint.
+
+Each scenario is replayed once against seeded data and every SELECT it issues is
+run through the database's planner. Tables read by a full scan rather than
+an index are reported, with the query that caused it. The planner output is
+parsed for SQLite (``EXPLAIN QUERY PLAN``) and PostgreSQL (``EXPLAIN (FORMAT
+JSON)``); other backends report nothing.
+"""
+import json
+import re
+
+from django.db import connection
+
+from rest_framework.test import APIClient
+
+from .api import authenticated_client, build_scenarios, replay
+
+# "SCAN doctors_doctor" is a full scan, "SCAN doctors_doctor USING INDEX ..." is not
+SQLITE_FULL_SCAN = re.compile(r'^SCAN (?!\()(?P<table>\S+)(?P<rest>.*)$')
+# Small tables that are read whole on purpose and cached, e.g. the doctor facet counters
+WHOLE_TABLE_READS = {'doctors_doctorfacetcell'}
+
+
+def full_scans(sql, params=None):
+    """Return the tables ``sql`` reads by a full scan."""
+    # Subqueries such as the ``qualify`` wrapper of window filters are not tables
+    tables = set(connection.introspection.table_names()) - WHOLE_TABLE_READS
+    return [table for table in planned_scans(sql, params) if table in tables]
+
+
+def planned_scans(sql, params):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            tables = []
+            for *_, detail in cursor.fetchall():
+                match = SQLITE_FULL_SCAN.match(detail)
+                if match and 'INDEX' not in match['rest']:
+                    tables.append(match['table'])
+            return tables
+        if connection.vendor == 'postgresql':
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return list(seq_scans(plan[0]['Plan']))
+    return []
+
+
+def seq_scans(node):
+    if node.get('Node Type') == 'Seq Scan':
+        yield node['Relation Name']
+    for child in node.get('Plans', ()):
+        yield from seq_scans(child)
+
+
+def analyze():
+    # Plans depend on table statistics, which bulk-seeded tables do not have yet
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+def advise(ids, only=None):
+    """Replay every scenario and return [(label, table, sql)] for each full scan found."""
+    client, refresh_token = authenticated_client()
+    anonymous = APIClient()
+    findings = []
+    explained = set()
+    for iteration, scenario in enumerate(build_scenarios(ids, refresh_token)):
+        if only and scenario.name not in only and scenario.label not in only:
+            continue
+        _, queries = replay(scenario, client if scenario.authenticated else anonymous, iteration)
+        for query in queries:
+            sql = query['sql']
+            if not sql.lstrip().upper().startswith('SELECT') or sql in explained:
+                continue
+            explained.add(sql)
+            findings.extend((scenario.label, table, sql) for table in full_scans(sql))
+    return findings
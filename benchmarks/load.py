@@ -0,0 +1,111 @@
+"""
+Concurrent load test of the sync and async read endpoints under ASGI.
+
+Requests are fed straight into Django's ASGI application from one event loop,
+with up to ``concurrency`` in flight, the way uvicorn drives it. Sync views run
+in threads through Django's sync_to_async adapter, async views on the loop
+itself. Each pair of endpoints must return the same body.
+"""
+import asyncio
+import time
+from urllib.parse import urlencode
+
+from django.core.asgi import get_asgi_application
+from django.urls import reverse
+
+from .api import percentile
+
+ENDPOINT_PAIRS = [
+    ('doctor-list', 'doctor-list-async', None, None),
+    ('doctor-detail', 'doctor-detail-async', 'doctor', None),
+    ('doctor-availability', 'doctor-availability-async', 'doctor_id', None),
+    ('medical-record-list', 'medical-record-list-async', 'patient_id', None),
+]
+
+
+async def asgi_get(app, path, params, headers):
+    """Send one GET through the ASGI app and return (status, body)."""
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': urlencode(params or {}).encode(),
+        'root_path': '',
+        'headers': [(b'host', b'testserver')] + [
+            (name.lower().encode(), value.encode()) for name, value in headers.items()
+        ],
+        'client': ('127.0.0.1', 50000),
+        'server': ('testserver', 80),
+    }
+    request_sent = False
+    disconnected = asyncio.Event()
+    response = {'status': None, 'body': []}
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await disconnected.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+        elif message['type'] == 'http.response.body':
+            response['body'].append(message.get('body', b''))
+
+    await app(scope, receive, send)
+    disconnected.set()
+    return response['status'], b''.join(response['body'])
+
+
+async def load(app, path, params, headers, requests, concurrency):
+    timings = []
+    remaining = iter(range(requests))
+    first = {}
+
+    async def worker():
+        for _ in remaining:
+            started = time.perf_counter()
+            status, body = await asgi_get(app, path, params, headers)
+            timings.append(time.perf_counter() - started)
+            if status != 200:
+                raise ValueError(f"{path} returned {status}: {body[:200]!r}")
+            first.setdefault('body', body)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        'rps': round(requests / elapsed, 1),
+        'p50_ms': round(percentile(timings, 0.5) * 1000, 2),
+        'p95_ms': round(percentile(timings, 0.95) * 1000, 2),
+        'body': first['body'],
+    }
+
+
+def run_load_test(ids, access_token, requests=400, concurrency=50):
+    """Return {sync_name: {'sync': stats, 'async': stats, 'identical': bool}}."""
+    app = get_asgi_application()
+    headers = {'Authorization': f'Bearer {access_token}'}
+    kwargs_for = {
+        None: {},
+        'doctor': {'pk': ids['doctor_id']},
+        'doctor_id': {'doctor_id': ids['doctor_id']},
+        'patient_id': {'patient_id': ids['patient_id']},
+    }
+    results = {}
+    for sync_name, async_name, kwargs, params in ENDPOINT_PAIRS:
+        stats = {}
+        for label, name in (('sync', sync_name), ('async', async_name)):
+            path = reverse(name, kwargs=kwargs_for[kwargs])
+            stats[label] = asyncio.run(load(app, path, params, headers, requests, concurrency))
+        # Pagination links point at the view's own URL
+        stats['identical'] = stats['async'].pop('body').replace(b'/async/', b'/') == stats['sync'].pop('body')
+        results[sync_name] = stats
+    return results
@@ -0,0 +1,75 @@
+import json
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks.api import compare, create_admin, run_benchmarks
+from benchmarks.seed import seed, throwaway_database
+
+DEFAULT_BASELINE = Path(__file__).resolve().parents[2] / 'baseline.json'
+
+
+class Command(BaseCommand):
+    help = ("Seed a throwaway database, measure latency and SQL query counts for every API "
+            "endpoint and fail when they regress against the stored baseline")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctors', type=int, default=5000)
+        parser.add_argument('--patients', type=int, default=100000)
+        parser.add_argument('--appointments', type=int, default=1000000)
+        parser.add_argument('--records-per-patient', type=int, default=3)
+        parser.add_argument('--scale', type=float, default=1.0,
+                            help='Multiply all seeded volumes, e.g. 0.01 for a quick run')
+        parser.add_argument('--iterations', type=int, default=20,
+                            help='Timed requests per endpoint')
+        parser.add_argument('--only', nargs='*', help='Only run these URL names or scenario labels')
+        parser.add_argument('--baseline', default=str(DEFAULT_BASELINE))
+        parser.add_argument('--update-baseline', action='store_true',
+                            help='Store this run as the new baseline instead of comparing')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='Allowed relative latency growth before failing')
+
+    def handle(self, *args, **options):
+        volumes = {
+            'doctors': max(int(options['doctors'] * options['scale']), 1),
+            'patients': max(int(options['patients'] * options['scale']), 1),
+            'appointments': int(options['appointments'] * options['scale']),
+            'records_per_patient': options['records_per_patient'],
+        }
+
+        with throwaway_database():
+            started = time.perf_counter()
+            ids = seed(**volumes)
+            create_admin()
+            self.stdout.write(f"Seeded {volumes} in {time.perf_counter() - started:.1f}s")
+            try:
+                results = run_benchmarks(ids, iterations=options['iterations'], only=options['only'])
+            except ValueError as exc:
+                raise CommandError(str(exc))
+
+        self.report(results)
+
+        baseline_path = Path(options['baseline'])
+        if options['update_baseline']:
+            baseline_path.write_text(json.dumps({'volumes': volumes, 'endpoints': results}, indent=2) + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {baseline_path}"))
+            return
+
+        if not baseline_path.exists():
+            self.stdout.write(self.style.WARNING(f"No baseline at {baseline_path}; run with --update-baseline"))
+            return
+        baseline = json.loads(baseline_path.read_text())
+        if baseline.get('volumes') != volumes:
+            self.stdout.write(self.style.WARNING(
+                f"Baseline was recorded with {baseline.get('volumes')}; latencies may not be comparable"
+            ))
+        regressions = compare(results, baseline['endpoints'], tolerance=options['tolerance'])
+        if regressions:
+            raise CommandError("Regressions against baseline:\n  " + "\n  ".join(regressions))
+        self.stdout.write(self.style.SUCCESS("No regressions against baseline"))
+
+    def report(self, results):
+        self.stdout.write(f"{'endpoint':32} {'queries':>7} {'p50 ms':>9} {'p95 ms':>9}")
+        for name, result in results.items():
+            self.stdout.write(f"{name:32} {result['queries']:>7} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f}")
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks.api import create_admin, obtain_tokens
+from benchmarks.load import run_load_test
+from benchmarks.seed import seed, throwaway_database
+
+
+class Command(BaseCommand):
+    help = ("Seed a throwaway database and compare throughput of the sync and async read "
+            "endpoints under concurrent ASGI load")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctors', type=int, default=500)
+        parser.add_argument('--patients', type=int, default=10000)
+        parser.add_argument('--appointments', type=int, default=50000)
+        parser.add_argument('--requests', type=int, default=400, help='Requests per endpoint')
+        parser.add_argument('--concurrency', type=int, default=50, help='Requests in flight at once')
+
+    def handle(self, *args, **options):
+        with throwaway_database():
+            ids = seed(
+                doctors=options['doctors'],
+                patients=options['patients'],
+                appointments=options['appointments']
+            )
+            create_admin()
+            access, _ = obtain_tokens()
+            try:
+                results = run_load_test(ids, access, options['requests'], options['concurrency'])
+            except ValueError as exc:
+                raise CommandError(str(exc))
+
+        self.stdout.write(f"{options['requests']} requests per endpoint, {options['concurrency']} concurrent")
+        self.stdout.write(f"{'endpoint':24} {'':6} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9}")
+        for name, stats in results.items():
+            for label in ('sync', 'async'):
+                result = stats[label]
+                self.stdout.write(
+                    f"{name:24} {label:6} {result['rps']:>8} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f}"
+                )
+        different = [name for name, stats in results.items() if not stats['identical']]
+        if different:
+            raise CommandError(f"Async output differs from sync for: {', '.join(different)}")
+        self.stdout.write(self.style.SUCCESS("Async responses match the sync views"))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks.seed import seed, throwaway_database
+from benchmarks.serialization import run_serialization_benchmark
+
+
+class Command(BaseCommand):
+    help = ("Seed a throwaway database and compare the per-row cost of the regular list "
+            "serializers with the compiled values() path")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000])
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        size = max(options['rows'])
+        with throwaway_database():
+            seed(doctors=size, patients=size, appointments=0, records_per_patient=2)
+            results = run_serialization_benchmark(options['rows'], options['repeat'])
+
+        self.stdout.write("Microseconds per row (best of %d)" % options['repeat'])
+        self.stdout.write(
+            f"{'endpoint':14} {'rows':>6} {'path':8} {'fetch':>8} {'serialize':>10} {'render':>8} {'total':>8}"
+        )
+        for (name, _), result in results.items():
+            for path in ('regular', 'fast'):
+                stages = result[path]
+                total = sum(stages.values())
+                self.stdout.write(
+                    f"{name:14} {result['rows']:>6} {path:8} {stages['fetch_us']:>8.2f} "
+                    f"{stages['serialize_us']:>10.2f} {stages['render_us']:>8.2f} {total:>8.2f}"
+                )
+        different = sorted({name for (name, _), result in results.items() if not result['identical']})
+        if different:
+            raise CommandError(f"Fast path output differs for: {', '.join(different)}")
+        self.stdout.write(self.style.SUCCESS("Fast path output is byte-identical"))
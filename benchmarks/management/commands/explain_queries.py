@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks.api import create_admin
+from benchmarks.explain import advise, analyze
+from benchmarks.seed import seed, throwaway_database
+
+
+class Command(BaseCommand):
+    help = ("Seed a throwaway database, EXPLAIN every query issued by the benchmarked "
+            "endpoints and report the tables they read by full scan")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctors', type=int, default=200)
+        parser.add_argument('--patients', type=int, default=5000)
+        parser.add_argument('--appointments', type=int, default=20000)
+        parser.add_argument('--only', nargs='*', help='Only explain these URL names or scenario labels')
+        parser.add_argument('--fail-on-scan', action='store_true',
+                            help='Exit with an error when any full scan is found')
+
+    def handle(self, *args, **options):
+        with throwaway_database():
+            ids = seed(
+                doctors=options['doctors'],
+                patients=options['patients'],
+                appointments=options['appointments']
+            )
+            create_admin()
+            analyze()
+            try:
+                findings = advise(ids, only=options['only'])
+            except ValueError as exc:
+                raise CommandError(str(exc))
+
+        if not findings:
+            self.stdout.write(self.style.SUCCESS("No full scans"))
+            return
+        for label, table, sql in findings:
+            self.stdout.write(f"{label}: full scan of {table}")
+            self.stdout.write(f"    {sql[:300]}")
+        message = f"{len(findings)} full scans in {len({label for label, _, _ in findings})} endpoints"
+        if options['fail_on_scan']:
+            raise CommandError(message)
+        self.stdout.write(self.style.WARNING(message))
@@ -0,0 +1,47 @@
+from urllib.error import URLError
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from healthcaresystem.metrics import parse, slow_routes
+
+
+class Command(BaseCommand):
+    help = ("Read the request histograms of a running server (or a saved /metrics/ "
+            "scrape) and list the slowest routes")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://localhost:8000/metrics/')
+        parser.add_argument('--file', help='Read a saved /metrics/ response instead of --url')
+        parser.add_argument('--top', type=int, default=10)
+        parser.add_argument('--order', choices=['p95', 'mean', 'total', 'queries', 'sql'], default='p95')
+
+    def handle(self, *args, **options):
+        if options['file']:
+            with open(options['file']) as f:
+                text = f.read()
+        else:
+            request = Request(options['url'])
+            if getattr(settings, 'METRICS_TOKEN', None):
+                request.add_header('Authorization', f'Bearer {settings.METRICS_TOKEN}')
+            try:
+                with urlopen(request, timeout=10) as response:
+                    text = response.read().decode()
+            except URLError as exc:
+                raise CommandError(f"Could not read {options['url']}: {exc}")
+
+        rows = slow_routes(parse(text), top=options['top'], order=options['order'])
+        if not rows:
+            self.stdout.write("No requests recorded")
+            return
+        self.stdout.write(
+            f"{'route':<32} {'method':<7} {'requests':>9} {'mean ms':>9} {'p95 ms':>9} "
+            f"{'queries':>8} {'sql ms':>8} {'render ms':>10} {'bytes':>9}"
+        )
+        for row in rows:
+            self.stdout.write(
+                f"{row['route']:<32} {row['method']:<7} {row['requests']:>9} {row['mean_ms']:>9.2f} "
+                f"{row['p95_ms']:>9.2f} {row['queries']:>8.1f} {row['sql_ms']:>8.2f} "
+                f"{row['render_ms']:>10.2f} {row['bytes']:>9.0f}"
+            )
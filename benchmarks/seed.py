@@ -0,0 +1,164 @@
+"""
+Bulk data generator for the API benchmarks.
+
+Rows are written with bulk_create in batches, which skips model signals, so
+no confirmation tasks are queued and no caches are touched while seeding. The
+search index is rebuilt once at the end instead.
+"""
+import random
+from contextlib import contextmanager
+from datetime import date, time, timedelta
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from appointments.models import Appointment
+from doctors.facets import rebuild as rebuild_doctor_facets
+from doctors.models import Doctor, DoctorAvailability, Specialization
+from patients.models import MedicalRecord, Patient
+from patients.journal import backfill as backfill_record_journal
+from patients.summaries import rebuild as rebuild_patient_summaries
+from search.index import rebuild as rebuild_search_index
+from users.models import User
+
+BATCH_SIZE = 5000
+SPECIALIZATIONS = [
+    'Cardiology', 'Dermatology', 'Endocrinology', 'Gastroenterology', 'Neurology',
+    'Oncology', 'Orthopedics', 'Pediatrics', 'Psychiatry', 'Radiology',
+]
+FIRST_NAMES = ['Amina', 'Brian', 'Chen', 'Diana', 'Emeka', 'Fatima', 'George', 'Hana', 'Ivan', 'Joy']
+LAST_NAMES = ['Otieno', 'Smith', 'Wang', 'Mwangi', 'Okafor', 'Hassan', 'Brown', 'Sato', 'Petrov', 'Kamau']
+DIAGNOSES = ['Hypertension', 'Type 2 diabetes', 'Asthma', 'Migraine', 'Common cold', 'Back pain']
+WORKING_DAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday']
+# Appointments are spread over this many days around today, eight hourly slots a day
+APPOINTMENT_DAYS = 180
+
+
+@contextmanager
+def throwaway_database():
+    """Run the block against a freshly created test database that is dropped afterwards."""
+    setup_test_environment(debug=False)
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        cache.clear()
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def batched(create, rows):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, BATCH_SIZE))
+        if not batch:
+            return
+        create(batch, batch_size=BATCH_SIZE)
+
+
+def seed(doctors=5000, patients=100000, appointments=1000000, records_per_patient=3, seed=0):
+    """Populate the database and return the ids the endpoint scenarios need."""
+    rng = random.Random(seed)
+    password = make_password(None)
+
+    specializations = Specialization.objects.bulk_create([
+        Specialization(name=name, description=f'{name} department') for name in SPECIALIZATIONS
+    ])
+
+    def user(username, user_type):
+        return User(
+            username=username,
+            password=password,
+            first_name=rng.choice(FIRST_NAMES),
+            last_name=rng.choice(LAST_NAMES),
+            email=f'{username}@example.com',
+            user_type=user_type
+        )
+
+    batched(User.objects.bulk_create, (user(f'doctor{i}', 'doctor') for i in range(doctors)))
+    batched(User.objects.bulk_create, (user(f'patient{i}', 'patient') for i in range(patients)))
+    doctor_user_ids = list(User.objects.filter(user_type='doctor').order_by('id').values_list('id', flat=True))
+    patient_user_ids = list(User.objects.filter(user_type='patient').order_by('id').values_list('id', flat=True))
+
+    batched(Doctor.objects.bulk_create, (
+        Doctor(
+            user_id=user_id,
+            specialization=specializations[index % len(specializations)],
+            license_number=f'LIC{index:07d}',
+            years_of_experience=rng.randint(0, 35),
+            consultation_fee=rng.randrange(20, 300)
+        )
+        for index, user_id in enumerate(doctor_user_ids)
+    ))
+    doctor_ids = list(Doctor.objects.order_by('id').values_list('id', flat=True))
+    batched(DoctorAvailability.objects.bulk_create, (
+        DoctorAvailability(doctor_id=doctor_id, day=day, start_time=time(9), end_time=time(17))
+        for doctor_id in doctor_ids
+        for day in WORKING_DAYS
+    ))
+
+    batched(Patient.objects.bulk_create, (
+        Patient(
+            user_id=user_id,
+            blood_type=rng.choice(Patient.BLOOD_TYPE_CHOICES)[0],
+            allergies=rng.choice(['', '', 'Penicillin', 'Peanuts']),
+            emergency_contact_name='Emergency Contact',
+            emergency_contact_phone='0700000000',
+            insurance_provider='NHIF',
+            insurance_policy_number=f'POL{index:08d}'
+        )
+        for index, user_id in enumerate(patient_user_ids)
+    ))
+    patient_ids = list(Patient.objects.order_by('id').values_list('id', flat=True))
+
+    today = date.today()
+    batched(MedicalRecord.objects.bulk_create, (
+        MedicalRecord(
+            patient_id=patient_id,
+            diagnosis=rng.choice(DIAGNOSES),
+            prescription='As directed',
+            date=today - timedelta(days=rng.randrange(1, 1000))
+        )
+        for patient_id in patient_ids
+        for _ in range(records_per_patient)
+    ))
+
+    # Each doctor gets at most one appointment per hourly slot, so bookings never overlap
+    first_day = today - timedelta(days=APPOINTMENT_DAYS // 2)
+    capacity = len(doctor_ids) * APPOINTMENT_DAYS * 8
+    batched(Appointment.objects.bulk_create, (
+        appointment(index, doctor_ids, patient_ids, first_day, today, rng)
+        for index in range(min(appointments, capacity))
+    ))
+    rebuild_search_index()
+    rebuild_patient_summaries()
+    backfill_record_journal()
+    rebuild_doctor_facets()
+
+    return {
+        'specialization_id': specializations[0].id,
+        'doctor_id': doctor_ids[0],
+        'patient_id': patient_ids[0],
+        'record_id': MedicalRecord.objects.filter(patient_id=patient_ids[0]).values_list('id', flat=True).first(),
+        'appointment_id': Appointment.objects.values_list('id', flat=True).first(),
+    }
+
+
+def appointment(index, doctor_ids, patient_ids, first_day, today, rng):
+    doctor_id = doctor_ids[index % len(doctor_ids)]
+    cell = index // len(doctor_ids)
+    day = first_day + timedelta(days=cell % APPOINTMENT_DAYS)
+    hour = 9 + cell // APPOINTMENT_DAYS
+    return Appointment(
+        doctor_id=doctor_id,
+        patient_id=rng.choice(patient_ids),
+        appointment_date=day,
+        start_time=time(hour),
+        end_time=time(hour, 45),
+        status='completed' if day < today else 'scheduled',
+        reason='Consultation'
+    )
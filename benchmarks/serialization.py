@@ -0,0 +1,72 @@
+"""
+Per-row cost of rendering list pages: the regular DRF serializers against the
+compiled ``.values()`` path in healthcaresystem/fastlist.py.
+
+Each case fetches the first ``rows`` rows of a list endpoint's queryset in
+keyset order, serializes them and renders the JSON. Fetch, serialize and
+render are timed separately (best of ``repeat``), and the two paths' JSON
+bytes are compared.
+"""
+import time
+
+from rest_framework.renderers import JSONRenderer
+
+from doctors.models import Doctor
+from doctors.serializers import DoctorSerializer
+from healthcaresystem.fastlist import compile_serializer
+from patients.models import Patient
+from patients.serializers import PatientDocumentSerializer
+from users.models import User
+from users.serializers import UserSerializer
+
+ORDERING = ('-created_at', '-pk')
+
+CASES = {
+    'doctor-list': (lambda: Doctor.objects.for_listing(), DoctorSerializer),
+    'user-list': (lambda: User.objects.all(), UserSerializer),
+    'patient-list': (lambda: Patient.objects.select_related('summary'), PatientDocumentSerializer),
+}
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+def best(runs):
+    return {stage: min(run[stage] for run in runs) for stage in runs[0]}
+
+
+def measure(queryset, serializer_class, rows, repeat=3):
+    queryset = queryset.order_by(*ORDERING)
+    renderer = compile_serializer(serializer_class())
+    regular, fast = [], []
+    for _ in range(repeat):
+        instances, fetch = timed(lambda: list(queryset[:rows]))
+        data, serialize = timed(lambda: serializer_class(instances, many=True).data)
+        regular_content, render = timed(lambda: JSONRenderer().render(data))
+        regular.append({'fetch': fetch, 'serialize': serialize, 'render': render})
+
+        dicts, fetch = timed(lambda: list(renderer.values(queryset)[:rows]))
+        data, serialize = timed(lambda: renderer.render_page(dicts))
+        fast_content, render = timed(lambda: JSONRenderer().render(data))
+        fast.append({'fetch': fetch, 'serialize': serialize, 'render': render})
+
+    count = len(instances) or 1
+    per_row = lambda stages: {f'{stage}_us': round(seconds / count * 1e6, 2) for stage, seconds in stages.items()}
+    return {
+        'rows': len(instances),
+        'regular': per_row(best(regular)),
+        'fast': per_row(best(fast)),
+        'identical': regular_content == fast_content,
+    }
+
+
+def run_serialization_benchmark(rows=(1000, 10000), repeat=3):
+    """Return {(case, rows): measurement} for every case at every row count."""
+    return {
+        (name, count): measure(queryset(), serializer_class, count, repeat)
+        for name, (queryset, serializer_class) in CASES.items()
+        for count in rows
+    }
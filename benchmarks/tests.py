@@ -0,0 +1,164 @@
+from pathlib import Path
+
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from healthcaresystem.database import database_config
+from healthcaresystem.metrics import parse, quantile, registry, slow_routes
+
+from users.models import User
+
+from .api import Scenario, build_scenarios, compare, create_admin, run_benchmarks, uncovered_routes
+from .explain import advise, full_scans
+from .seed import seed
+from .serialization import run_serialization_benchmark
+
+
+class ScenarioCoverageTests(TestCase):
+    def test_every_route_has_a_scenario(self):
+        ids = {'specialization_id': 1, 'doctor_id': 1, 'patient_id': 1, 'record_id': 1, 'appointment_id': 1}
+        self.assertEqual(uncovered_routes(build_scenarios(ids, 'token')), [])
+
+    def test_missing_routes_are_reported(self):
+        self.assertIn('doctor-list', uncovered_routes([Scenario('patient-list')]))
+
+
+class BaselineComparisonTests(TestCase):
+    baseline = {'doctor-list': {'queries': 3, 'p50_ms': 10.0, 'p95_ms': 20.0}}
+
+    def test_more_queries_is_a_regression(self):
+        results = {'doctor-list': {'queries': 4, 'p50_ms': 10.0, 'p95_ms': 20.0}}
+        self.assertEqual(compare(results, self.baseline), ['doctor-list: 4 queries (baseline 3)'])
+
+    def test_latency_within_tolerance_passes(self):
+        results = {'doctor-list': {'queries': 3, 'p50_ms': 13.0, 'p95_ms': 25.0}}
+        self.assertEqual(compare(results, self.baseline), [])
+
+    def test_slower_latency_is_a_regression(self):
+        results = {'doctor-list': {'queries': 2, 'p50_ms': 10.0, 'p95_ms': 30.0}}
+        self.assertEqual(compare(results, self.baseline), ['doctor-list: p95_ms 30.0 (baseline 20.0)'])
+
+    def test_endpoints_without_baseline_are_reported(self):
+        results = {'user-list': {'queries': 30, 'p50_ms': 100.0, 'p95_ms': 200.0}}
+        self.assertEqual(compare(results, self.baseline), ['user-list: no baseline'])
+
+
+class BenchmarkSmokeTests(TestCase):
+    def test_all_scenarios_succeed_on_seeded_data(self):
+        cache.clear()
+        ids = seed(doctors=3, patients=5, appointments=20, records_per_patient=2)
+        create_admin()
+        results = run_benchmarks(ids, iterations=1)
+        self.assertEqual(set(results), {scenario.label for scenario in build_scenarios(ids, '')})
+        self.assertTrue(all(result['queries'] >= 0 for result in results.values()))
+
+
+class IndexAdvisorTests(TestCase):
+    def test_unindexed_filter_is_a_full_scan(self):
+        sql, params = User.objects.filter(phone_number='0700000000').query.sql_with_params()
+        self.assertEqual(full_scans(sql, params), ['users_user'])
+
+    def test_indexed_filter_is_not(self):
+        users = User.objects.filter(user_type='doctor').order_by('-created_at', '-id')
+        sql, params = users.query.sql_with_params()
+        self.assertEqual(full_scans(sql, params), [])
+
+    def test_benchmarked_endpoints_avoid_full_scans(self):
+        cache.clear()
+        ids = seed(doctors=3, patients=5, appointments=20, records_per_patient=2)
+        create_admin()
+        self.assertEqual(advise(ids), [])
+
+
+class SerializationBenchmarkTests(TestCase):
+    def test_fast_path_renders_identical_json(self):
+        seed(doctors=4, patients=4, appointments=0, records_per_patient=2)
+        results = run_serialization_benchmark(rows=(3,), repeat=1)
+        self.assertEqual({name for name, _ in results}, {'doctor-list', 'user-list', 'patient-list'})
+        for result in results.values():
+            self.assertTrue(result['identical'])
+            self.assertEqual(result['rows'], 3)
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+        self.client = APIClient()
+        self.client.force_authenticate(create_admin())
+
+    def test_requests_are_recorded_per_url_name(self):
+        self.client.get(reverse('doctor-list'))
+        self.client.get(reverse('doctor-list'))
+        routes = parse(registry.render())
+        histograms = routes[('doctor-list', 'GET')]
+        self.assertEqual(histograms['http_request_duration_seconds']['count'], 2)
+        self.assertGreater(histograms['http_request_sql_queries']['sum'], 0)
+        self.assertGreater(histograms['http_request_sql_duration_seconds']['sum'], 0)
+        self.assertGreater(histograms['http_response_render_seconds']['sum'], 0)
+        self.assertGreater(histograms['http_response_size_bytes']['sum'], 0)
+
+    def test_metrics_endpoint_serves_prometheus_text(self):
+        self.client.get(reverse('doctor-list'))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertIn('http_responses_total{route="doctor-list",method="GET",status="200"} 1', response.content.decode())
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_endpoint_requires_the_token_when_set(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(PRODUCTION=True, METRICS_TOKEN=None)
+    def test_metrics_endpoint_is_closed_in_production_without_a_token(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+
+    def test_quantile_interpolates_within_a_bucket(self):
+        buckets = [(0.01, 50), (0.1, 100), (float('inf'), 100)]
+        self.assertAlmostEqual(quantile(0.75, buckets), 0.055)
+
+    def test_slow_routes_are_ordered_slowest_first(self):
+        self.client.get(reverse('doctor-list'))
+        self.client.get(reverse('specialization-list'))
+        rows = slow_routes(parse(registry.render()), order='total')
+        self.assertEqual({row['route'] for row in rows}, {'doctor-list', 'specialization-list'})
+        self.assertGreaterEqual(rows[0]['total_s'], rows[1]['total_s'])
+
+
+class DatabaseConfigTests(SimpleTestCase):
+    databases = ['default']
+
+    def test_sqlite_paths_are_relative_to_the_project(self):
+        config = database_config('sqlite:///db.sqlite3', Path('/srv/app'), conn_max_age=30)
+        self.assertEqual(config['NAME'], Path('/srv/app/db.sqlite3'))
+        self.assertEqual(config['CONN_MAX_AGE'], 30)
+        self.assertTrue(config['CONN_HEALTH_CHECKS'])
+        self.assertEqual(database_config('sqlite:////tmp/app.db', Path('/srv/app'))['NAME'], '/tmp/app.db')
+
+    def test_postgres_url(self):
+        config = database_config('postgres://app:p%40ss@db:5433/healthcare?sslmode=require', Path('/srv/app'))
+        self.assertEqual(config['ENGINE'], 'django.db.backends.postgresql')
+        self.assertEqual((config['NAME'], config['USER'], config['PASSWORD'], config['HOST'], config['PORT']),
+                         ('healthcare', 'app', 'p@ss', 'db', '5433'))
+        self.assertEqual(config['OPTIONS'], {'sslmode': 'require'})
+
+    def test_pgbouncer_disables_server_side_cursors(self):
+        config = database_config('postgres://app@db/healthcare', Path('/srv/app'), pool='pgbouncer')
+        self.assertTrue(config['DISABLE_SERVER_SIDE_CURSORS'])
+
+    def test_pools_require_postgres(self):
+        with self.assertRaises(ImproperlyConfigured):
+            database_config('sqlite:///db.sqlite3', Path('/srv/app'), pool='pgbouncer')
+        with self.assertRaises(ImproperlyConfigured):
+            database_config('mysql://app@db/healthcare', Path('/srv/app'))
+
+    def test_sqlite_pragmas_are_applied(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
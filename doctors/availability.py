@@ -0,0 +1,144 @@
+"""
+Weekly availability bitmaps for doctors.
+
+A doctor's available DoctorAvailability windows are folded into seven integer
+bitsets, one per weekday, with one bit per ``AVAILABILITY_SLOT_MINUTES`` slot.
+Checking whether an appointment fits becomes a mask test instead of a query.
+
+Windows are rounded inwards and appointments outwards to the slot grid, so a
+check never accepts time the doctor has not published. Bitmaps are cached in
+Django's cache and dropped whenever one of the doctor's windows changes.
+"""
+from datetime import date, time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from .models import DoctorAvailability
+
+DAYS = [day for day, _ in DoctorAvailability.DAY_CHOICES]
+CACHE_KEY = 'doctors:availability:{doctor_id}'
+
+
+def slot_minutes():
+    return getattr(settings, 'AVAILABILITY_SLOT_MINUTES', 5)
+
+
+def to_seconds(value):
+    if isinstance(value, str):
+        value = time.fromisoformat(value)
+    return value.hour * 3600 + value.minute * 60 + value.second
+
+
+def day_index(value):
+    if isinstance(value, str):
+        if value in DAYS:
+            return DAYS.index(value)
+        value = date.fromisoformat(value)
+    if isinstance(value, date):
+        return value.weekday()
+    return value
+
+
+class WeeklyAvailability:
+    __slots__ = ('days', 'slot_minutes')
+
+    def __init__(self, days=None, slot_minutes=5):
+        self.days = list(days) if days is not None else [0] * 7
+        self.slot_minutes = slot_minutes
+
+    @classmethod
+    def from_windows(cls, windows, slot_minutes):
+        availability = cls(slot_minutes=slot_minutes)
+        for day, start_time, end_time in windows:
+            availability.add(day, start_time, end_time)
+        return availability
+
+    @property
+    def slot_seconds(self):
+        return self.slot_minutes * 60
+
+    def add(self, day, start_time, end_time):
+        # Only slots entirely inside the window count as available
+        first = -(-to_seconds(start_time) // self.slot_seconds)
+        last = to_seconds(end_time) // self.slot_seconds
+        if last > first:
+            self.days[day_index(day)] |= ((1 << (last - first)) - 1) << first
+
+    def covers(self, day, start_time, end_time):
+        # Every slot the appointment touches must be available
+        first = to_seconds(start_time) // self.slot_seconds
+        last = -(-to_seconds(end_time) // self.slot_seconds)
+        if last <= first:
+            return False
+        mask = ((1 << (last - first)) - 1) << first
+        return self.days[day_index(day)] & mask == mask
+
+    def windows(self, day):
+        """Yield the (start, end) second offsets of each contiguous free run."""
+        bits = self.days[day_index(day)]
+        slot = 0
+        while bits:
+            skip = (bits & -bits).bit_length() - 1
+            bits >>= skip
+            slot += skip
+            run = (~bits & (bits + 1)).bit_length() - 1
+            yield slot * self.slot_seconds, (slot + run) * self.slot_seconds
+            bits >>= run
+            slot += run
+
+    def to_cache(self):
+        return (self.slot_minutes, tuple(self.days))
+
+    @classmethod
+    def from_cache(cls, value):
+        granularity, days = value
+        return cls(days, slot_minutes=granularity)
+
+
+def get_weekly_availabilities(doctor_ids):
+    """Return {doctor_id: WeeklyAvailability}, building cache misses with one query."""
+    granularity = slot_minutes()
+    keys = {CACHE_KEY.format(doctor_id=doctor_id): doctor_id for doctor_id in doctor_ids}
+    result = {}
+    for key, value in cache.get_many(keys).items():
+        if value[0] == granularity:
+            result[keys[key]] = WeeklyAvailability.from_cache(value)
+
+    missing = [doctor_id for doctor_id in keys.values() if doctor_id not in result]
+    if missing:
+        windows = {doctor_id: [] for doctor_id in missing}
+        rows = DoctorAvailability.objects.filter(
+            doctor_id__in=missing,
+            is_available=True
+        ).values_list('doctor_id', 'day', 'start_time', 'end_time')
+        for doctor_id, day, start_time, end_time in rows:
+            windows[doctor_id].append((day, start_time, end_time))
+        built = {
+            doctor_id: WeeklyAvailability.from_windows(doctor_windows, granularity)
+            for doctor_id, doctor_windows in windows.items()
+        }
+        result.update(built)
+        # Rows read inside an open transaction may still be rolled back
+        if not connection.in_atomic_block:
+            cache.set_many({
+                CACHE_KEY.format(doctor_id=doctor_id): availability.to_cache()
+                for doctor_id, availability in built.items()
+            }, timeout=None)
+    return result
+
+
+def get_weekly_availability(doctor_id):
+    return get_weekly_availabilities([doctor_id])[doctor_id]
+
+
+def is_available(doctor_id, appointment_date, start_time, end_time):
+    return get_weekly_availability(doctor_id).covers(appointment_date, start_time, end_time)
+
+
+def invalidate(doctor_id):
+    key = CACHE_KEY.format(doctor_id=doctor_id)
+    cache.delete(key)
+    # Drop it again on commit in case another request cached the old rows meanwhile
+    transaction.on_commit(lambda: cache.delete(key))
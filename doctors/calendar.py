@@ -0,0 +1,109 @@
+"""
+Per-day schedule projection behind the doctor calendar endpoint.
+
+Each (doctor, date) is projected once into its busy segments (active
+appointments) and free segments (published availability minus those bookings)
+and kept in Django's cache. A week or month view is then one ``get_many`` of
+day entries; only missing days are built, with one appointment query for all
+of them.
+
+A day entry is dropped whenever an appointment on that day is saved, moved or
+deleted. Availability changes affect every date of a weekday, so they bump
+the doctor's ``calendar:<id>`` read-cache namespace instead, and that version
+is part of every day key.
+"""
+from datetime import time
+
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from appointments.conflicts import to_date
+from appointments.models import Appointment
+from healthcaresystem.caching import namespace_versions
+from .availability import get_weekly_availability, to_seconds
+from .models import Doctor
+
+CACHE_KEY = 'doctors:calendar:{doctor_id}:{generation}:{date}'
+CACHE_TIMEOUT = 24 * 60 * 60
+
+
+def generation(doctor_id):
+    return namespace_versions([f'calendar:{doctor_id}'])[0]
+
+
+def day_key(doctor_id, generation, day):
+    return CACHE_KEY.format(doctor_id=doctor_id, generation=generation, date=day.isoformat())
+
+
+def clock(seconds):
+    return time(seconds // 3600, seconds % 3600 // 60, seconds % 60).isoformat()
+
+
+def project_day(day, availability, bookings):
+    """Return the day's free and busy segments; ``bookings`` are (start, end, id, status) sorted by start."""
+    busy = [
+        {'start': clock(start), 'end': clock(end), 'appointment_id': pk, 'status': status}
+        for start, end, pk, status in bookings
+    ]
+    free = []
+    for window_start, window_end in availability.windows(day):
+        cursor = window_start
+        for start, end, _, _ in bookings:
+            if end <= cursor or start >= window_end:
+                continue
+            if start > cursor:
+                free.append({'start': clock(cursor), 'end': clock(start)})
+            cursor = max(cursor, end)
+        if cursor < window_end:
+            free.append({'start': clock(cursor), 'end': clock(window_end)})
+    return {'date': day.isoformat(), 'free': free, 'busy': busy}
+
+
+def build_days(doctor_id, days):
+    availability = get_weekly_availability(doctor_id)
+    bookings = {day: [] for day in days}
+    rows = Appointment.objects.filter(
+        doctor_id=doctor_id,
+        appointment_date__range=(min(days), max(days)),
+        status__in=Appointment.ACTIVE_STATUSES
+    ).order_by('appointment_date', 'start_time').values_list(
+        'appointment_date', 'start_time', 'end_time', 'id', 'status'
+    )
+    for day, start_time, end_time, pk, status in rows:
+        if day in bookings:
+            bookings[day].append((to_seconds(start_time), to_seconds(end_time), pk, status))
+    return {day: project_day(day, availability, day_bookings) for day, day_bookings in bookings.items()}
+
+
+def get_calendar(doctor_id, days):
+    """Return the projections of ``days`` in order, or None if the doctor does not exist."""
+    current = generation(doctor_id)
+    keys = {day_key(doctor_id, current, day): day for day in days}
+    found = {keys[key]: value for key, value in cache.get_many(keys).items()}
+    missing = [day for day in days if day not in found]
+    if missing:
+        # Entries only exist for doctors that did, and deleting one bumps the generation
+        if not Doctor.objects.filter(pk=doctor_id).exists():
+            return None
+        built = build_days(doctor_id, missing)
+        found.update(built)
+        # Rows read inside an open transaction may still be rolled back
+        if not connection.in_atomic_block:
+            cache.set_many({day_key(doctor_id, current, day): value for day, value in built.items()},
+                           timeout=CACHE_TIMEOUT)
+    return [found[day] for day in days]
+
+
+def without_bookings(days):
+    """``days`` with only the times of the busy segments, for callers who may not see whose they are."""
+    return [
+        dict(day, busy=[{'start': segment['start'], 'end': segment['end']} for segment in day['busy']])
+        for day in days
+    ]
+
+
+def invalidate_day(doctor_id, day):
+    key = day_key(doctor_id, generation(doctor_id), to_date(day))
+    cache.delete(key)
+    # Drop it again on commit in case another request cached the old rows meanwhile
+    transaction.on_commit(lambda: cache.delete(key))
@@ -0,0 +1,195 @@
+"""
+Facet counts for the doctor list filters.
+
+The list can be filtered by specialization, experience band, fee band and
+availability. Counting doctors per filter value on every page load would be a
+GROUP BY over the doctors table. Instead, DoctorFacetCell keeps one counter
+per combination of the four values: doctor signals move a doctor between cells
+as it changes, and the ``refresh_doctor_facets`` beat task recounts the table
+and corrects the cells that drifted through writes that skip signals. There are only a few hundred cells, so they
+are cached whole and every count is summed from them in Python.
+
+Counts are disjunctive: each facet is counted with the other facets' filters
+applied but not its own, so the client can show how many doctors every
+alternative value would return. A text search narrows the list to at most a
+few hundred ranked matches, whose cells are then built on the fly.
+"""
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F
+
+from healthcaresystem.caching import invalidate as invalidate_reads, namespace_versions
+from .models import Doctor, DoctorFacetCell, Specialization
+
+# (key, lowest, first value above the band); None means unbounded
+EXPERIENCE_BANDS = (('0-4', 0, 5), ('5-9', 5, 10), ('10-19', 10, 20), ('20+', 20, None))
+FEE_BANDS = (('0-49', 0, 50), ('50-99', 50, 100), ('100-199', 100, 200), ('200-499', 200, 500), ('500+', 500, None))
+FACETS = ('specialization', 'experience', 'fee', 'is_available')
+FACET_FIELDS = {'specialization', 'specialization_id', 'years_of_experience', 'consultation_fee', 'is_available'}
+CELL_FIELDS = ('specialization_key', 'experience_band', 'fee_band', 'is_available')
+
+NAMESPACE = 'doctor-facets'
+CACHE_KEY = 'doctors:facets:{facets}:{specializations}'
+CACHE_TIMEOUT = 60 * 60
+BATCH_SIZE = 2000
+
+
+def band(bands, value):
+    for index, (_, low, high) in enumerate(bands):
+        if value >= low and (high is None or value < high):
+            return index
+    return 0
+
+
+def cell(specialization_id, years_of_experience, consultation_fee, is_available):
+    return (specialization_id or 0, band(EXPERIENCE_BANDS, years_of_experience),
+            band(FEE_BANDS, consultation_fee), is_available)
+
+
+def cell_of(doctor):
+    return cell(doctor.specialization_id, doctor.years_of_experience, doctor.consultation_fee, doctor.is_available)
+
+
+def stored_cell(doctor_id):
+    row = Doctor.objects.filter(pk=doctor_id).values_list(
+        'specialization_id', 'years_of_experience', 'consultation_fee', 'is_available'
+    ).first()
+    return cell(*row) if row else None
+
+
+def shift(before, after):
+    """Move one doctor from cell ``before`` to cell ``after``; either may be None."""
+    if before == after:
+        return
+    if before is not None:
+        DoctorFacetCell.objects.filter(**dict(zip(CELL_FIELDS, before))).update(count=F('count') - 1)
+    if after is not None:
+        fields = dict(zip(CELL_FIELDS, after))
+        DoctorFacetCell.objects.bulk_create([DoctorFacetCell(**fields)], ignore_conflicts=True)
+        DoctorFacetCell.objects.filter(**fields).update(count=F('count') + 1)
+    invalidate_reads(NAMESPACE)
+
+
+def drop_specialization(specialization_id):
+    """Merge the cells of a deleted specialization into those of no specialization."""
+    with transaction.atomic():
+        moved = DoctorFacetCell.objects.filter(specialization_key=specialization_id, count__gt=0)
+        cells = list(moved.values_list(*CELL_FIELDS[1:], 'count'))
+        if cells:
+            DoctorFacetCell.objects.bulk_create(
+                [DoctorFacetCell(**dict(zip(CELL_FIELDS, (0,) + row[:-1]))) for row in cells],
+                ignore_conflicts=True
+            )
+            for row in cells:
+                DoctorFacetCell.objects.filter(**dict(zip(CELL_FIELDS, (0,) + row[:-1]))).update(
+                    count=F('count') + row[-1]
+                )
+        DoctorFacetCell.objects.filter(specialization_key=specialization_id).delete()
+        invalidate_reads(NAMESPACE)
+
+
+def cells_from_rows(rows):
+    counts = Counter(cell(*row) for row in rows)
+    return [key + (count,) for key, count in counts.items()]
+
+
+def rebuild():
+    """Recount every cell from the doctors table; returns the number of cells."""
+    with transaction.atomic():
+        # A Doctor save shifts cells in its own transaction. Locking the cells first means one
+        # that already shifted has committed before the recount, and one that has not waits for it.
+        stored = {
+            row[:-1]: row[-1]
+            for row in DoctorFacetCell.objects.select_for_update().values_list(*CELL_FIELDS, 'count')
+        }
+        rows = Doctor.objects.values_list(
+            'specialization_id', 'years_of_experience', 'consultation_fee', 'is_available'
+        ).iterator(chunk_size=BATCH_SIZE)
+        counts = Counter(cell(*row) for row in rows)
+        DoctorFacetCell.objects.bulk_create(
+            [DoctorFacetCell(**dict(zip(CELL_FIELDS, key))) for key in counts if key not in stored],
+            batch_size=BATCH_SIZE, ignore_conflicts=True
+        )
+        # Only cells that drifted are written, by their difference from the locked count
+        for key in stored.keys() | counts.keys():
+            drift = counts[key] - stored.get(key, 0)
+            if drift:
+                DoctorFacetCell.objects.filter(**dict(zip(CELL_FIELDS, key))).update(count=F('count') + drift)
+        DoctorFacetCell.objects.filter(count=0).delete()
+        invalidate_reads(NAMESPACE)
+    return len(counts)
+
+
+def stored_cells():
+    """Return the cached {'cells': [(*cell, count)], 'names': {specialization id: name}}."""
+    facets, specializations = namespace_versions([NAMESPACE, 'specializations'])
+    key = CACHE_KEY.format(facets=facets, specializations=specializations)
+    cube = cache.get(key)
+    if cube is None:
+        cube = {
+            'cells': list(DoctorFacetCell.objects.filter(count__gt=0).values_list(*CELL_FIELDS, 'count')),
+            'names': dict(Specialization.objects.values_list('id', 'name')),
+        }
+        # Rows read inside an open transaction may still be rolled back
+        if not connection.in_atomic_block:
+            cache.set(key, cube, timeout=CACHE_TIMEOUT)
+    return cube
+
+
+def count(cells, filters):
+    """Sum ``cells`` per facet value; ``filters`` maps facets to cell values."""
+    totals = {facet: Counter() for facet in FACETS}
+    for row in cells:
+        values = dict(zip(FACETS, row))
+        misses = [facet for facet in filters if values[facet] != filters[facet]]
+        if not misses:
+            for facet in FACETS:
+                totals[facet][values[facet]] += row[-1]
+        elif len(misses) == 1:
+            # The row only fails its own facet's filter, so it counts towards that facet alone
+            totals[misses[0]][values[misses[0]]] += row[-1]
+    return totals
+
+
+def facet_counts(filters, names, cells):
+    totals = count(cells, filters)
+    specializations = sorted(
+        (key for key in totals['specialization'] if key in names),
+        key=lambda key: names[key]
+    )
+    return {
+        'specialization': [
+            {'value': key, 'label': names[key], 'count': totals['specialization'][key]}
+            for key in specializations
+        ],
+        'experience': [
+            {'value': key, 'count': totals['experience'][index]}
+            for index, (key, _, _) in enumerate(EXPERIENCE_BANDS)
+        ],
+        'fee': [
+            {'value': key, 'count': totals['fee'][index]}
+            for index, (key, _, _) in enumerate(FEE_BANDS)
+        ],
+        'is_available': [
+            {'value': value, 'count': totals['is_available'][value]}
+            for value in (True, False)
+        ],
+    }
+
+
+def get_facets(filters, doctors=None):
+    """
+    Facet counts for the list filtered by ``filters``.
+
+    ``doctors`` restricts the counts to a queryset, e.g. the matches of a text
+    search, and is counted directly instead of from the stored cells.
+    """
+    cube = stored_cells()
+    cells = cube['cells']
+    if doctors is not None:
+        cells = cells_from_rows(doctors.values_list(
+            'specialization_id', 'years_of_experience', 'consultation_fee', 'is_available'
+        ))
+    return facet_counts(filters, cube['names'], cells)
@@ -0,0 +1,56 @@
+from rest_framework.filters import BaseFilterBackend
+
+from .facets import EXPERIENCE_BANDS, FEE_BANDS, get_facets
+from .models import Doctor
+from .serializers import DoctorFacetQuerySerializer
+
+
+def band_range(bands, key):
+    for index, (band_key, low, high) in enumerate(bands):
+        if band_key == key:
+            return index, low, high
+
+
+class DoctorFacetFilter(BaseFilterBackend):
+    """
+    Filters the doctor list by ``specialization``, ``experience`` band, ``fee``
+    band and ``is_available``, and with ``?facets=true`` computes the counts
+    the list view returns alongside the page.
+    """
+    facets_query_param = 'facets'
+
+    def get_filters(self, request):
+        """Return the request's filters as facet cell values plus the matching queryset lookups."""
+        params = DoctorFacetQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        data = params.validated_data
+        filters, lookups = {}, {}
+        if 'specialization' in data:
+            filters['specialization'] = lookups['specialization_id'] = data['specialization']
+        for facet, bands, field in (('experience', EXPERIENCE_BANDS, 'years_of_experience'),
+                                    ('fee', FEE_BANDS, 'consultation_fee')):
+            if facet in data:
+                filters[facet], low, high = band_range(bands, data[facet])
+                lookups[f'{field}__gte'] = low
+                if high is not None:
+                    lookups[f'{field}__lt'] = high
+        if data.get('is_available') is not None:
+            filters['is_available'] = lookups['is_available'] = data['is_available']
+        return filters, lookups
+
+    def filter_queryset(self, request, queryset, view):
+        _, lookups = self.get_filters(request)
+        return queryset.filter(**lookups) if lookups else queryset
+
+    def facets_requested(self, request):
+        return request.query_params.get(self.facets_query_param, '').lower() in ('1', 'true', 'yes')
+
+    def get_facets(self, request, view):
+        filters, _ = self.get_filters(request)
+        doctors = None
+        for backend in view.filter_backends:
+            # A text search narrows the list to its ranked matches; count within the best of those
+            if hasattr(backend, 'get_search_terms') and backend().get_search_terms(request):
+                search = getattr(backend(), 'matches', backend().filter_queryset)
+                doctors = search(request, Doctor.objects.all(), view)
+        return get_facets(filters, doctors)
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.10 on 2026-10-18 10:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctors', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='doctor',
+            index=models.Index(fields=['created_at', 'id'], name='doctor_created_id_idx'),
+        ),
+    ]
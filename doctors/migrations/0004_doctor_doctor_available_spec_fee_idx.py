@@ -0,0 +1,17 @@
+# Generated by Django 4.2.10 on 2026-10-18 11:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctors', '0003_doctor_doctor_created_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='doctor',
+            index=models.Index(condition=models.Q(('is_available', True)), fields=['specialization', 'consultation_fee'], name='doctor_available_spec_fee_idx'),
+        ),
+    ]
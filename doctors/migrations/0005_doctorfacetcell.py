@@ -0,0 +1,58 @@
+# Generated by Django 4.2.10 on 2026-10-18 11:32
+
+from collections import Counter
+
+from django.db import migrations, models
+
+
+# The bands as of this migration; later changes to doctors.facets must not change what it counts
+EXPERIENCE_BANDS = ((0, 5), (5, 10), (10, 20), (20, None))
+FEE_BANDS = ((0, 50), (50, 100), (100, 200), (200, 500), (500, None))
+
+
+def band(bands, value):
+    for index, (low, high) in enumerate(bands):
+        if value >= low and (high is None or value < high):
+            return index
+    return 0
+
+
+def count_facets(apps, schema_editor):
+    Doctor = apps.get_model('doctors', 'Doctor')
+    DoctorFacetCell = apps.get_model('doctors', 'DoctorFacetCell')
+    counts = Counter(
+        (specialization_id or 0, band(EXPERIENCE_BANDS, years), band(FEE_BANDS, fee), is_available)
+        for specialization_id, years, fee, is_available in Doctor.objects.values_list(
+            'specialization_id', 'years_of_experience', 'consultation_fee', 'is_available'
+        ).iterator(chunk_size=2000)
+    )
+    DoctorFacetCell.objects.bulk_create([
+        DoctorFacetCell(specialization_key=key[0], experience_band=key[1], fee_band=key[2],
+                        is_available=key[3], count=count)
+        for key, count in counts.items()
+    ], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctors', '0004_doctor_doctor_available_spec_fee_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DoctorFacetCell',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('specialization_key', models.PositiveIntegerField()),
+                ('experience_band', models.PositiveSmallIntegerField()),
+                ('fee_band', models.PositiveSmallIntegerField()),
+                ('is_available', models.BooleanField()),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('specialization_key', 'experience_band', 'fee_band', 'is_available')},
+            },
+        ),
+        migrations.RunPython(count_facets, migrations.RunPython.noop),
+    ]
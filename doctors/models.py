@@ -1,4 +1,7 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from healthcaresystem.caching import invalidate as invalidate_reads
 from users.models import User
 
 class Specialization(models.Model):
@@ -8,6 +11,11 @@ class Specialization(models.Model):
     def __str__(self):
         return self.name
 
+class DoctorQuerySet(models.QuerySet):
+    def for_listing(self):
+        # DoctorSerializer renders the user and the specialization name
+        return self.select_related('user', 'specialization')
+
 class Doctor(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='doctor_profile')
     specialization = models.ForeignKey(Specialization, on_delete=models.SET_NULL, null=True)
@@ -18,9 +26,24 @@ class Doctor(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = DoctorQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='doctor_created_id_idx'),
+            # Bookable doctors by specialization and fee
+            models.Index(fields=['specialization', 'consultation_fee'], condition=models.Q(is_available=True),
+                         name='doctor_available_spec_fee_idx'),
+        ]
+
     def __str__(self):
         return f"Dr. {self.user.get_full_name()} - {self.specialization}"
 
+    def save(self, *args, **kwargs):
+        # The facet cells are shifted by the signals below and must commit with the row
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
 class DoctorAvailability(models.Model):
     DAY_CHOICES = (
         ('monday', 'Monday'),
@@ -44,3 +67,69 @@ class DoctorAvailability(models.Model):
 
     def __str__(self):
         return f"{self.doctor} - {self.day} ({self.start_time} to {self.end_time})"
+
+class DoctorFacetCell(models.Model):
+    """Number of doctors per combination of the list filters, kept by doctors/facets.py."""
+    # 0 when the doctor has no specialization
+    specialization_key = models.PositiveIntegerField()
+    experience_band = models.PositiveSmallIntegerField()
+    fee_band = models.PositiveSmallIntegerField()
+    is_available = models.BooleanField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('specialization_key', 'experience_band', 'fee_band', 'is_available')
+
+@receiver(post_save, sender=DoctorAvailability)
+@receiver(post_delete, sender=DoctorAvailability)
+def availability_changed(sender, instance, **kwargs):
+    from .availability import invalidate
+    invalidate(instance.doctor_id)
+    invalidate_reads(f'doctor:{instance.doctor_id}', f'calendar:{instance.doctor_id}')
+
+@receiver(post_save, sender=Specialization)
+@receiver(post_delete, sender=Specialization)
+def specialization_changed(sender, instance, **kwargs):
+    # Doctor profiles embed the specialization name, so they depend on this namespace too
+    invalidate_reads('specializations')
+
+@receiver(post_delete, sender=Specialization)
+def specialization_deleted(sender, instance, **kwargs):
+    # Its doctors were moved to no specialization by a bulk UPDATE, which sends no signals
+    from .facets import drop_specialization
+    drop_specialization(instance.pk)
+
+@receiver(post_save, sender=Doctor)
+@receiver(post_delete, sender=Doctor)
+def doctor_changed(sender, instance, **kwargs):
+    invalidate_reads(f'doctor:{instance.id}', f'calendar:{instance.id}')
+
+@receiver(pre_save, sender=Doctor)
+def remember_doctor_facets(sender, instance, raw=False, update_fields=None, **kwargs):
+    from .facets import FACET_FIELDS, stored_cell
+    if raw or (update_fields and not set(update_fields) & FACET_FIELDS):
+        instance._facet_cell = False
+        return
+    instance._facet_cell = stored_cell(instance.pk) if instance.pk else None
+
+@receiver(post_save, sender=Doctor)
+def doctor_facets_changed(sender, instance, **kwargs):
+    from .facets import cell_of, shift
+    before = getattr(instance, '_facet_cell', False)
+    if before is not False:
+        shift(before, cell_of(instance))
+
+@receiver(post_delete, sender=Doctor)
+def doctor_facets_deleted(sender, instance, **kwargs):
+    from .facets import cell_of, shift
+    shift(cell_of(instance), None)
+
+@receiver(post_save, sender=User)
+def doctor_user_changed(sender, instance, created, update_fields=None, **kwargs):
+    # Logins and password changes do not show up in the doctor profile
+    if created or instance.user_type != 'doctor':
+        return
+    if update_fields and set(update_fields) <= {'last_login', 'password'}:
+        return
+    for doctor_id in Doctor.objects.filter(user_id=instance.id).values_list('id', flat=True):
+        invalidate_reads(f'doctor:{doctor_id}')
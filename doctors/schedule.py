@@ -0,0 +1,102 @@
+"""
+Publishing a doctor's weekly availability template.
+
+Doctors re-submit their whole week, usually unchanged. The submitted windows
+are first merged per day, so overlapping or touching windows become one. The
+result is then diffed against the stored DoctorAvailability rows:
+- exact matches are left alone
+- rows that are no longer wanted are reused for new windows on the same day
+- anything left over is created or deleted
+
+A resubmitted template costs one read and no writes. A changed one costs at
+most one delete, one bulk_update and one bulk_create, in a single transaction.
+None of them send signals, so the caches are invalidated once at the end.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+
+from healthcaresystem.caching import invalidate as invalidate_reads
+from .availability import DAYS, invalidate as invalidate_availability
+from .models import DoctorAvailability
+
+
+def merge_windows(windows):
+    """Return sorted (day, start_time, end_time, is_available) with overlapping windows merged."""
+    groups = defaultdict(list)
+    for window in windows:
+        groups[(window['day'], window.get('is_available', True))].append((window['start_time'], window['end_time']))
+
+    merged = {}
+    for (day, is_available), intervals in groups.items():
+        intervals.sort()
+        runs = [list(intervals[0])]
+        for start, end in intervals[1:]:
+            if start <= runs[-1][1]:
+                runs[-1][1] = max(runs[-1][1], end)
+            else:
+                runs.append([start, end])
+        for start, end in runs:
+            # A blocked window wins over an open one with the same times (they share a unique key)
+            merged[(day, start, end)] = merged.get((day, start, end), True) and is_available
+    return sorted(
+        ((day, start, end, is_available) for (day, start, end), is_available in merged.items()),
+        key=lambda window: (DAYS.index(window[0]), window[1], window[2])
+    )
+
+
+def publish(doctor, windows):
+    """Make ``windows`` the doctor's availability and return the rows and what changed."""
+    merged = merge_windows(windows)
+    # Any error fails the whole request, so there is nothing to gain from a savepoint
+    with transaction.atomic(savepoint=False):
+        existing = {
+            (row.day, row.start_time, row.end_time): row
+            for row in DoctorAvailability.objects.select_for_update().filter(doctor=doctor)
+        }
+        rows, updated, new = [], [], []
+        for day, start_time, end_time, is_available in merged:
+            row = existing.pop((day, start_time, end_time), None)
+            if row is None:
+                new.append((day, start_time, end_time, is_available))
+                continue
+            if row.is_available != is_available:
+                row.is_available = is_available
+                updated.append(row)
+            rows.append(row)
+
+        # Rows left in ``existing`` are no longer wanted; move them onto new windows of the same day
+        spare = defaultdict(list)
+        for row in sorted(existing.values(), key=lambda row: row.start_time):
+            spare[row.day].append(row)
+        created = []
+        for day, start_time, end_time, is_available in new:
+            if spare[day]:
+                row = spare[day].pop(0)
+                row.start_time, row.end_time, row.is_available = start_time, end_time, is_available
+                updated.append(row)
+            else:
+                row = DoctorAvailability(doctor=doctor, day=day, start_time=start_time,
+                                         end_time=end_time, is_available=is_available)
+                created.append(row)
+            rows.append(row)
+        deleted = [row.id for day_rows in spare.values() for row in day_rows]
+
+        # Deletes first, so a reused row never collides with one that is going away
+        if deleted:
+            DoctorAvailability.objects.filter(id__in=deleted)._raw_delete(DoctorAvailability.objects.db)
+        if updated:
+            DoctorAvailability.objects.bulk_update(updated, ['start_time', 'end_time', 'is_available'])
+        if created:
+            DoctorAvailability.objects.bulk_create(created)
+        if deleted or updated or created:
+            # These writes skip the availability_changed signal
+            invalidate_availability(doctor.id)
+            invalidate_reads(f'doctor:{doctor.id}', f'calendar:{doctor.id}')
+
+    return {
+        'availabilities': sorted(rows, key=lambda row: (DAYS.index(row.day), row.start_time)),
+        'created': len(created),
+        'updated': len(updated),
+        'deleted': len(deleted),
+    }
@@ -1 +1,81 @@
- 
\ No newline at end of file
+from rest_framework import serializers
+from users.models import User
+from users.serializers import UserSerializer
+from .models import Doctor, Specialization, DoctorAvailability
+from healthcaresystem.fieldsets import SparseFieldsetMixin
+from .facets import EXPERIENCE_BANDS, FEE_BANDS
+from .schedule import publish
+
+class SpecializationSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Specialization
+        fields = ('id', 'name', 'description')
+
+class DoctorSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    user = UserSerializer(read_only=True)
+    user_id = serializers.PrimaryKeyRelatedField(
+        source='user',
+        queryset=User.objects.filter(user_type='doctor'),
+        write_only=True
+    )
+    specialization_name = serializers.CharField(source='specialization.name', read_only=True, default=None)
+
+    class Meta:
+        model = Doctor
+        fields = ('id', 'user', 'user_id', 'specialization', 'specialization_name',
+                 'license_number', 'years_of_experience', 'consultation_fee',
+                 'is_available', 'created_at', 'updated_at')
+        read_only_fields = ('id', 'created_at', 'updated_at')
+
+class DoctorAvailabilitySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    class Meta:
+        model = DoctorAvailability
+        fields = ('id', 'doctor', 'day', 'start_time', 'end_time', 'is_available')
+        read_only_fields = ('id', 'doctor')
+
+    def validate(self, attrs):
+        start_time = attrs.get('start_time', getattr(self.instance, 'start_time', None))
+        end_time = attrs.get('end_time', getattr(self.instance, 'end_time', None))
+        if start_time and end_time and start_time >= end_time:
+            raise serializers.ValidationError("End time must be after start time")
+        return attrs
+
+class DoctorAvailabilityBulkCreateSerializer(serializers.Serializer):
+    """The doctor's full weekly template; windows missing from it are removed."""
+    availabilities = DoctorAvailabilitySerializer(many=True)
+    created = serializers.IntegerField(read_only=True)
+    updated = serializers.IntegerField(read_only=True)
+    deleted = serializers.IntegerField(read_only=True)
+
+    def create(self, validated_data):
+        return publish(validated_data['doctor'], validated_data['availabilities'])
+
+class NextAvailableSlotQuerySerializer(serializers.Serializer):
+    specialization = serializers.IntegerField(required=False)
+    min_fee = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    max_fee = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    duration = serializers.IntegerField(min_value=5, max_value=480, default=30)
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=10)
+    per_doctor = serializers.IntegerField(min_value=1, max_value=10, default=1)
+    start_date = serializers.DateField(required=False)
+    days = serializers.IntegerField(min_value=1, max_value=60, default=14)
+
+class DoctorCalendarQuerySerializer(serializers.Serializer):
+    start = serializers.DateField(required=False)
+    days = serializers.IntegerField(min_value=1, max_value=62, default=7)
+
+class DoctorFacetQuerySerializer(serializers.Serializer):
+    specialization = serializers.IntegerField(required=False)
+    experience = serializers.ChoiceField(choices=[key for key, _, _ in EXPERIENCE_BANDS], required=False)
+    fee = serializers.ChoiceField(choices=[key for key, _, _ in FEE_BANDS], required=False)
+    # Without a default a missing flag reads as False from a query string
+    is_available = serializers.BooleanField(allow_null=True, default=None)
+
+class DoctorSlotSerializer(serializers.Serializer):
+    doctor_id = serializers.IntegerField()
+    doctor_name = serializers.CharField(source='doctor.user.get_full_name')
+    specialization = serializers.CharField(source='doctor.specialization.name', default=None)
+    consultation_fee = serializers.DecimalField(source='doctor.consultation_fee', max_digits=10, decimal_places=2)
+    date = serializers.DateField()
+    start_time = serializers.TimeField()
+    end_time = serializers.TimeField()
@@ -0,0 +1,146 @@
+"""
+Free-slot search across many doctors.
+
+Availability comes from the weekly bitmaps in ``doctors.availability``. Each
+day's bookings are folded into a bitmap per doctor and subtracted with a single
+AND NOT, so a doctor's whole day is processed as one integer operation instead
+of interval by interval. Days are scanned in order, and within a day bookings
+are loaded in growing time windows, so a search usually touches only the first
+hours of the first day or two.
+"""
+from datetime import datetime, timedelta
+
+from django.utils import timezone
+
+from appointments.models import Appointment
+from .availability import get_weekly_availabilities, slot_minutes, to_seconds
+
+
+def run_starts(bits, length):
+    """Return a bitset marking every slot that starts ``length`` consecutive free slots."""
+    span = 1
+    while span < length and bits:
+        shift = min(span, length - span)
+        bits &= bits >> shift
+        span += shift
+    return bits
+
+
+def iter_bits(bits):
+    while bits:
+        lowest = bits & -bits
+        yield lowest.bit_length() - 1
+        bits ^= lowest
+
+
+def add_bookings(masks, doctors, day, slot_seconds, from_slot, to_slot):
+    """OR the slots touched by bookings starting in [from_slot, to_slot) into ``masks``."""
+    rows = Appointment.objects.filter(
+        doctor__in=doctors.values('id'),
+        appointment_date=day,
+        status__in=Appointment.ACTIVE_STATUSES
+    )
+    if from_slot:
+        rows = rows.filter(start_time__gte=slot_time(from_slot, slot_seconds))
+    if to_slot * slot_seconds < 86400:
+        rows = rows.filter(start_time__lt=slot_time(to_slot, slot_seconds))
+    for doctor_id, start_time, end_time in rows.values_list('doctor_id', 'start_time', 'end_time'):
+        first = to_seconds(start_time) // slot_seconds
+        last = -(-to_seconds(end_time) // slot_seconds)
+        if last > first:
+            masks[doctor_id] = masks.get(doctor_id, 0) | (((1 << (last - first)) - 1) << first)
+
+
+def slot_time(slot, slot_seconds):
+    return (datetime.min + timedelta(seconds=slot * slot_seconds)).time()
+
+
+def day_candidates(free_bits, booked, window, length, remaining, fees):
+    """Collect (slot, fee, doctor_id) for runs that end before ``window``."""
+    below_window = (1 << window) - 1
+    candidates = []
+    for doctor_id, bits in free_bits.items():
+        starts = run_starts(bits & ~booked.get(doctor_id, 0) & below_window, length)
+        taken = 0
+        last_end = -1
+        for slot in iter_bits(starts):
+            # Offer non-overlapping slots when several are wanted per doctor
+            if slot < last_end:
+                continue
+            candidates.append((slot, fees[doctor_id], doctor_id))
+            last_end = slot + length
+            taken += 1
+            if taken == remaining[doctor_id]:
+                break
+    return candidates
+
+
+def find_next_free_slots(doctors, duration, limit, start_date=None, days=14, per_doctor=1, now=None):
+    """
+    Return the earliest ``limit`` free slots of ``duration`` minutes among ``doctors``.
+
+    ``doctors`` is a Doctor queryset; results are dicts with ``doctor_id``, ``date``,
+    ``start_time`` and ``end_time`` ordered by date, then start time, then fee.
+    """
+    now = timezone.localtime(now)
+    start_date = start_date or now.date()
+    end_date = start_date + timedelta(days=days - 1)
+    granularity = slot_minutes()
+    slot_seconds = granularity * 60
+    slots_per_day = 86400 // slot_seconds
+    length = -(-duration // granularity)
+
+    fees = dict(doctors.values_list('id', 'consultation_fee'))
+    if not fees:
+        return []
+    availabilities = get_weekly_availabilities(list(fees))
+
+    remaining = dict.fromkeys(fees, per_doctor)
+    results = []
+    day = start_date
+    while day <= end_date and len(results) < limit:
+        weekday = day.weekday()
+        blocked_before = 0
+        if day == now.date():
+            # Slots that have already started today are not bookable
+            elapsed = -(-(now.hour * 3600 + now.minute * 60 + now.second) // slot_seconds)
+            blocked_before = (1 << elapsed) - 1
+        free_bits = {}
+        for doctor_id, availability in availabilities.items():
+            bits = availability.days[weekday] & ~blocked_before
+            if bits and remaining[doctor_id]:
+                free_bits[doctor_id] = bits
+
+        candidates = []
+        if free_bits:
+            # A run that ends before the window edge cannot be affected by bookings that
+            # start after it, so bookings are loaded in growing windows from the earliest
+            # open slot until enough slots are found inside the window.
+            needed = limit - len(results)
+            earliest = min((bits & -bits).bit_length() - 1 for bits in free_bits.values())
+            booked = {}
+            loaded = 0
+            window = earliest + length * 4
+            while True:
+                window = min(window, slots_per_day)
+                add_bookings(booked, doctors, day, slot_seconds, loaded, window)
+                loaded = window
+                candidates = day_candidates(free_bits, booked, window, length, remaining, fees)
+                if len(candidates) >= needed or window == slots_per_day:
+                    break
+                window = earliest + (window - earliest) * 2
+
+        candidates.sort()
+        for slot, _, doctor_id in candidates:
+            if len(results) == limit:
+                break
+            remaining[doctor_id] -= 1
+            start = datetime.combine(day, datetime.min.time()) + timedelta(seconds=slot * slot_seconds)
+            results.append({
+                'doctor_id': doctor_id,
+                'date': day,
+                'start_time': start.time(),
+                'end_time': (start + timedelta(minutes=duration)).time(),
+            })
+        day += timedelta(days=1)
+    return results
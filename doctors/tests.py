@@ -1,9 +1,19 @@
-from django.test import TestCase
+from datetime import date, time, timedelta
+from unittest import mock
+from asgiref.sync import async_to_sync
+from django.test import TestCase, TransactionTestCase
+from django.core.cache import cache
 from django.urls import reverse
-from rest_framework.test import APITestCase
+from rest_framework.test import APIClient, APITestCase
 from rest_framework import status
 from django.contrib.auth import get_user_model
-from .models import Doctor, Specialization, DoctorAvailability
+from .models import Doctor, DoctorFacetCell, Specialization, DoctorAvailability
+from .availability import WeeklyAvailability, get_weekly_availability, is_available
+from .facets import rebuild as rebuild_facets
+from .slots import run_starts
+from .views import DoctorListView
+from appointments.models import Appointment
+from patients.models import Patient
 from users.models import User
 
 User = get_user_model()
@@ -80,6 +90,58 @@ class DoctorTests(APITestCase):
         self.assertEqual(self.doctor.years_of_experience, 6)
         self.assertEqual(float(self.doctor.consultation_fee), 120.00)
 
+class DoctorListQueryTests(APITestCase):
+    def setUp(self):
+        self.specialization = Specialization.objects.create(name='Cardiology')
+        self.user = User.objects.create_user(
+            username='viewer',
+            password='viewerpass123',
+            user_type='patient'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.doctor_url = reverse('doctor-list')
+
+    def create_doctors(self, count):
+        for _ in range(count):
+            index = Doctor.objects.count()
+            user = User.objects.create_user(
+                username=f'doctor{index}',
+                password='doctorpass123',
+                user_type='doctor'
+            )
+            Doctor.objects.create(
+                user=user,
+                specialization=self.specialization,
+                license_number=f'DOC{index}',
+                consultation_fee=100.00
+            )
+
+    def test_query_count_is_constant(self):
+        self.create_doctors(2)
+        with self.assertNumQueries(1):
+            self.client.get(self.doctor_url)
+        self.create_doctors(6)
+        # One joined select for the page, keyset pagination needs no count
+        with self.assertNumQueries(1):
+            response = self.client.get(self.doctor_url)
+        self.assertEqual(len(response.data['results']), 8)
+        self.assertEqual(response.data['results'][0]['specialization_name'], 'Cardiology')
+
+    def test_fast_path_matches_the_serializer(self):
+        self.create_doctors(3)
+        Doctor.objects.filter(license_number='DOC0').update(specialization=None)
+        params = {'page_size': 2}
+        fast = self.client.get(self.doctor_url, params)
+        with mock.patch.object(DoctorListView, 'fast_list', False):
+            regular = self.client.get(self.doctor_url, params)
+        self.assertEqual(fast.content, regular.content)
+        # The cursor is read from the values() rows
+        fast_next = self.client.get(fast.data['next'])
+        with mock.patch.object(DoctorListView, 'fast_list', False):
+            regular_next = self.client.get(regular.data['next'])
+        self.assertEqual(fast_next.content, regular_next.content)
+        self.assertIsNone(fast_next.data['results'][-1]['specialization_name'])
+
 class DoctorAvailabilityTests(APITestCase):
     def setUp(self):
         self.user = User.objects.create_user(
@@ -134,3 +196,529 @@ class DoctorAvailabilityTests(APITestCase):
         response = self.client.post(bulk_url, bulk_data, format='json')
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(DoctorAvailability.objects.count(), 2)
+
+class WeeklyAvailabilityTests(TestCase):
+    def test_covers_published_windows(self):
+        availability = WeeklyAvailability.from_windows([
+            ('monday', '09:00:00', '12:00:00'),
+            ('monday', '13:00:00', '17:00:00'),
+        ], slot_minutes=5)
+        self.assertTrue(availability.covers('monday', '09:00:00', '10:00:00'))
+        self.assertTrue(availability.covers('monday', '16:30:00', '17:00:00'))
+        self.assertFalse(availability.covers('monday', '11:30:00', '13:30:00'))
+        self.assertFalse(availability.covers('monday', '08:55:00', '09:30:00'))
+        self.assertFalse(availability.covers('tuesday', '09:00:00', '10:00:00'))
+        self.assertEqual(list(availability.windows('monday')), [(32400, 43200), (46800, 61200)])
+
+    def test_unaligned_times_are_rounded_conservatively(self):
+        availability = WeeklyAvailability.from_windows([('friday', '09:02:00', '09:58:00')], slot_minutes=5)
+        self.assertTrue(availability.covers('friday', '09:05:00', '09:55:00'))
+        self.assertFalse(availability.covers('friday', '09:02:00', '09:30:00'))
+        self.assertFalse(availability.covers('friday', '09:30:00', '09:58:00'))
+
+    def test_accepts_dates(self):
+        availability = WeeklyAvailability.from_windows([('wednesday', '09:00:00', '17:00:00')], slot_minutes=5)
+        self.assertTrue(availability.covers(date(2024, 3, 20), '10:00:00', '11:00:00'))
+        self.assertFalse(availability.covers(date(2024, 3, 21), '10:00:00', '11:00:00'))
+
+class CachedWeeklyAvailabilityTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user(
+            username='doctor',
+            password='doctorpass123',
+            user_type='doctor'
+        )
+        self.doctor = Doctor.objects.create(
+            user=user,
+            license_number='DOC123',
+            consultation_fee=100.00
+        )
+        self.availability = DoctorAvailability.objects.create(
+            doctor=self.doctor,
+            day='monday',
+            start_time='09:00:00',
+            end_time='17:00:00'
+        )
+
+    def test_checks_are_served_from_cache(self):
+        get_weekly_availability(self.doctor.id)
+        with self.assertNumQueries(0):
+            self.assertTrue(is_available(self.doctor.id, 'monday', '10:00:00', '11:00:00'))
+
+    def test_bitmap_is_rebuilt_when_availability_changes(self):
+        self.assertFalse(is_available(self.doctor.id, 'tuesday', '10:00:00', '11:00:00'))
+        DoctorAvailability.objects.create(
+            doctor=self.doctor,
+            day='tuesday',
+            start_time='09:00:00',
+            end_time='12:00:00'
+        )
+        self.assertTrue(is_available(self.doctor.id, 'tuesday', '10:00:00', '11:00:00'))
+
+        self.availability.is_available = False
+        self.availability.save()
+        self.assertFalse(is_available(self.doctor.id, 'monday', '10:00:00', '11:00:00'))
+
+        self.availability.delete()
+        self.assertFalse(is_available(self.doctor.id, 'monday', '10:00:00', '11:00:00'))
+
+class NextAvailableSlotTests(APITestCase):
+    def setUp(self):
+        self.cardiology = Specialization.objects.create(name='Cardiology')
+        self.neurology = Specialization.objects.create(name='Neurology')
+        self.start_date = date.today() + timedelta(days=7)
+        self.doctors = [
+            self.create_doctor('house', self.cardiology, 150),
+            self.create_doctor('grey', self.cardiology, 90),
+            self.create_doctor('strange', self.neurology, 100),
+        ]
+        patient_user = User.objects.create_user(
+            username='patient',
+            password='patientpass123',
+            user_type='patient'
+        )
+        self.patient = Patient.objects.create(user=patient_user, blood_type='A+')
+        # The cheaper cardiologist is booked first thing in the morning
+        Appointment.objects.create(
+            patient=self.patient,
+            doctor=self.doctors[1],
+            appointment_date=self.start_date,
+            start_time='09:00:00',
+            end_time='09:45:00'
+        )
+        self.client.force_authenticate(user=patient_user)
+        self.url = reverse('doctor-next-available')
+
+    def create_doctor(self, username, specialization, fee):
+        user = User.objects.create_user(
+            username=username,
+            password='doctorpass123',
+            user_type='doctor'
+        )
+        doctor = Doctor.objects.create(
+            user=user,
+            specialization=specialization,
+            license_number=username.upper(),
+            consultation_fee=fee
+        )
+        DoctorAvailability.objects.create(
+            doctor=doctor,
+            day=self.start_date.strftime('%A').lower(),
+            start_time='09:00:00',
+            end_time='12:00:00'
+        )
+        return doctor
+
+    def test_run_starts(self):
+        self.assertEqual(run_starts(0b0111101110, 3), 0b0001100010)
+        self.assertEqual(run_starts(0b0111101110, 5), 0)
+
+    def test_earliest_slots_for_a_specialization(self):
+        response = self.client.get(self.url, {
+            'specialization': self.cardiology.id,
+            'start_date': self.start_date.isoformat(),
+            'duration': 30,
+            'limit': 5
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(slot['doctor_id'], slot['start_time'], slot['end_time']) for slot in response.data],
+            [(self.doctors[0].id, '09:00:00', '09:30:00'), (self.doctors[1].id, '09:45:00', '10:15:00')]
+        )
+        self.assertEqual(response.data[0]['specialization'], 'Cardiology')
+
+    def test_fee_range_and_multiple_slots_per_doctor(self):
+        response = self.client.get(self.url, {
+            'max_fee': '120',
+            'start_date': self.start_date.isoformat(),
+            'duration': 60,
+            'per_doctor': 2
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(slot['doctor_id'], slot['start_time']) for slot in response.data],
+            [
+                (self.doctors[2].id, '09:00:00'),
+                (self.doctors[1].id, '09:45:00'),
+                (self.doctors[2].id, '10:00:00'),
+                (self.doctors[1].id, '10:45:00'),
+            ]
+        )
+
+    def test_query_count_does_not_grow_with_doctors(self):
+        for index in range(10):
+            self.create_doctor(f'extra{index}', self.cardiology, 100)
+        with self.assertNumQueries(4):
+            response = self.client.get(self.url, {'start_date': self.start_date.isoformat(), 'limit': 13})
+        self.assertEqual(len(response.data), 13)
+
+class CachedLookupTests(TransactionTestCase):
+    client_class = APIClient
+
+    def setUp(self):
+        cache.clear()
+        self.specialization = Specialization.objects.create(name='Cardiology')
+        self.doctor_user = User.objects.create_user(
+            username='doctor',
+            password='doctorpass123',
+            first_name='Grace',
+            user_type='doctor'
+        )
+        self.doctor = Doctor.objects.create(
+            user=self.doctor_user,
+            specialization=self.specialization,
+            license_number='DOC123',
+            consultation_fee=100.00
+        )
+        self.client.force_authenticate(user=self.doctor_user)
+        self.specialization_url = reverse('specialization-detail', kwargs={'pk': self.specialization.pk})
+        self.doctor_url = reverse('doctor-detail', kwargs={'pk': self.doctor.pk})
+
+    def test_repeated_reads_skip_the_database(self):
+        for url in (self.specialization_url, self.doctor_url, reverse('specialization-list')):
+            self.client.get(url)
+            with self.assertNumQueries(0):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_conditional_requests_get_304(self):
+        response = self.client.get(self.doctor_url)
+        etag, last_modified = response['ETag'], response['Last-Modified']
+        response = self.client.get(self.doctor_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        response = self.client.get(self.doctor_url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        response = self.client.get(self.doctor_url, HTTP_IF_NONE_MATCH='"stale"')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_saves_invalidate_dependent_entries(self):
+        etag = self.client.get(self.doctor_url)['ETag']
+        self.client.get(self.specialization_url)
+
+        self.specialization.name = 'Cardiac Surgery'
+        self.specialization.save()
+        self.assertEqual(self.client.get(self.specialization_url).data['name'], 'Cardiac Surgery')
+        response = self.client.get(self.doctor_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['specialization_name'], 'Cardiac Surgery')
+
+        self.doctor_user.first_name = 'Gracie'
+        self.doctor_user.save()
+        self.assertEqual(self.client.get(self.doctor_url).data['user']['first_name'], 'Gracie')
+
+        self.client.patch(self.doctor_url, {'consultation_fee': '150.00'}, format='json')
+        self.assertEqual(self.client.get(self.doctor_url).data['consultation_fee'], '150.00')
+
+    def test_missing_doctors_are_not_cached(self):
+        url = reverse('doctor-detail', kwargs={'pk': self.doctor.pk + 1})
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+
+class AsyncReadViewTests(APITestCase):
+    def setUp(self):
+        specialization = Specialization.objects.create(name='Cardiology')
+        for index in range(3):
+            user = User.objects.create_user(
+                username=f'doctor{index}',
+                password='doctorpass123',
+                first_name='Grace',
+                last_name=f'Otieno{index}',
+                user_type='doctor'
+            )
+            self.doctor = Doctor.objects.create(
+                user=user,
+                specialization=specialization,
+                license_number=f'DOC{index}',
+                consultation_fee=100.00
+            )
+        for day in ('monday', 'tuesday', 'wednesday'):
+            DoctorAvailability.objects.create(
+                doctor=self.doctor,
+                day=day,
+                start_time='09:00:00',
+                end_time='17:00:00'
+            )
+        response = self.client.post(reverse('token_obtain_pair'), {
+            'username': 'doctor0',
+            'password': 'doctorpass123'
+        }, format='json')
+        self.auth = {'Authorization': f"Bearer {response.data['access']}"}
+
+    def assertSameResponse(self, sync_url, async_url, params=None):
+        expected = self.client.get(sync_url, params, headers=self.auth)
+        actual = async_to_sync(self.async_client.get)(async_url, params, headers=self.auth)
+        self.assertEqual(actual.status_code, expected.status_code)
+        # Pagination links point at the view's own URL
+        self.assertEqual(actual.content.replace(b'/async/', b'/'), expected.content)
+        return actual
+
+    def test_async_views_match_sync_output(self):
+        pk = {'pk': self.doctor.pk}
+        doctor = {'doctor_id': self.doctor.pk}
+        self.assertSameResponse(reverse('doctor-list'), reverse('doctor-list-async'), {'page_size': 2})
+        self.assertSameResponse(reverse('doctor-list'), reverse('doctor-list-async'),
+                                {'search': 'otieno2', 'include_count': 'true'})
+        self.assertSameResponse(reverse('doctor-detail', kwargs=pk), reverse('doctor-detail-async', kwargs=pk))
+        self.assertSameResponse(reverse('doctor-availability', kwargs=doctor),
+                                reverse('doctor-availability-async', kwargs=doctor))
+        self.assertSameResponse(reverse('doctor-availability', kwargs=doctor),
+                                reverse('doctor-availability-async', kwargs=doctor), {'page': 'last'})
+
+    def test_async_views_apply_sparse_fieldsets(self):
+        pk = {'pk': self.doctor.pk}
+        doctor = {'doctor_id': self.doctor.pk}
+        fields = {'fields': 'id,user.last_name'}
+        response = self.assertSameResponse(reverse('doctor-list'), reverse('doctor-list-async'), fields)
+        self.assertEqual(set(response.json()['results'][0]), {'id', 'user'})
+        self.assertSameResponse(reverse('doctor-detail', kwargs=pk), reverse('doctor-detail-async', kwargs=pk),
+                                {'fields': 'consultation_fee'})
+        response = self.assertSameResponse(reverse('doctor-availability', kwargs=doctor),
+                                           reverse('doctor-availability-async', kwargs=doctor), {'fields': 'day'})
+        self.assertEqual(response.json()['results'][0], {'day': 'monday'})
+        response = self.assertSameResponse(reverse('doctor-list'), reverse('doctor-list-async'), {'fields': 'nope'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_async_errors_match_sync_output(self):
+        missing = {'pk': self.doctor.pk + 100}
+        self.assertSameResponse(reverse('doctor-detail', kwargs=missing),
+                                reverse('doctor-detail-async', kwargs=missing))
+        doctor = {'doctor_id': self.doctor.pk}
+        self.assertSameResponse(reverse('doctor-availability', kwargs=doctor),
+                                reverse('doctor-availability-async', kwargs=doctor), {'page': 9})
+        self.auth = {}
+        response = self.assertSameResponse(reverse('doctor-list'), reverse('doctor-list-async'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+class DoctorCalendarTests(TransactionTestCase):
+    client_class = APIClient
+
+    def setUp(self):
+        cache.clear()
+        self.doctor_user = User.objects.create_user(username='doctor', password='doctorpass123', user_type='doctor')
+        self.doctor = Doctor.objects.create(user=self.doctor_user, license_number='DOC123', consultation_fee=100.00)
+        self.window = DoctorAvailability.objects.create(doctor=self.doctor, day='monday',
+                                                        start_time='09:00', end_time='12:00')
+        self.patient_user = User.objects.create_user(username='patient', password='patientpass123',
+                                                     user_type='patient')
+        self.patient = Patient.objects.create(user=self.patient_user, blood_type='O+')
+        today = date.today()
+        self.monday = today + timedelta(days=7 - today.weekday())
+        self.client.force_authenticate(user=self.doctor_user)
+        self.url = reverse('doctor-calendar', kwargs={'doctor_id': self.doctor.id})
+
+    def book(self, start_time, end_time, status='scheduled'):
+        return Appointment.objects.create(doctor=self.doctor, patient=self.patient, appointment_date=self.monday,
+                                          start_time=start_time, end_time=end_time, status=status)
+
+    def calendar(self, days=7):
+        response = self.client.get(self.url, {'start': self.monday.isoformat(), 'days': days})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['days']
+
+    def test_free_and_busy_segments(self):
+        booking = self.book('10:00', '10:30')
+        self.book('11:00', '11:30', status='cancelled')
+        monday, tuesday = self.calendar(days=2)
+        self.assertEqual(monday['free'], [{'start': '09:00:00', 'end': '10:00:00'},
+                                          {'start': '10:30:00', 'end': '12:00:00'}])
+        self.assertEqual(monday['busy'], [{'start': '10:00:00', 'end': '10:30:00',
+                                           'appointment_id': booking.id, 'status': 'scheduled'}])
+        self.assertEqual(tuesday, {'date': (self.monday + timedelta(days=1)).isoformat(), 'free': [], 'busy': []})
+
+    def test_month_view_is_served_from_cache_and_rebuilt_per_day(self):
+        self.calendar(days=31)
+        # Only the check that the caller is this doctor
+        with self.assertNumQueries(1):
+            self.calendar(days=31)
+
+        booking = self.book('09:00', '10:00')
+        # Only the booked day is rebuilt: doctor check and its appointments
+        with self.assertNumQueries(3):
+            days = self.calendar(days=31)
+        self.assertEqual(days[0]['free'], [{'start': '10:00:00', 'end': '12:00:00'}])
+
+        booking.appointment_date = self.monday + timedelta(days=7)
+        booking.save()
+        days = self.calendar(days=31)
+        self.assertEqual(days[0]['busy'], [])
+        self.assertEqual(days[7]['busy'][0]['appointment_id'], booking.id)
+
+    def test_other_users_do_not_see_whose_bookings_they_are(self):
+        self.book('10:00', '10:30')
+        self.client.force_authenticate(user=self.patient_user)
+        self.assertEqual(self.calendar(days=1)[0]['busy'], [{'start': '10:00:00', 'end': '10:30:00'}])
+
+    def test_appointments_filled_in_before_save(self):
+        appointment = Appointment()
+        appointment.doctor = self.doctor
+        appointment.patient = self.patient
+        appointment.appointment_date = self.monday
+        appointment.start_time = '10:00'
+        appointment.end_time = '10:30'
+        appointment.save()
+        self.assertEqual(len(self.calendar(days=1)[0]['busy']), 1)
+
+    def test_availability_changes_rebuild_every_day(self):
+        self.calendar(days=14)
+        self.window.end_time = '10:00'
+        self.window.save()
+        days = self.calendar(days=14)
+        self.assertEqual(days[0]['free'], [{'start': '09:00:00', 'end': '10:00:00'}])
+        self.assertEqual(days[7]['free'], [{'start': '09:00:00', 'end': '10:00:00'}])
+
+    def test_unknown_doctor(self):
+        response = self.client.get(reverse('doctor-calendar', kwargs={'doctor_id': self.doctor.id + 1}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+class AvailabilityPublishTests(APITestCase):
+    def setUp(self):
+        doctor_user = User.objects.create_user(username='doctor', password='doctorpass123', user_type='doctor')
+        self.doctor = Doctor.objects.create(user=doctor_user, license_number='DOC123', consultation_fee=100.00)
+        self.client.force_authenticate(user=doctor_user)
+        self.url = reverse('doctor-availability-bulk', kwargs={'doctor_id': self.doctor.pk})
+        self.template = [
+            {'day': 'monday', 'start_time': '09:00:00', 'end_time': '12:00:00'},
+            {'day': 'monday', 'start_time': '11:00:00', 'end_time': '13:00:00'},
+            {'day': 'monday', 'start_time': '13:00:00', 'end_time': '14:00:00'},
+            {'day': 'monday', 'start_time': '15:00:00', 'end_time': '17:00:00'},
+            {'day': 'tuesday', 'start_time': '09:00:00', 'end_time': '17:00:00'},
+        ]
+
+    def publish(self, windows):
+        return self.client.post(self.url, {'availabilities': windows}, format='json')
+
+    def windows(self):
+        return list(DoctorAvailability.objects.filter(doctor=self.doctor).order_by('day', 'start_time')
+                    .values_list('day', 'start_time', 'end_time', 'is_available'))
+
+    def test_overlapping_windows_are_merged(self):
+        response = self.publish(self.template)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 3)
+        self.assertEqual([(row['day'], row['start_time'], row['end_time']) for row in response.data['availabilities']], [
+            ('monday', '09:00:00', '14:00:00'),
+            ('monday', '15:00:00', '17:00:00'),
+            ('tuesday', '09:00:00', '17:00:00'),
+        ])
+
+    def test_resubmitting_the_same_template_writes_nothing(self):
+        self.publish(self.template)
+        ids = set(DoctorAvailability.objects.values_list('id', flat=True))
+        # Doctor lookup and the locked read of the current rows
+        with self.assertNumQueries(2):
+            response = self.publish(self.template)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['created'], response.data['updated'], response.data['deleted']), (0, 0, 0))
+        self.assertEqual(set(DoctorAvailability.objects.values_list('id', flat=True)), ids)
+
+    def test_changed_template_is_diffed(self):
+        self.publish(self.template)
+        tuesday = DoctorAvailability.objects.get(doctor=self.doctor, day='tuesday')
+        # Doctor lookup, locked read, then one delete, one update and one insert
+        with self.assertNumQueries(5):
+            response = self.publish([
+                {'day': 'monday', 'start_time': '09:00:00', 'end_time': '14:00:00', 'is_available': False},
+                {'day': 'tuesday', 'start_time': '10:00:00', 'end_time': '16:00:00'},
+                {'day': 'friday', 'start_time': '09:00:00', 'end_time': '12:00:00'},
+            ])
+        self.assertEqual((response.data['created'], response.data['updated'], response.data['deleted']), (1, 2, 1))
+        self.assertEqual(self.windows(), [
+            ('friday', time(9), time(12), True),
+            ('monday', time(9), time(14), False),
+            ('tuesday', time(10), time(16), True),
+        ])
+        # The tuesday row was moved rather than replaced
+        self.assertTrue(DoctorAvailability.objects.filter(id=tuesday.id, start_time='10:00').exists())
+        self.assertFalse(is_available(self.doctor.id, 'monday', '09:00:00', '10:00:00'))
+
+
+class DoctorFacetTests(TransactionTestCase):
+    client_class = APIClient
+
+    def setUp(self):
+        cache.clear()
+        self.cardiology = Specialization.objects.create(name='Cardiology')
+        self.dermatology = Specialization.objects.create(name='Dermatology')
+        self.viewer = User.objects.create_user(username='viewer', password='viewerpass123', user_type='patient')
+        self.client.force_authenticate(user=self.viewer)
+        self.url = reverse('doctor-list')
+
+    def create_doctor(self, specialization, years, fee, is_available=True):
+        index = Doctor.objects.count()
+        user = User.objects.create_user(username=f'doctor{index}', password='doctorpass123', user_type='doctor')
+        return Doctor.objects.create(user=user, specialization=specialization, license_number=f'DOC{index}',
+                                     years_of_experience=years, consultation_fee=fee, is_available=is_available)
+
+    def cells(self):
+        return sorted(DoctorFacetCell.objects.filter(count__gt=0).values_list(
+            'specialization_key', 'experience_band', 'fee_band', 'is_available', 'count'
+        ))
+
+    def counts(self, facets, facet):
+        return {entry['value']: entry['count'] for entry in facets[facet] if entry['count']}
+
+    def test_signals_keep_the_cells_in_step_with_a_recount(self):
+        doctor = self.create_doctor(self.cardiology, 3, 80)
+        self.create_doctor(self.cardiology, 12, 150)
+        self.create_doctor(self.dermatology, 25, 150, is_available=False)
+        doctor.consultation_fee = 120
+        doctor.save()
+        Doctor.objects.filter(specialization=self.dermatology).first().delete()
+        maintained = self.cells()
+        rebuild_facets()
+        self.assertEqual(self.cells(), maintained)
+        self.assertEqual(maintained, [(self.cardiology.id, 0, 2, True, 1), (self.cardiology.id, 2, 2, True, 1)])
+
+    def test_rebuild_only_writes_drifted_cells(self):
+        self.create_doctor(self.cardiology, 3, 80)
+        self.create_doctor(self.dermatology, 25, 150)
+        DoctorFacetCell.objects.filter(specialization_key=self.cardiology.id).update(count=5)
+        # Locked read of the cells, the recount, one correction and the sweep of empty cells
+        with self.assertNumQueries(6):  # plus BEGIN and COMMIT
+            rebuild_facets()
+        self.assertEqual(self.cells(), [(self.cardiology.id, 0, 1, True, 1), (self.dermatology.id, 3, 2, True, 1)])
+
+    def test_counts_are_returned_with_the_filtered_list(self):
+        self.create_doctor(self.cardiology, 3, 80)
+        self.create_doctor(self.cardiology, 12, 150)
+        self.create_doctor(self.dermatology, 25, 150)
+        response = self.client.get(self.url, {'facets': 'true', 'fee': '100-199'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 2)
+        facets = response.data['facets']
+        # Each facet ignores its own filter, so the fee counts cover every doctor
+        self.assertEqual(self.counts(facets, 'fee'), {'50-99': 1, '100-199': 2})
+        self.assertEqual(self.counts(facets, 'specialization'), {self.cardiology.id: 1, self.dermatology.id: 1})
+        self.assertEqual(self.counts(facets, 'experience'), {'10-19': 1, '20+': 1})
+        self.assertEqual(facets['specialization'][0]['label'], 'Cardiology')
+
+    def test_facets_come_from_the_cache_after_the_first_request(self):
+        self.create_doctor(self.cardiology, 3, 80)
+        self.client.get(self.url, {'facets': 'true'})
+        # Only the page query; the cells and specialization names are cached
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, {'facets': 'true'})
+        self.assertEqual(self.counts(response.data['facets'], 'is_available'), {True: 1})
+
+    def test_counts_within_a_search(self):
+        self.create_doctor(self.cardiology, 3, 80)
+        searched = self.create_doctor(self.dermatology, 12, 150)
+        searched.user.first_name = 'Zelda'
+        searched.user.save()
+        response = self.client.get(self.url, {'facets': 'true', 'search': 'zelda'})
+        self.assertEqual(self.counts(response.data['facets'], 'specialization'), {self.dermatology.id: 1})
+
+    def test_invalid_band_is_rejected(self):
+        response = self.client.get(self.url, {'fee': '1-2'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_deleting_a_specialization_moves_its_cells(self):
+        self.create_doctor(self.dermatology, 3, 80)
+        self.create_doctor(self.dermatology, 12, 150)
+        self.create_doctor(None, 3, 80)
+        self.create_doctor(self.cardiology, 3, 80)
+        self.dermatology.delete()
+        self.assertEqual(self.cells(), [(0, 0, 1, True, 2), (0, 2, 2, True, 1), (self.cardiology.id, 0, 1, True, 1)])
+        maintained = self.cells()
+        rebuild_facets()
+        self.assertEqual(self.cells(), maintained)
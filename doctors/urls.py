@@ -6,6 +6,11 @@ from .views import (
     DoctorDetailView,
     DoctorAvailabilityView,
     DoctorAvailabilityBulkCreateView,
+    DoctorNextAvailableSlotsView,
+    DoctorCalendarView,
+    AsyncDoctorListView,
+    AsyncDoctorDetailView,
+    AsyncDoctorAvailabilityView,
 )
 
 urlpatterns = [
@@ -16,8 +21,15 @@ urlpatterns = [
     # Doctor endpoints
     path('', DoctorListView.as_view(), name='doctor-list'),
     path('<int:pk>/', DoctorDetailView.as_view(), name='doctor-detail'),
+    path('next-available/', DoctorNextAvailableSlotsView.as_view(), name='doctor-next-available'),
     
     # Doctor availability endpoints
     path('<int:doctor_id>/availability/', DoctorAvailabilityView.as_view(), name='doctor-availability'),
     path('<int:doctor_id>/availability/bulk/', DoctorAvailabilityBulkCreateView.as_view(), name='doctor-availability-bulk'),
+    path('<int:doctor_id>/calendar/', DoctorCalendarView.as_view(), name='doctor-calendar'),
+
+    # Async read endpoints for ASGI deployments
+    path('async/', AsyncDoctorListView.as_view(), name='doctor-list-async'),
+    path('async/<int:pk>/', AsyncDoctorDetailView.as_view(), name='doctor-detail-async'),
+    path('async/<int:doctor_id>/availability/', AsyncDoctorAvailabilityView.as_view(), name='doctor-availability-async'),
 ] 
\ No newline at end of file
@@ -1,48 +1,78 @@
+from datetime import timedelta
 from django.shortcuts import render
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from django.http import Http404
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from asgiref.sync import sync_to_async
+from healthcaresystem.async_views import AsyncReadAPIView
+from healthcaresystem.caching import CachedReadMixin
+from healthcaresystem.fastlist import FastListMixin, row_renderer
+from healthcaresystem.fieldsets import SparseFieldsetViewMixin
+from healthcaresystem.pagination import AsyncPageNumberPagination, KeysetPagination
+from search.filters import IndexedSearchFilter
+from .filters import DoctorFacetFilter
 from .models import Doctor, Specialization, DoctorAvailability
 from .serializers import (
     DoctorSerializer,
     SpecializationSerializer,
     DoctorAvailabilitySerializer,
-    DoctorAvailabilityBulkCreateSerializer
+    DoctorAvailabilityBulkCreateSerializer,
+    NextAvailableSlotQuerySerializer,
+    DoctorSlotSerializer,
+    DoctorCalendarQuerySerializer
 )
+from .calendar import get_calendar, without_bookings
+from .slots import find_next_free_slots
 
 # Create your views here.
 
-class SpecializationListView(generics.ListCreateAPIView):
-    queryset = Specialization.objects.all()
+class SpecializationListView(CachedReadMixin, SparseFieldsetViewMixin, generics.ListCreateAPIView):
+    queryset = Specialization.objects.order_by('name')
     serializer_class = SpecializationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    cache_namespaces = ['specializations']
 
-class SpecializationDetailView(generics.RetrieveUpdateDestroyAPIView):
+class SpecializationDetailView(CachedReadMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Specialization.objects.all()
     serializer_class = SpecializationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    cache_namespaces = ['specializations']
 
-class DoctorListView(generics.ListCreateAPIView):
-    queryset = Doctor.objects.all()
+class DoctorListView(FastListMixin, SparseFieldsetViewMixin, generics.ListCreateAPIView):
+    queryset = Doctor.objects.for_listing()
     serializer_class = DoctorSerializer
     permission_classes = [permissions.IsAuthenticated]
-    filterset_fields = ['specialization', 'is_available']
+    pagination_class = KeysetPagination
+    filter_backends = [DoctorFacetFilter, IndexedSearchFilter]
+    search_index = 'doctor'
     search_fields = ['user__first_name', 'user__last_name', 'license_number']
     ordering_fields = ['years_of_experience', 'consultation_fee']
 
-class DoctorDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Doctor.objects.all()
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        facets = DoctorFacetFilter()
+        if facets.facets_requested(request):
+            response.data['facets'] = facets.get_facets(request, self)
+        return response
+
+class DoctorDetailView(CachedReadMixin, SparseFieldsetViewMixin, generics.RetrieveUpdateDestroyAPIView):
+    queryset = Doctor.objects.for_listing()
     serializer_class = DoctorSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-class DoctorAvailabilityView(generics.ListCreateAPIView):
+    def get_cache_namespaces(self):
+        return ['specializations', f"doctor:{self.kwargs['pk']}"]
+
+class DoctorAvailabilityView(SparseFieldsetViewMixin, generics.ListCreateAPIView):
     serializer_class = DoctorAvailabilitySerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
         doctor_id = self.kwargs.get('doctor_id')
-        return DoctorAvailability.objects.filter(doctor_id=doctor_id)
+        return DoctorAvailability.objects.filter(doctor_id=doctor_id).order_by('id')
 
     def perform_create(self, serializer):
         doctor_id = self.kwargs.get('doctor_id')
@@ -61,4 +91,116 @@ class DoctorAvailabilityBulkCreateView(generics.CreateAPIView):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         serializer.save(doctor=self.get_doctor())
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        # Resubmitting an unchanged template creates nothing
+        created = serializer.instance['created']
+        return Response(serializer.data, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+class DoctorNextAvailableSlotsView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        params = NextAvailableSlotQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        filters = params.validated_data
+
+        doctors = Doctor.objects.filter(is_available=True)
+        if 'specialization' in filters:
+            doctors = doctors.filter(specialization_id=filters['specialization'])
+        if 'min_fee' in filters:
+            doctors = doctors.filter(consultation_fee__gte=filters['min_fee'])
+        if 'max_fee' in filters:
+            doctors = doctors.filter(consultation_fee__lte=filters['max_fee'])
+
+        slots = find_next_free_slots(
+            doctors,
+            duration=filters['duration'],
+            limit=filters['limit'],
+            start_date=filters.get('start_date'),
+            days=filters['days'],
+            per_doctor=filters['per_doctor']
+        )
+        profiles = Doctor.objects.select_related('user', 'specialization').in_bulk(
+            {slot['doctor_id'] for slot in slots}
+        )
+        for slot in slots:
+            slot['doctor'] = profiles[slot['doctor_id']]
+        return Response(DoctorSlotSerializer(slots, many=True).data)
+
+class DoctorCalendarView(APIView):
+    """Free and busy segments of a doctor for each day of a week or month."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, doctor_id):
+        params = DoctorCalendarQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        start = params.validated_data.get('start') or timezone.localdate()
+        days = [start + timedelta(days=offset) for offset in range(params.validated_data['days'])]
+
+        calendar = get_calendar(doctor_id, days)
+        if calendar is None:
+            raise Http404
+        # Only staff and the doctor see which appointment holds a busy segment
+        if not self.sees_bookings(request.user, doctor_id):
+            calendar = without_bookings(calendar)
+        return Response({
+            'doctor': doctor_id,
+            'start': days[0],
+            'end': days[-1],
+            'days': calendar,
+        })
+
+    def sees_bookings(self, user, doctor_id):
+        if user.is_staff or user.user_type == 'admin':
+            return True
+        return user.user_type == 'doctor' and Doctor.objects.filter(pk=doctor_id, user_id=user.id).exists()
+
+# Async versions of the hot read endpoints, for the ASGI request path
+
+class AsyncDoctorListView(SparseFieldsetViewMixin, AsyncReadAPIView):
+    serializer_class = DoctorSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    filter_backends = DoctorListView.filter_backends
+    search_index = DoctorListView.search_index
+    search_fields = DoctorListView.search_fields
+    fast_list = DoctorListView.fast_list
+
+    async def get(self, request):
+        # Ranked search resolves its matches with a query up front
+        queryset = await sync_to_async(self.filter_queryset)(Doctor.objects.for_listing())
+        paginator = KeysetPagination()
+        renderer = row_renderer(self.get_serializer()) if self.fast_list else None
+        if renderer is None:
+            doctors = await paginator.apaginate_queryset(queryset, request, self)
+            data = self.get_serializer(doctors, many=True).data
+        else:
+            # The values() row path of FastListMixin.list
+            ordering = [field.lstrip('-') for field in paginator.get_ordering(request, queryset, self)]
+            rows = await paginator.apaginate_queryset(renderer.values(queryset, *ordering), request, self)
+            data = renderer.render_page(rows)
+        response = paginator.get_paginated_response(data).data
+        facets = DoctorFacetFilter()
+        if facets.facets_requested(request):
+            response['facets'] = await sync_to_async(facets.get_facets)(request, self)
+        return response
+
+class AsyncDoctorDetailView(SparseFieldsetViewMixin, AsyncReadAPIView):
+    serializer_class = DoctorSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    async def get(self, request, pk):
+        try:
+            doctor = await self.filter_queryset(Doctor.objects.for_listing()).aget(pk=pk)
+        except Doctor.DoesNotExist:
+            raise Http404
+        return self.get_serializer(doctor).data
+
+class AsyncDoctorAvailabilityView(SparseFieldsetViewMixin, AsyncReadAPIView):
+    serializer_class = DoctorAvailabilitySerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    async def get(self, request, doctor_id):
+        queryset = self.filter_queryset(DoctorAvailability.objects.filter(doctor_id=doctor_id).order_by('id'))
+        paginator = AsyncPageNumberPagination()
+        windows = await paginator.apaginate_queryset(queryset, request, self)
+        data = self.get_serializer(windows, many=True).data
+        return paginator.get_paginated_response(data).data
@@ -1,13 +0,0 @@
-# Celery Configuration
-CELERY_BROKER_URL = 'redis://localhost:6379/0'
-CELERY_RESULT_BACKEND = 'django-db'
-CELERY_ACCEPT_CONTENT = ['json']
-CELERY_TASK_SERIALIZER = 'json'
-CELERY_RESULT_SERIALIZER = 'json'
-CELERY_TIMEZONE = TIME_ZONE
-
-# Add Celery apps to INSTALLED_APPS
-INSTALLED_APPS += [
-    'django_celery_beat',
-    'django_celery_results',
-] 
\ No newline at end of file
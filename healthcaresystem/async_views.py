@@ -0,0 +1,104 @@
+"""
+Async read-only views for the ASGI request path.
+
+DRF's APIView is synchronous, so under ASGI every request holds a worker thread
+for its whole duration, including the time spent waiting on the database.
+``AsyncReadAPIView`` is a plain Django async view that performs the same
+authentication, permission checks, error responses and JSON rendering as DRF.
+Subclasses implement ``async def get`` with Django's async ORM and return
+plain data, so they can reuse the sync views' serializers and produce the same
+bytes. ``serializer_class``, ``filter_backends`` and the hooks below mirror
+GenericAPIView, so mixins such as SparseFieldsetViewMixin apply to both.
+"""
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponse
+from django.views import View
+from rest_framework import exceptions, status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from .metrics import rendering
+
+
+class AsyncReadAPIView(View):
+    authentication_classes = api_settings.DEFAULT_AUTHENTICATION_CLASSES
+    permission_classes = api_settings.DEFAULT_PERMISSION_CLASSES
+    renderer_class = JSONRenderer
+    serializer_class = None
+    filter_backends = ()
+    http_method_names = ['get', 'head']
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.request = self.initialize_request(request)
+        try:
+            # Token checks may hit the user status cache, which is synchronous
+            await sync_to_async(self.initial)(self.request)
+            handler = getattr(self, request.method.lower(), None)
+            if request.method.lower() not in self.http_method_names or handler is None:
+                raise exceptions.MethodNotAllowed(request.method)
+            data = await handler(self.request, *args, **kwargs)
+            return self.render(data, status.HTTP_200_OK)
+        except Http404:
+            return self.render({'detail': exceptions.NotFound.default_detail}, status.HTTP_404_NOT_FOUND)
+        except exceptions.APIException as exc:
+            return self.handle_exception(exc)
+
+    async def head(self, request, *args, **kwargs):
+        return await self.get(request, *args, **kwargs)
+
+    def initialize_request(self, request):
+        return Request(request, authenticators=[auth() for auth in self.authentication_classes])
+
+    def initial(self, request):
+        # Resolves request.user, raising on invalid credentials like APIView.perform_authentication
+        request.user
+        for permission in [permission() for permission in self.permission_classes]:
+            if not permission.has_permission(request, self):
+                if request.authenticators and not request.successful_authenticator:
+                    raise exceptions.NotAuthenticated()
+                raise exceptions.PermissionDenied(getattr(permission, 'message', None))
+
+    def handle_exception(self, exc):
+        headers = {}
+        if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+            authenticate_header = self.get_authenticate_header()
+            if authenticate_header:
+                headers['WWW-Authenticate'] = authenticate_header
+            else:
+                exc.status_code = status.HTTP_403_FORBIDDEN
+        if isinstance(exc.detail, (list, dict)):
+            data = exc.detail
+        else:
+            data = {'detail': exc.detail}
+        response = self.render(data, exc.status_code)
+        for name, value in headers.items():
+            response[name] = value
+        return response
+
+    def get_authenticate_header(self):
+        authenticators = self.request.authenticators
+        if authenticators:
+            return authenticators[0].authenticate_header(self.request)
+        return None
+
+    def get_serializer_class(self):
+        return self.serializer_class
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('context', self.get_serializer_context())
+        return self.get_serializer_class()(*args, **kwargs)
+
+    def get_serializer_context(self):
+        return {'request': self.request, 'format': None, 'view': self}
+
+    def filter_queryset(self, queryset):
+        # Synchronous, like GenericAPIView; call it through sync_to_async if a backend queries
+        for backend in self.filter_backends:
+            queryset = backend().filter_queryset(self.request, queryset, self)
+        return queryset
+
+    def render(self, data, status_code):
+        with rendering():
+            content = self.renderer_class().render(data)
+        return HttpResponse(content, status=status_code, content_type=self.renderer_class.media_type)
@@ -0,0 +1,108 @@
+"""
+Versioned read-through cache for rarely changing API reads.
+
+Each cached response depends on one or more namespaces, e.g. ``specializations``
+or ``doctor:12``. Every namespace has a version counter in Django's cache, and
+entry keys embed the current versions, so invalidating a namespace is a
+single ``incr`` that orphans all entries built from it. Old entries simply
+expire. This works the same with LocMem and with a shared backend like Redis.
+
+Cached entries carry an ETag and a Last-Modified time, and requests with a
+matching If-None-Match or If-Modified-Since get a 304.
+"""
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+VERSION_KEY = 'readcache:version:{namespace}'
+ENTRY_KEY = 'readcache:entry:{digest}'
+
+
+def namespace_versions(namespaces):
+    keys = {VERSION_KEY.format(namespace=namespace): namespace for namespace in namespaces}
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # Start from the clock rather than 0, so an evicted counter can never
+            # come back to a value that older entries were stored under
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump(namespace):
+    key = VERSION_KEY.format(namespace=namespace)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), timeout=None)
+
+
+def invalidate(*namespaces):
+    """Orphan every entry built from ``namespaces``, now and again on commit."""
+    for namespace in namespaces:
+        bump(namespace)
+    # A request may cache the old rows between the write and the commit
+    transaction.on_commit(lambda: [bump(namespace) for namespace in namespaces])
+
+
+class CachedReadMixin:
+    """
+    Serve ``list`` and ``retrieve`` of a generic view from the read-through cache.
+
+    Views name the namespaces a response depends on in ``cache_namespaces`` or
+    by overriding ``get_cache_namespaces``. Only successful responses are cached.
+    """
+    cache_namespaces = ()
+    cache_timeout = 60 * 60
+
+    def get_cache_namespaces(self):
+        return list(self.cache_namespaces)
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, lambda: super(CachedReadMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(request, lambda: super(CachedReadMixin, self).retrieve(request, *args, **kwargs))
+
+    def cached_response(self, request, build):
+        namespaces = self.get_cache_namespaces()
+        versions = namespace_versions(namespaces)
+        digest = hashlib.md5(repr((namespaces, versions, request.build_absolute_uri())).encode()).hexdigest()
+        key = ENTRY_KEY.format(digest=digest)
+
+        entry = cache.get(key)
+        if entry is None:
+            response = build()
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            entry = {
+                'data': response.data,
+                'etag': quote_etag(hashlib.md5(JSONRenderer().render(response.data)).hexdigest()),
+                'last_modified': int(time.time()),
+            }
+            # Rows read inside an open transaction may still be rolled back
+            if not connection.in_atomic_block:
+                cache.set(key, entry, timeout=self.cache_timeout)
+
+        headers = {
+            'ETag': entry['etag'],
+            'Last-Modified': http_date(entry['last_modified']),
+            'Cache-Control': 'private, no-cache',
+        }
+        if self.not_modified(request, entry):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(entry['data'], headers=headers)
+
+    def not_modified(self, request, entry):
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match is not None:
+            return entry['etag'] in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+        if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since') or '')
+        return if_modified_since is not None and entry['last_modified'] <= if_modified_since
@@ -0,0 +1,188 @@
+"""
+Sparse fieldsets for read endpoints.
+
+``?fields=`` names the fields to render, with dots for fields of nested
+serializers: ``?fields=id,status,doctor_details.user.first_name``. Naming a
+nested serializer without sub-fields renders all of its fields.
+
+``?expand=`` names the expandable nested serializers to embed, also dotted:
+``?expand=patient_details`` embeds the patient without the medical records it
+would otherwise carry, and ``?expand=patient_details.medical_records`` adds
+them back. Without ``?expand=`` every expandable field is embedded, as before.
+A field named in ``?fields=`` is always rendered.
+
+Serializers opt in with ``SparseFieldsetMixin``; views with
+``SparseFieldsetViewMixin``. The view rebuilds the queryset's
+``select_related`` and ``prefetch_related`` from the fields that will
+actually be rendered, so relations nobody asked for are never fetched.
+Serializers of pre-rendered documents name the serializer that rendered them
+in ``fieldset_serializer`` and apply the selection with ``prune``. Writes
+ignore both parameters.
+"""
+from django.db.models import Prefetch
+from rest_framework import permissions, serializers
+from rest_framework.exceptions import ValidationError
+
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+
+
+def parse(value):
+    """'id,doctor_details.user.first_name' -> {'id': {}, 'doctor_details': {'user': {'first_name': {}}}}"""
+    tree = {}
+    for path in value.split(','):
+        node = tree
+        for part in path.strip().split('.'):
+            if part:
+                node = node.setdefault(part, {})
+    return tree
+
+
+def nested(selection, name):
+    """The selection for the nested serializer in field ``name``."""
+    fields, expand = selection
+    return (fields.get(name) or None) if fields else None, expand.get(name, {}) if expand is not None else None
+
+
+def nested_serializer(field):
+    if isinstance(field, serializers.ListSerializer):
+        field = field.child
+    return field if isinstance(field, serializers.BaseSerializer) else None
+
+
+def visible(fields, selection, expandable):
+    """Names in ``fields`` rendered under ``selection``."""
+    wanted, expand = selection
+    return [
+        name for name in fields
+        if (wanted is None or name in wanted)
+        and (name not in expandable or expand is None or name in expand or (wanted and name in wanted))
+    ]
+
+
+def related_lookups(serializer, selection, prefix='', path=''):
+    """
+    Return the (select_related, prefetch_related) lookups needed to render
+    ``serializer`` under ``selection``, rejecting unknown field names.
+    """
+    fields = serializer.get_fields()
+    expandable = getattr(serializer, 'expandable_fields', ())
+    wanted, expand = selection
+    for param, names, known in ((FIELDS_PARAM, wanted or {}, fields), (EXPAND_PARAM, expand or {}, expandable)):
+        unknown = [f'{path}{name}' for name in names if name not in known]
+        if unknown:
+            raise ValidationError({param: [f"Unknown field: {name}" for name in unknown]})
+
+    selects, prefetches = [], []
+    related = getattr(serializer, 'related_fields', {})
+    for name in visible(fields, selection, expandable):
+        field = fields[name]
+        source = (field.source or name).split('.')
+        child = nested_serializer(field)
+        if name in related:
+            lookup = related[name]
+            if isinstance(lookup, Prefetch):
+                prefetches.append(Prefetch(prefix + lookup.prefetch_through, queryset=lookup.queryset,
+                                           to_attr=lookup.to_attr))
+            else:
+                selects.append(prefix + lookup)
+        elif child is not None and source != ['*']:
+            relation = prefix + '__'.join(source)
+            selects.append(relation)
+            child_selects, child_prefetches = related_lookups(
+                child, nested(selection, name), relation + '__', f'{path}{name}.'
+            )
+            selects.extend(child_selects)
+            prefetches.extend(child_prefetches)
+        elif len(source) > 1:
+            # e.g. source='specialization.name'
+            selects.append(prefix + '__'.join(source[:-1]))
+
+        if child is None and wanted and wanted.get(name):
+            raise ValidationError({FIELDS_PARAM: [f"{path}{name} has no sub-fields"]})
+    return selects, prefetches
+
+
+def prune(data, serializer, selection):
+    """Apply ``selection`` to ``data`` already rendered by ``serializer``, e.g. a stored document."""
+    if selection is None:
+        return data
+    fields = serializer.get_fields()
+    pruned = {}
+    for name in visible(fields, selection, getattr(serializer, 'expandable_fields', ())):
+        value = data[name]
+        child = nested_serializer(fields[name])
+        if child is not None and value is not None:
+            if isinstance(value, list):
+                value = [prune(item, child, nested(selection, name)) for item in value]
+            else:
+                value = prune(value, child, nested(selection, name))
+        pruned[name] = value
+    return pruned
+
+
+class SparseFieldsetMixin:
+    """Renders only the fields selected by the view's ``?fields=`` and ``?expand=``."""
+    # Nested serializers that ``?expand=`` controls
+    expandable_fields = ()
+    # Relations a field reads beyond its nested serializer or dotted source:
+    # a select_related path or a Prefetch, relative to this serializer's model
+    related_fields = {}
+
+    def get_fields(self):
+        fields = super().get_fields()
+        selection = self.fieldset()
+        if selection is None:
+            return fields
+        names = set(visible(fields, selection, self.expandable_fields))
+        return type(fields)((name, field) for name, field in fields.items() if name in names)
+
+    def fieldset(self):
+        selection = self.context.get('fieldset')
+        if selection is None:
+            return None
+        path = []
+        node = self
+        while node.parent is not None:
+            # List serializers bind their child with an empty field name
+            if node.field_name:
+                path.append(node.field_name)
+            node = node.parent
+        for name in reversed(path):
+            selection = nested(selection, name)
+        return selection
+
+
+class SparseFieldsetViewMixin:
+    """Parses ``?fields=`` / ``?expand=`` on reads and prunes the queryset to match."""
+
+    def get_fieldset(self):
+        if not hasattr(self, '_fieldset'):
+            self._fieldset = self._lookups = None
+            params = self.request.query_params
+            if self.request.method in permissions.SAFE_METHODS and (FIELDS_PARAM in params or EXPAND_PARAM in params):
+                wanted = parse(params[FIELDS_PARAM]) if params.get(FIELDS_PARAM) else None
+                expand = parse(params[EXPAND_PARAM]) if EXPAND_PARAM in params else None
+                serializer_class = self.get_serializer_class()
+                template = getattr(serializer_class, 'fieldset_serializer', None)
+                lookups = related_lookups((template or serializer_class)(), (wanted, expand))
+                # Pre-rendered documents need no relations
+                self._lookups = None if template else lookups
+                self._fieldset = (wanted, expand)
+        return self._fieldset
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fieldset'] = self.get_fieldset()
+        return context
+
+    def filter_queryset(self, queryset):
+        # Views override get_queryset, but list() and get_object() all pass through here
+        queryset = super().filter_queryset(queryset)
+        if self.get_fieldset() is None or self._lookups is None:
+            return queryset
+        selects, prefetches = self._lookups
+        queryset = queryset.select_related(None).prefetch_related(None)
+        if selects:
+            queryset = queryset.select_related(*selects)
+        return queryset.prefetch_related(*prefetches)
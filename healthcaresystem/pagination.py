@@ -0,0 +1,219 @@
+"""
+Keyset pagination for large list endpoints.
+
+Pages are addressed by the (created_at, pk) of the row they start after, so
+every page is an indexed range scan of ``page_size + 1`` rows. Unlike
+PageNumberPagination there is no OFFSET and no COUNT(*) per request. A total
+is only computed when the client asks for it with ``?include_count=true``;
+it is then cached briefly, or estimated from table statistics on PostgreSQL
+when the list is unfiltered.
+
+Both paginators here also offer ``apaginate_queryset`` for the async views.
+It awaits the count and the page one after the other: Django runs every ORM
+call of a request on the same thread-sensitive executor, so gathering them
+would not overlap the queries anyway.
+"""
+import hashlib
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from urllib import parse
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.paginator import InvalidPage
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+async def fetch(queryset):
+    # ``async for`` evaluates through _fetch_all, so select/prefetch_related still apply
+    return [row async for row in queryset]
+
+
+class KeysetPagination(BasePagination):
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    count_query_param = 'include_count'
+    count_cache_timeout = 60
+    # Both keys must share a direction, the last one must be unique and the pair indexed
+    ordering = ('-created_at', '-pk')
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset, page_queryset = self.prepare(queryset, request, view)
+        self.count = self.get_count(queryset) if self.count_requested(request) else None
+        return self.finish(list(page_queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        queryset, page_queryset = self.prepare(queryset, request, view)
+        self.count = await sync_to_async(self.get_count)(queryset) if self.count_requested(request) else None
+        return self.finish(await fetch(page_queryset))
+
+    def prepare(self, queryset, request, view):
+        """Return the ordered queryset and the unevaluated query for this page."""
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        ordering = self.get_ordering(request, queryset, view)
+        self.key_field, self.tie_field = (field.lstrip('-') for field in ordering)
+        descending = ordering[0].startswith('-')
+        queryset = queryset.order_by(*ordering)
+
+        self.cursor = self.decode_cursor(request)
+        self.reverse = False
+        page_queryset = queryset
+        if self.cursor is not None:
+            key, tie, self.reverse = self.cursor
+            lookup = 'lt' if descending != self.reverse else 'gt'
+            page_queryset = page_queryset.filter(
+                Q(**{f'{self.key_field}__{lookup}': key}) |
+                Q(**{self.key_field: key, f'{self.tie_field}__{lookup}': tie})
+            )
+            if self.reverse:
+                page_queryset = page_queryset.reverse()
+        return queryset, page_queryset[:self.page_size + 1]
+
+    def finish(self, rows):
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if self.reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.cursor is not None
+        self.page = rows
+        return rows
+
+    def get_paginated_response(self, data):
+        response = OrderedDict()
+        if self.count is not None:
+            response['count'] = self.count
+        response['next'] = self.get_next_link()
+        response['previous'] = self.get_previous_link()
+        response['results'] = data
+        return Response(response)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'count': {'type': 'integer', 'description': f'Only present with ?{self.count_query_param}=true'},
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_ordering(self, request, queryset, view):
+        # Filter backends such as ranked search may impose their own key pair
+        for backend in getattr(view, 'filter_backends', ()):
+            if hasattr(backend, 'get_keyset_ordering'):
+                ordering = backend().get_keyset_ordering(request, queryset, view)
+                if ordering:
+                    return ordering
+        return self.ordering
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def encode_cursor(self, row, reverse):
+        # Rows are model instances, or dicts on the values() fast path
+        if isinstance(row, dict):
+            key, tie = row[self.key_field], row[self.tie_field]
+        else:
+            key, tie = getattr(row, self.key_field), getattr(row, self.tie_field)
+        token = parse.urlencode({
+            'k': key.isoformat() if hasattr(key, 'isoformat') else key,
+            't': tie,
+            'r': int(reverse),
+        })
+        encoded = urlsafe_b64encode(token.encode('ascii')).decode('ascii')
+        url = remove_query_param(self.base_url, self.count_query_param)
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            token = parse.parse_qs(urlsafe_b64decode(encoded.encode('ascii')).decode('ascii'))
+            return token['k'][0], int(token['t'][0]), bool(int(token['r'][0]))
+        except (TypeError, ValueError, KeyError, IndexError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def count_requested(self, request):
+        return request.query_params.get(self.count_query_param, '').lower() in ('1', 'true', 'yes')
+
+    def get_count(self, queryset):
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql' and not queryset.query.where:
+            # Unfiltered lists are estimated from planner statistics
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+                               [queryset.model._meta.db_table])
+                row = cursor.fetchone()
+            if row and row[0] >= 0:
+                return row[0]
+        sql, params = queryset.query.sql_with_params()
+        key = 'pagination:count:' + hashlib.md5(f'{sql}{params}'.encode()).hexdigest()
+        return cache.get_or_set(key, queryset.count, timeout=self.count_cache_timeout)
+
+
+class AsyncPageNumberPagination(PageNumberPagination):
+    """PageNumberPagination with an ``apaginate_queryset`` for the async views."""
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        paginator = self.django_paginator_class(queryset, page_size)
+        # get_page_number would count synchronously to resolve 'last'
+        page_number = request.query_params.get(self.page_query_param, 1)
+        if page_number in self.last_page_strings:
+            paginator.count = await queryset.acount()
+            page_number = paginator.num_pages
+            rows = None
+        else:
+            try:
+                offset = (int(page_number) - 1) * page_size
+            except (TypeError, ValueError):
+                offset = 0
+            rows_query = queryset[max(offset, 0):max(offset, 0) + page_size]
+            paginator.count = await queryset.acount()
+            rows = await fetch(rows_query)
+
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            msg = self.invalid_page_message.format(page_number=page_number, message=str(exc))
+            raise NotFound(msg)
+        if rows is None:
+            rows = await fetch(self.page.object_list)
+        self.page.object_list = rows
+
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        self.request = request
+        return rows
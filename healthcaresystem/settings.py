@@ -8,24 +8,59 @@ https://docs.djangoproject.com/en/5.2/topics/settings/
 
 For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
+
+Every deployment-specific value is read from the environment. DJANGO_PROFILE
+selects the defaults: 'development' (the default) runs on SQLite with DEBUG
+on, a per-process cache and inline Celery tasks. 'production' never enables
+DEBUG and requires SECRET_KEY, ALLOWED_HOSTS, a shared cache and a broker.
 """
 
+import importlib.util
+import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
+from .database import database_config
+
+
+def env_bool(name, default=False):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def env_list(name, default=()):
+    value = os.environ.get(name)
+    if value is None:
+        return list(default)
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 
-# Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
+PROFILE = os.environ.get('DJANGO_PROFILE', 'development')
+if PROFILE not in ('development', 'production'):
+    raise ImproperlyConfigured(f"Unknown DJANGO_PROFILE: {PROFILE!r}")
+PRODUCTION = PROFILE == 'production'
 
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = 'django-insecure-$q=!cke+c9@-n@mq%*h-t3)6#(34k^4ha_1m1=r7*x(wn!-+($'
+SECRET_KEY = os.environ.get('SECRET_KEY')
+if not SECRET_KEY:
+    if PRODUCTION:
+        raise ImproperlyConfigured("SECRET_KEY must be set in production")
+    SECRET_KEY = 'django-insecure-$q=!cke+c9@-n@mq%*h-t3)6#(34k^4ha_1m1=r7*x(wn!-+($'
 
-# SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+# DEBUG keeps every SQL query of a request in connection.queries, so production never enables it
+DEBUG = not PRODUCTION and env_bool('DEBUG', True)
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = env_list('ALLOWED_HOSTS')
+if PRODUCTION and not ALLOWED_HOSTS:
+    raise ImproperlyConfigured("ALLOWED_HOSTS must be set in production")
 
 
 # Application definition
@@ -37,15 +72,20 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'rest_framework',
 
     # my apps 
     'doctors',
     'patients',
     'appointments',
     'users',    
+    'benchmarks',
+    'search',
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover the whole middleware stack
+    'healthcaresystem.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -77,12 +117,26 @@ WSGI_APPLICATION = 'healthcaresystem.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+# See healthcaresystem/database.py. Under ASGI without a pool, set DB_CONN_MAX_AGE=0:
+# every sync_to_async thread would otherwise keep its own connection open.
 
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_config(
+        os.environ.get('DATABASE_URL', 'sqlite:///db.sqlite3'),
+        BASE_DIR,
+        conn_max_age=int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        health_checks=env_bool('DB_CONN_HEALTH_CHECKS', True),
+        pool=os.environ.get('DATABASE_POOL'),
+    )
+}
+
+# Applied to every SQLite connection, including the test database. WAL lets reads run
+# alongside a write, NORMAL only syncs at checkpoints (safe under WAL) and mmap reads
+# pages without copying them.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
 }
 
 
@@ -133,7 +187,7 @@ AUTH_USER_MODEL = 'users.User'
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.ClaimsJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -148,6 +202,113 @@ SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
 }
+# ClaimsJWTAuthentication re-checks a user's active flag, role and password at most this often
+JWT_STATUS_CACHE_TTL = 30
+JWT_STATUS_CACHE_SIZE = 1024
+
+# Cache
+# Cache invalidations (read-cache versions, slot versions, calendar days, facets) only
+# reach other processes through a shared cache, so deployments with several workers
+# set REDIS_URL (or CACHE_URL). Without one, each process keeps its own LocMem cache.
+CACHE_URL = os.environ.get('REDIS_URL') or os.environ.get('CACHE_URL')
+if PRODUCTION and not CACHE_URL:
+    raise ImproperlyConfigured("REDIS_URL must be set in production")
+if CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+        }
+    }
+else:
+    # Availability bitmaps are cached per doctor, so allow far more than LocMem's default 300 entries
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {
+                'MAX_ENTRIES': 50000,
+            },
+        }
+    }
+
+# Scheduling
+# Granularity of the per-doctor weekly availability bitmaps
+AVAILABILITY_SLOT_MINUTES = 5
+
+# Celery settings
+# Without a configured broker, tasks run inline so local runs and tests need no Redis.
+# Production must not run confirmations, reminders and facet rebuilds inside web requests.
+if PRODUCTION and 'CELERY_BROKER_URL' not in os.environ:
+    raise ImproperlyConfigured("CELERY_BROKER_URL must be set in production")
+CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', 'redis://localhost:6379/0')
+CELERY_TASK_ALWAYS_EAGER = 'CELERY_BROKER_URL' not in os.environ
+CELERY_ACCEPT_CONTENT = ['json']
+CELERY_TASK_SERIALIZER = 'json'
+CELERY_RESULT_SERIALIZER = 'json'
+CELERY_TIMEZONE = TIME_ZONE
+# No task result is read back, so results are only stored when a backend is configured
+CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND')
+CELERY_TASK_IGNORE_RESULT = not CELERY_RESULT_BACKEND
+if CELERY_RESULT_BACKEND == 'django-db':
+    INSTALLED_APPS.append('django_celery_results')
+# With django-celery-beat installed, beat keeps the schedule below in the database
+# so intervals can be changed in the admin
+if importlib.util.find_spec('django_celery_beat'):
+    INSTALLED_APPS.append('django_celery_beat')
+    CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
+# Run with `celery -A healthcaresystem beat`
+CELERY_BEAT_SCHEDULE = {
+    'refresh-doctor-facets': {
+        'task': 'doctors.tasks.refresh_doctor_facets',
+        'schedule': float(os.environ.get('DOCTOR_FACETS_REFRESH_INTERVAL', 15 * 60)),
+    },
+    'schedule-appointment-reminders': {
+        'task': 'appointments.tasks.schedule_appointment_reminders',
+        'schedule': float(os.environ.get('APPOINTMENT_REMINDER_INTERVAL', 5 * 60)),
+    },
+}
+
+# Appointment confirmations are enqueued in batches of up to FLUSH_SIZE ids, at most
+# FLUSH_INTERVAL seconds after the booking commits. 0 sends on every commit.
+APPOINTMENT_CONFIRMATION_FLUSH_SIZE = int(os.environ.get('APPOINTMENT_CONFIRMATION_FLUSH_SIZE', 500))
+APPOINTMENT_CONFIRMATION_FLUSH_INTERVAL = float(os.environ.get(
+    'APPOINTMENT_CONFIRMATION_FLUSH_INTERVAL', 0 if CELERY_TASK_ALWAYS_EAGER else 2
+))
+
+# Reminders go out about LEAD_HOURS before an appointment. Bookings are scanned in
+# time buckets of BUCKET_MINUTES (must divide a day), one task per SHARD_SIZE doctor ids.
+APPOINTMENT_REMINDER_LEAD_HOURS = float(os.environ.get('APPOINTMENT_REMINDER_LEAD_HOURS', 24))
+APPOINTMENT_REMINDER_BUCKET_MINUTES = int(os.environ.get('APPOINTMENT_REMINDER_BUCKET_MINUTES', 60))
+APPOINTMENT_REMINDER_SHARD_SIZE = int(os.environ.get('APPOINTMENT_REMINDER_SHARD_SIZE', 1000))
+
+# Bookings lock the (doctor, date) schedule row; lock timeouts and deadlocks are
+# retried up to this many times before the request fails with 503.
+BOOKING_MAX_ATTEMPTS = int(os.environ.get('BOOKING_MAX_ATTEMPTS', 5))
+
+# Metrics
+# When set, GET /metrics/ requires "Authorization: Bearer <METRICS_TOKEN>"; production serves it only then
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# Logging
+# SQL statements are only logged with DEBUG and LOG_SQL both on
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'django.db.backends': {
+            'handlers': ['console'],
+            'level': 'DEBUG' if DEBUG and env_bool('LOG_SQL') else 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
+# Email
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'appointments@healthcare.local')
 
 # CORS settings
 CORS_ALLOWED_ORIGINS = [
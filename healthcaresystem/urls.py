@@ -15,8 +15,15 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path
+from django.urls import include, path
+
+from .metrics import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('api/users/', include('users.urls')),
+    path('api/doctors/', include('doctors.urls')),
+    path('api/patients/', include('patients.urls')),
+    path('api/appointments/', include('appointments.urls')),
+    path('metrics/', metrics_view, name='metrics'),
 ]
@@ -0,0 +1,94 @@
+"""
+Streaming export of medical records.
+
+Records are read with one ``select_related('patient__user')`` query through
+``iterator(chunk_size=...)``, rendered row by row with MedicalRecordSerializer
+and written out in blocks. Memory therefore stays flat however many records
+match. The export is NDJSON (one JSON object per line) or CSV.
+
+Under ASGI, Django reads a synchronous streaming iterator to the end before
+sending anything, so ``astream`` hands the same blocks out through an async
+iterator, producing each one in the request's sync thread.
+"""
+import csv
+import io
+
+from asgiref.sync import sync_to_async
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import MedicalRecord
+from .serializers import MedicalRecordSerializer
+
+CHUNK_SIZE = 2000
+# Flush rendered rows to the response in blocks of about this many bytes
+BLOCK_SIZE = 64 * 1024
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+
+def export_queryset(patient_ids=None, date_from=None, date_to=None):
+    records = MedicalRecord.objects.select_related('patient__user').order_by('patient_id', 'id')
+    if patient_ids:
+        records = records.filter(patient_id__in=patient_ids)
+    if date_from:
+        records = records.filter(date__gte=date_from)
+    if date_to:
+        records = records.filter(date__lte=date_to)
+    return records
+
+
+def rows(records):
+    serializer = MedicalRecordSerializer()
+    for record in records.iterator(chunk_size=CHUNK_SIZE):
+        yield serializer.to_representation(record)
+
+
+def blocks(lines):
+    buffer = []
+    size = 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= BLOCK_SIZE:
+            yield ''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def ndjson_lines(records):
+    encoder = JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    for row in rows(records):
+        yield encoder.encode(row) + '\n'
+
+
+def csv_lines(records):
+    fields = MedicalRecordSerializer.Meta.fields
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields)
+    writer.writeheader()
+    for row in rows(records):
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def stream(records, output):
+    lines = csv_lines(records) if output == 'csv' else ndjson_lines(records)
+    return blocks(lines)
+
+
+async def astream(records, output):
+    blocks = stream(records, output)
+    # The database cursor stays in the thread that opened it
+    read = sync_to_async(next, thread_sensitive=True)
+    while True:
+        block = await read(blocks, None)
+        if block is None:
+            return
+        yield block
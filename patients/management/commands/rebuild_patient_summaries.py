@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from patients.summaries import rebuild
+
+
+class Command(BaseCommand):
+    help = "Rebuild the materialized patient summaries from the current data"
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Summarized {rebuild()} patients")
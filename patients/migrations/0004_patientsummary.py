@@ -0,0 +1,36 @@
+# Generated by Django 4.2.10 on 2026-10-18 11:06
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Summaries are rendered by the live API serializers, so existing patients are summarized by
+# `manage.py rebuild_patient_summaries` (or on first read) rather than by this migration.
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0003_created_id_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PatientSummary',
+            fields=[
+                ('patient', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='patients.patient')),
+                ('full_name', models.CharField(max_length=301)),
+                ('blood_type', models.CharField(choices=[('A+', 'A+'), ('A-', 'A-'), ('B+', 'B+'), ('B-', 'B-'), ('AB+', 'AB+'), ('AB-', 'AB-'), ('O+', 'O+'), ('O-', 'O-')], max_length=3)),
+                ('has_allergies', models.BooleanField(default=False)),
+                ('has_chronic_conditions', models.BooleanField(default=False)),
+                ('last_visit', models.DateField(blank=True, null=True)),
+                ('latest_diagnoses', models.JSONField(default=list)),
+                ('document', models.TextField()),
+                ('created_at', models.DateTimeField()),
+                ('refreshed_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created_at', 'patient'], name='summary_created_patient_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.10 on 2026-10-18 11:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0004_patientsummary'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='medicalrecord',
+            index=models.Index(fields=['patient', '-date', '-created_at'], name='record_patient_date_idx'),
+        ),
+    ]
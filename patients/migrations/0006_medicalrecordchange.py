@@ -0,0 +1,40 @@
+# Generated by Django 4.2.10 on 2026-10-18 11:47
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def journal_existing_records(apps, schema_editor):
+    # Existing records enter the journal as created, so clients can start from since=0
+    MedicalRecord = apps.get_model('patients', 'MedicalRecord')
+    MedicalRecordChange = apps.get_model('patients', 'MedicalRecordChange')
+    records = MedicalRecord.objects.order_by('id').values_list('id', 'patient_id').iterator(chunk_size=2000)
+    MedicalRecordChange.objects.bulk_create(
+        (MedicalRecordChange(patient_id=patient_id, record_id=record_id, action='created')
+         for record_id, patient_id in records),
+        batch_size=2000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0005_medicalrecord_record_patient_date_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MedicalRecordChange',
+            fields=[
+                ('seq', models.BigAutoField(primary_key=True, serialize=False)),
+                ('record_id', models.BigIntegerField()),
+                ('action', models.CharField(choices=[('created', 'Created'), ('updated', 'Updated'), ('deleted', 'Deleted')], max_length=7)),
+                ('changed_at', models.DateTimeField(auto_now_add=True)),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='record_changes', to='patients.patient')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['patient', 'seq'], name='record_change_patient_seq_idx')],
+            },
+        ),
+        migrations.RunPython(journal_existing_records, migrations.RunPython.noop),
+    ]
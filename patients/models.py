@@ -1,6 +1,28 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Prefetch, Window
+from django.db.models.functions import RowNumber
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
 from users.models import User
 
+def prefetch_recent_records(lookup='medical_records', recent_records=5):
+    """Prefetch the latest ``recent_records`` medical records per patient in one query."""
+    records = MedicalRecord.objects.annotate(
+        position=Window(
+            expression=RowNumber(),
+            partition_by=[F('patient_id')],
+            order_by=[F('date').desc(), F('created_at').desc()]
+        )
+    ).filter(position__lte=recent_records)
+    return Prefetch(lookup, queryset=records, to_attr='recent_medical_records')
+
+class PatientQuerySet(models.QuerySet):
+    def for_listing(self, recent_records=5):
+        """Load users and the latest ``recent_records`` medical records in two extra queries."""
+        return self.select_related('user').prefetch_related(
+            prefetch_recent_records(recent_records=recent_records)
+        )
+
 class Patient(models.Model):
     BLOOD_TYPE_CHOICES = (
         ('A+', 'A+'),
@@ -24,6 +46,13 @@ class Patient(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = PatientQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='patient_created_id_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user.get_full_name()} (Patient)"
 
@@ -38,6 +67,126 @@ class MedicalRecord(models.Model):
 
     class Meta:
         ordering = ['-date', '-created_at']
+        indexes = [
+            models.Index(fields=['patient', 'created_at', 'id'], name='record_patient_created_id_idx'),
+            # Matches the default ordering within a patient, used by the latest-records prefetch
+            models.Index(fields=['patient', '-date', '-created_at'], name='record_patient_date_idx'),
+        ]
 
     def __str__(self):
-        return f"Record for {self.patient} on {self.date}"
\ No newline at end of file
+        return f"Record for {self.patient} on {self.date}"
+
+    def save(self, *args, **kwargs):
+        # The change journal entry is written by the signals below and must commit with the row
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+class MedicalRecordChange(models.Model):
+    """
+    Append-only journal of medical record writes, read by the sync endpoint.
+
+    ``seq`` only ever grows, so a client that has seen every change up to
+    ``seq`` asks for the ones after it.
+    """
+    CREATED = 'created'
+    UPDATED = 'updated'
+    DELETED = 'deleted'
+    ACTION_CHOICES = (
+        (CREATED, 'Created'),
+        (UPDATED, 'Updated'),
+        (DELETED, 'Deleted'),
+    )
+
+    seq = models.BigAutoField(primary_key=True)
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='record_changes')
+    # Not a foreign key, so deletions keep their entry
+    record_id = models.BigIntegerField()
+    action = models.CharField(max_length=7, choices=ACTION_CHOICES)
+    changed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['patient', 'seq'], name='record_change_patient_seq_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.seq} {self.action} record {self.record_id}"
+
+class PatientSummary(models.Model):
+    """
+    Denormalized read model of a patient, kept current by the signals below.
+
+    ``document`` holds the patient's PatientSerializer output as JSON, so the
+    patient list and detail endpoints are answered from this table alone.
+    """
+    patient = models.OneToOneField(Patient, on_delete=models.CASCADE, primary_key=True, related_name='summary')
+    full_name = models.CharField(max_length=301)
+    blood_type = models.CharField(max_length=3, choices=Patient.BLOOD_TYPE_CHOICES)
+    has_allergies = models.BooleanField(default=False)
+    has_chronic_conditions = models.BooleanField(default=False)
+    last_visit = models.DateField(null=True, blank=True)
+    latest_diagnoses = models.JSONField(default=list)
+    document = models.TextField()
+    # Copied from the patient so keyset pagination needs no join
+    created_at = models.DateTimeField()
+    refreshed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'patient'], name='summary_created_patient_idx'),
+        ]
+
+    def __str__(self):
+        return f"Summary of {self.full_name}"
+
+# Summaries are refreshed in the writer's transaction, so they roll back with it
+
+@receiver(post_save, sender=Patient)
+def summarize_patient(sender, instance, **kwargs):
+    from .summaries import refresh
+    refresh([instance.id])
+
+@receiver(post_save, sender=User)
+def summarize_user_patient(sender, instance, created, update_fields=None, **kwargs):
+    from users.serializers import UserSerializer
+    # New users have no profile yet, only patients have a summary, and e.g. last_login
+    # updates touch no summarized field
+    if created or instance.user_type != 'patient':
+        return
+    if update_fields and not set(UserSerializer.Meta.fields) & set(update_fields):
+        return
+    from .summaries import refresh
+    refresh(Patient.objects.filter(user_id=instance.id).values_list('id', flat=True))
+
+@receiver(post_save, sender=MedicalRecord)
+@receiver(post_delete, sender=MedicalRecord)
+def summarize_record_patient(sender, instance, origin=None, **kwargs):
+    # Records cascading from a patient or user delete take the summary with them
+    if origin is not None and getattr(origin, 'model', type(origin)) is not MedicalRecord:
+        return
+    from .summaries import refresh
+    refresh([instance.patient_id])
+
+# Journal entries are written in the record's transaction, see patients/journal.py
+
+def journaled(origin):
+    # Records cascading from a patient delete take their journal with them
+    return origin is None or getattr(origin, 'model', type(origin)) is MedicalRecord
+
+@receiver(pre_save, sender=MedicalRecord)
+@receiver(pre_delete, sender=MedicalRecord)
+def lock_record_patient(sender, instance, origin=None, **kwargs):
+    if journaled(origin):
+        from .journal import lock_patient
+        lock_patient(instance.patient_id)
+
+@receiver(post_save, sender=MedicalRecord)
+def journal_record_save(sender, instance, created, **kwargs):
+    from .journal import append
+    append(instance, MedicalRecordChange.CREATED if created else MedicalRecordChange.UPDATED)
+
+@receiver(post_delete, sender=MedicalRecord)
+def journal_record_delete(sender, instance, origin=None, **kwargs):
+    if journaled(origin):
+        from .journal import append
+        append(instance, MedicalRecordChange.DELETED)
@@ -1,10 +1,15 @@
+import json
+
 from rest_framework import serializers
-from .models import Patient, MedicalRecord
+from healthcaresystem.fieldsets import SparseFieldsetMixin, prune
+from .models import Patient, MedicalRecord, PatientSummary, prefetch_recent_records
 from users.serializers import UserSerializer
 
-class PatientSerializer(serializers.ModelSerializer):
+class PatientSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     medical_records = serializers.SerializerMethodField()
+    expandable_fields = ('medical_records',)
+    related_fields = {'medical_records': prefetch_recent_records()}
 
     class Meta:
         model = Patient
@@ -15,17 +20,21 @@ class PatientSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'created_at', 'updated_at')
 
     def get_medical_records(self, obj):
-        records = obj.medical_records.all()[:5]  # Get only the 5 most recent records
+        # Prefetched by Patient.objects.for_listing(); fall back to a query otherwise
+        records = getattr(obj, 'recent_medical_records', None)
+        if records is None:
+            records = obj.medical_records.all()[:5]  # Get only the 5 most recent records
         return MedicalRecordSerializer(records, many=True).data
 
-class MedicalRecordSerializer(serializers.ModelSerializer):
+class MedicalRecordSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     patient_name = serializers.SerializerMethodField()
+    related_fields = {'patient_name': 'patient__user'}
 
     class Meta:
         model = MedicalRecord
         fields = ('id', 'patient', 'patient_name', 'diagnosis', 'prescription',
                  'notes', 'date', 'created_at', 'updated_at')
-        read_only_fields = ('id', 'created_at', 'updated_at')
+        read_only_fields = ('id', 'patient', 'created_at', 'updated_at')
 
     def get_patient_name(self, obj):
         return obj.patient.user.get_full_name()
@@ -35,4 +44,50 @@ class MedicalRecordSerializer(serializers.ModelSerializer):
         request = self.context.get('request')
         if request and not request.user.is_staff and not request.user.user_type == 'doctor':
             raise serializers.ValidationError("Only doctors and staff can create/edit medical records")
-        return attrs 
\ No newline at end of file
+        return attrs
+
+class PatientDocumentSerializer(serializers.BaseSerializer):
+    """Read-only: a Patient rendered from the PatientSerializer output stored on its PatientSummary."""
+    fieldset_serializer = PatientSerializer
+    # List pages read just the document column, see healthcaresystem/fastlist.py
+    row_lookups = ('id', 'summary__document')
+
+    def to_representation(self, instance):
+        summary = getattr(instance, 'summary', None)
+        return self.render_row({'id': instance.id, 'summary__document': summary.document if summary else None})
+
+    def render_row(self, row):
+        stored = row['summary__document']
+        if stored is None:
+            # Patients written by bulk paths that skip signals have no summary yet
+            from .summaries import document
+            stored = document(row['id'])
+        return prune(json.loads(stored), PatientSerializer(), self.context.get('fieldset'))
+
+class PatientSummarySerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(source='patient_id', read_only=True)
+
+    class Meta:
+        model = PatientSummary
+        fields = ('id', 'full_name', 'blood_type', 'has_allergies', 'has_chronic_conditions',
+                  'last_visit', 'latest_diagnoses')
+        read_only_fields = fields
+
+class MedicalRecordExportQuerySerializer(serializers.Serializer):
+    output = serializers.ChoiceField(choices=['ndjson', 'csv'], default='ndjson')
+    patient = serializers.CharField(required=False, help_text="Comma-separated patient ids")
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+
+    def validate_patient(self, value):
+        try:
+            patient_ids = [int(patient_id) for patient_id in value.split(',') if patient_id.strip()]
+        except ValueError:
+            raise serializers.ValidationError("Expected comma-separated patient ids")
+        if not patient_ids:
+            raise serializers.ValidationError("Expected at least one patient id")
+        return patient_ids
+
+class MedicalRecordChangesQuerySerializer(serializers.Serializer):
+    since = serializers.IntegerField(min_value=0, default=0, help_text="Last change sequence number the client has applied")
+    limit = serializers.IntegerField(min_value=1, max_value=500, default=100)
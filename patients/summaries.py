@@ -0,0 +1,76 @@
+"""
+Maintenance of PatientSummary rows.
+
+``refresh`` re-renders the summaries of the given patients with the same
+serializer the API uses and upserts them in one statement. The model signals
+call it for every patient, user and medical record write; ``rebuild`` covers
+bulk loads that bypass signals.
+"""
+import json
+
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import Patient, PatientSummary
+from .serializers import PatientSerializer
+
+BATCH_SIZE = 500
+RECENT_RECORDS = 5
+UPDATE_FIELDS = ['full_name', 'blood_type', 'has_allergies', 'has_chronic_conditions',
+                 'last_visit', 'latest_diagnoses', 'document', 'created_at', 'refreshed_at']
+
+
+def summary_for(patient):
+    document = PatientSerializer(patient).data
+    records = patient.recent_medical_records
+    return PatientSummary(
+        patient_id=patient.id,
+        full_name=patient.user.get_full_name(),
+        blood_type=patient.blood_type,
+        has_allergies=bool(patient.allergies.strip()),
+        has_chronic_conditions=bool(patient.chronic_conditions.strip()),
+        last_visit=records[0].date if records else None,
+        latest_diagnoses=[record.diagnosis for record in records],
+        document=json.dumps(document, cls=JSONEncoder, ensure_ascii=False),
+        created_at=patient.created_at,
+    )
+
+
+def refresh(patient_ids):
+    """Re-render and upsert the summaries of ``patient_ids``; returns how many were written."""
+    return len(write(patient_ids))
+
+
+def write(patient_ids):
+    """Re-render and upsert the summaries of ``patient_ids``; returns them."""
+    patients = Patient.objects.for_listing(recent_records=RECENT_RECORDS).filter(id__in=list(patient_ids))
+    summaries = [summary_for(patient) for patient in patients]
+    if summaries:
+        PatientSummary.objects.bulk_create(
+            summaries,
+            update_conflicts=True,
+            unique_fields=['patient'],
+            update_fields=UPDATE_FIELDS,
+        )
+    return summaries
+
+
+def document(patient_id):
+    """The summary document of ``patient_id``, built if it is missing; None for unknown patients."""
+    stored = PatientSummary.objects.filter(patient_id=patient_id).values_list('document', flat=True).first()
+    if stored is not None:
+        return stored
+    summaries = write([patient_id])
+    return summaries[0].document if summaries else None
+
+
+def rebuild():
+    """Recreate every summary, e.g. after bulk imports that skip signals."""
+    patient_ids = Patient.objects.order_by('id').values_list('id', flat=True)
+    batch = []
+    written = 0
+    for patient_id in patient_ids.iterator(chunk_size=BATCH_SIZE):
+        batch.append(patient_id)
+        if len(batch) == BATCH_SIZE:
+            written += refresh(batch)
+            batch = []
+    return written + refresh(batch)
@@ -1,9 +1,20 @@
+import csv
+import io
+import json
+from unittest import mock
+
+from asgiref.sync import async_to_sync
 from django.test import TestCase
 from django.urls import reverse
 from rest_framework.test import APITestCase
 from rest_framework import status
 from django.contrib.auth import get_user_model
-from .models import Patient, MedicalRecord
+from rest_framework_simplejwt.tokens import AccessToken
+from . import exports
+from .journal import backfill
+from .models import Patient, MedicalRecord, MedicalRecordChange, PatientSummary
+from .serializers import MedicalRecordSerializer, PatientSerializer
+from .summaries import rebuild
 from users.models import User
 
 User = get_user_model()
@@ -125,3 +136,283 @@ class MedicalRecordTests(APITestCase):
         }
         response = self.client.post(self.records_url, new_record_data, format='json')
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+class PatientListQueryTests(APITestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(
+            username='staff',
+            password='staffpass123',
+            user_type='admin',
+            is_staff=True
+        )
+        self.client.force_authenticate(user=self.staff)
+        self.patient_url = reverse('patient-list')
+
+    def create_patients(self, count, records_each=7):
+        for index in range(count):
+            user = User.objects.create_user(
+                username=f'patient{Patient.objects.count()}',
+                password='patientpass123',
+                first_name='Pat',
+                last_name=str(index),
+                user_type='patient'
+            )
+            patient = Patient.objects.create(user=user, blood_type='O+')
+            for day in range(1, records_each + 1):
+                MedicalRecord.objects.create(
+                    patient=patient,
+                    diagnosis=f'Visit {day}',
+                    date=f'2024-03-{day:02d}'
+                )
+
+    def test_query_count_is_constant(self):
+        self.create_patients(2)
+        with self.assertNumQueries(1):
+            self.client.get(self.patient_url)
+        self.create_patients(6)
+        # One page of materialized summaries
+        with self.assertNumQueries(1):
+            response = self.client.get(self.patient_url)
+        self.assertEqual(len(response.data['results']), 8)
+
+    def test_embeds_latest_five_records(self):
+        self.create_patients(2)
+        response = self.client.get(self.patient_url)
+        for patient in response.data['results']:
+            records = patient['medical_records']
+            self.assertEqual([record['diagnosis'] for record in records],
+                             ['Visit 7', 'Visit 6', 'Visit 5', 'Visit 4', 'Visit 3'])
+            self.assertEqual(records[0]['patient_name'], patient['user']['first_name'] + ' ' + patient['user']['last_name'])
+
+class PatientSummaryTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='patient', password='patientpass123',
+                                             first_name='Pat', last_name='Doe', user_type='patient')
+        self.patient = Patient.objects.create(user=self.user, blood_type='B-', allergies='Penicillin')
+        self.client.force_authenticate(user=self.user)
+
+    def document(self):
+        return self.client.get(reverse('patient-detail', kwargs={'pk': self.patient.pk})).data
+
+    def expected(self):
+        return PatientSerializer(Patient.objects.for_listing().get(pk=self.patient.pk)).data
+
+    def test_follows_patient_user_and_record_writes(self):
+        summary = PatientSummary.objects.get(patient=self.patient)
+        self.assertEqual((summary.full_name, summary.blood_type, summary.has_allergies, summary.last_visit),
+                         ('Pat Doe', 'B-', True, None))
+
+        for day in range(1, 8):
+            MedicalRecord.objects.create(patient=self.patient, diagnosis=f'Visit {day}', date=f'2024-03-{day:02d}')
+        self.user.last_name = 'Smith'
+        self.user.save()
+        MedicalRecord.objects.filter(diagnosis='Visit 7').delete()
+
+        summary.refresh_from_db()
+        self.assertEqual(summary.full_name, 'Pat Smith')
+        self.assertEqual(str(summary.last_visit), '2024-03-06')
+        self.assertEqual(summary.latest_diagnoses, ['Visit 6', 'Visit 5', 'Visit 4', 'Visit 3', 'Visit 2'])
+        self.assertEqual(self.document(), self.expected())
+
+        response = self.client.get(reverse('patient-summary-list'))
+        self.assertEqual(response.data['results'][0]['full_name'], 'Pat Smith')
+
+    def test_last_login_update_does_not_refresh(self):
+        before = PatientSummary.objects.get(patient=self.patient).refreshed_at
+        with self.assertNumQueries(1):
+            self.user.save(update_fields=['last_login'])
+        self.assertEqual(PatientSummary.objects.get(patient=self.patient).refreshed_at, before)
+
+    def test_deleting_patient_removes_summary(self):
+        MedicalRecord.objects.create(patient=self.patient, diagnosis='Flu', date='2024-03-01')
+        self.user.delete()
+        self.assertFalse(PatientSummary.objects.exists())
+
+    def test_rebuild_restores_missing_summaries(self):
+        PatientSummary.objects.all().delete()
+        self.assertEqual(rebuild(), 1)
+        self.assertEqual(self.client.get(reverse('patient-list')).data['results'], [self.expected()])
+
+    def test_missing_summaries_are_built_on_read(self):
+        PatientSummary.objects.all().delete()
+        self.assertEqual(self.client.get(reverse('patient-list')).data['results'], [self.expected()])
+        self.assertTrue(PatientSummary.objects.filter(patient=self.patient).exists())
+        PatientSummary.objects.all().delete()
+        self.assertEqual(self.document(), self.expected())
+        response = self.client.get(reverse('patient-detail', kwargs={'pk': self.patient.pk + 1}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+class AsyncMedicalRecordListTests(APITestCase):
+    def test_matches_sync_output(self):
+        user = User.objects.create_user(
+            username='doctor',
+            password='doctorpass123',
+            first_name='Grace',
+            user_type='doctor'
+        )
+        patient_user = User.objects.create_user(username='patient', password='patientpass123',
+                                                first_name='Pat', last_name='Doe', user_type='patient')
+        patient = Patient.objects.create(user=patient_user, blood_type='O+')
+        for day in range(1, 4):
+            MedicalRecord.objects.create(patient=patient, diagnosis=f'Visit {day}', date=f'2024-03-{day:02d}')
+        token = self.client.post(reverse('token_obtain_pair'), {
+            'username': 'doctor',
+            'password': 'doctorpass123'
+        }, format='json').data['access']
+        headers = {'Authorization': f'Bearer {token}'}
+
+        params = {'page_size': 2, 'include_count': 'true'}
+        expected = self.client.get(reverse('medical-record-list', kwargs={'patient_id': patient.id}),
+                                   params, headers=headers)
+        actual = async_to_sync(self.async_client.get)(
+            reverse('medical-record-list-async', kwargs={'patient_id': patient.id}), params, headers=headers
+        )
+        self.assertEqual(actual.status_code, status.HTTP_200_OK)
+        self.assertEqual(actual.content.replace(b'/async/', b'/'), expected.content)
+        self.assertEqual(actual.json()['results'][0]['patient_name'], 'Pat Doe')
+
+        params = {'fields': 'id,diagnosis'}
+        expected = self.client.get(reverse('medical-record-list', kwargs={'patient_id': patient.id}),
+                                   params, headers=headers)
+        actual = async_to_sync(self.async_client.get)(
+            reverse('medical-record-list-async', kwargs={'patient_id': patient.id}), params, headers=headers
+        )
+        self.assertEqual(actual.content.replace(b'/async/', b'/'), expected.content)
+        self.assertEqual(set(actual.json()['results'][0]), {'id', 'diagnosis'})
+
+class MedicalRecordExportTests(APITestCase):
+    def setUp(self):
+        self.doctor = User.objects.create_user(username='doctor', password='doctorpass123', user_type='doctor')
+        self.patients = []
+        for number in range(3):
+            patient_user = User.objects.create_user(username=f'patient{number}', password='patientpass123',
+                                                    first_name='Pat', last_name=f'Doe{number}', user_type='patient')
+            patient = Patient.objects.create(user=patient_user, blood_type='O+')
+            for day in range(1, 6):
+                MedicalRecord.objects.create(patient=patient, diagnosis=f'Visit {day}, "routine"',
+                                             date=f'2024-03-{day:02d}')
+            self.patients.append(patient)
+        self.url = reverse('medical-record-export')
+
+    def export(self, params):
+        self.client.force_authenticate(user=self.doctor)
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_ndjson_matches_record_serializer(self):
+        cohort = f'{self.patients[0].id},{self.patients[2].id}'
+        with self.assertNumQueries(1):
+            lines = self.export({'patient': cohort}).splitlines()
+        self.assertEqual(len(lines), 10)
+        first = json.loads(lines[0])
+        self.assertEqual(first['patient'], self.patients[0].id)
+        self.assertEqual(first['patient_name'], 'Pat Doe0')
+        self.assertEqual(first['diagnosis'], 'Visit 1, "routine"')
+        self.assertEqual(json.loads(lines[-1])['patient'], self.patients[2].id)
+
+    def test_csv_with_date_range(self):
+        content = self.export({'output': 'csv', 'date_from': '2024-03-02', 'date_to': '2024-03-03'})
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[0]['diagnosis'], 'Visit 2, "routine"')
+        self.assertEqual(rows[0]['patient_name'], 'Pat Doe0')
+
+    def test_asgi_export_is_streamed_block_by_block(self):
+        token = str(AccessToken.for_user(self.doctor))
+        rendered = mock.patch.object(MedicalRecordSerializer, 'to_representation', autospec=True,
+                                     side_effect=MedicalRecordSerializer.to_representation)
+
+        async def first_block():
+            response = await self.async_client.get(self.url, headers={'Authorization': f'Bearer {token}'})
+            self.assertTrue(response.is_async)
+            content = aiter(response.streaming_content)
+            block = await anext(content)
+            await content.aclose()
+            return block
+
+        with mock.patch.object(exports, 'BLOCK_SIZE', 1), rendered as to_representation:
+            block = async_to_sync(first_block)()
+        # Only the first record was rendered before the first block went out
+        self.assertEqual(to_representation.call_count, 1)
+        self.assertEqual(json.loads(block)['patient'], self.patients[0].id)
+
+    def test_patients_cannot_export(self):
+        self.client.force_authenticate(user=self.patients[0].user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_invalid_cohort(self):
+        self.client.force_authenticate(user=self.doctor)
+        response = self.client.get(self.url, {'patient': '1,x'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        # An empty cohort is an error, not an export of every patient
+        response = self.client.get(self.url, {'patient': ','})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+class MedicalRecordChangesTests(APITestCase):
+    def setUp(self):
+        self.doctor = User.objects.create_user(username='doctor', password='doctorpass123', user_type='doctor')
+        patient_user = User.objects.create_user(username='patient', password='patientpass123',
+                                                first_name='Pat', last_name='Doe', user_type='patient')
+        self.patient = Patient.objects.create(user=patient_user, blood_type='O+')
+        self.first = MedicalRecord.objects.create(patient=self.patient, diagnosis='Cold', date='2024-03-01')
+        self.second = MedicalRecord.objects.create(patient=self.patient, diagnosis='Flu', date='2024-03-02')
+        self.client.force_authenticate(user=self.doctor)
+        self.url = reverse('medical-record-changes', kwargs={'patient_id': self.patient.pk})
+
+    def sync(self, since, **params):
+        response = self.client.get(self.url, {'since': since, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_full_sync_from_zero(self):
+        with self.assertNumQueries(2):
+            data = self.sync(0)
+        self.assertEqual([change['record_id'] for change in data['changes']], [self.first.id, self.second.id])
+        self.assertEqual(data['changes'][0]['action'], 'created')
+        self.assertEqual(data['changes'][0]['record']['patient_name'], 'Pat Doe')
+        self.assertFalse(data['has_more'])
+
+    def test_only_changes_after_since_are_returned(self):
+        since = self.sync(0)['next_since']
+        self.assertEqual(self.sync(since)['changes'], [])
+
+        deleted_id = self.second.id
+        self.first.diagnosis = 'Bronchitis'
+        self.first.save()
+        self.second.delete()
+        data = self.sync(since)
+        self.assertEqual([(change['record_id'], change['action']) for change in data['changes']],
+                         [(self.first.id, 'updated'), (deleted_id, 'deleted')])
+        self.assertEqual(data['changes'][0]['record']['diagnosis'], 'Bronchitis')
+        self.assertIsNone(data['changes'][1]['record'])
+        self.assertGreater(data['next_since'], since)
+
+    def test_changes_to_one_record_collapse_to_the_latest(self):
+        since = self.sync(0)['next_since']
+        deleted_id = self.first.id
+        self.first.save()
+        self.first.delete()
+        data = self.sync(since)
+        self.assertEqual([(change['record_id'], change['action']) for change in data['changes']],
+                         [(deleted_id, 'deleted')])
+
+    def test_pages_with_limit(self):
+        data = self.sync(0, limit=1)
+        self.assertTrue(data['has_more'])
+        self.assertEqual(len(data['changes']), 1)
+        data = self.sync(data['next_since'], limit=1)
+        self.assertEqual(data['changes'][0]['record_id'], self.second.id)
+        self.assertFalse(data['has_more'])
+
+    def test_invalid_since(self):
+        response = self.client.get(self.url, {'since': -1})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_backfill_journals_bulk_created_records(self):
+        MedicalRecord.objects.bulk_create([MedicalRecord(patient=self.patient, diagnosis='Imported', date='2024-01-01')])
+        self.assertEqual(backfill(), 1)
+        self.assertEqual(backfill(), 0)
+        self.assertEqual(MedicalRecordChange.objects.filter(patient=self.patient).count(), 3)
@@ -2,16 +2,26 @@ from django.urls import path
 from .views import (
     PatientListView,
     PatientDetailView,
+    PatientSummaryListView,
     MedicalRecordListView,
     MedicalRecordDetailView,
+    MedicalRecordExportView,
+    MedicalRecordChangesView,
+    AsyncMedicalRecordListView,
 )
 
 urlpatterns = [
     # Patient endpoints
     path('', PatientListView.as_view(), name='patient-list'),
     path('<int:pk>/', PatientDetailView.as_view(), name='patient-detail'),
+    path('summaries/', PatientSummaryListView.as_view(), name='patient-summary-list'),
     
     # Medical records endpoints
     path('<int:patient_id>/records/', MedicalRecordListView.as_view(), name='medical-record-list'),
     path('<int:patient_id>/records/<int:pk>/', MedicalRecordDetailView.as_view(), name='medical-record-detail'),
+    path('<int:patient_id>/records/changes/', MedicalRecordChangesView.as_view(), name='medical-record-changes'),
+    path('records/export/', MedicalRecordExportView.as_view(), name='medical-record-export'),
+
+    # Async read endpoint for ASGI deployments
+    path('async/<int:patient_id>/records/', AsyncMedicalRecordListView.as_view(), name='medical-record-list-async'),
 ] 
\ No newline at end of file
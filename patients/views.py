@@ -1,32 +1,81 @@
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import render
 from rest_framework import generics, permissions, status
+from rest_framework.exceptions import PermissionDenied
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from django.shortcuts import get_object_or_404
-from .models import Patient, MedicalRecord
-from .serializers import PatientSerializer, MedicalRecordSerializer
+from healthcaresystem.async_views import AsyncReadAPIView
+from healthcaresystem.fastlist import FastListMixin
+from healthcaresystem.fieldsets import SparseFieldsetViewMixin
+from healthcaresystem.pagination import KeysetPagination
+from search.filters import IndexedSearchFilter
+from .models import Patient, MedicalRecord, PatientSummary
+from .serializers import (
+    PatientSerializer,
+    PatientDocumentSerializer,
+    PatientSummarySerializer,
+    MedicalRecordSerializer,
+    MedicalRecordExportQuerySerializer,
+    MedicalRecordChangesQuerySerializer,
+)
+from . import exports, journal, summaries
 
 # Create your views here.
 
-class PatientListView(generics.ListCreateAPIView):
-    queryset = Patient.objects.all()
+class PatientListView(FastListMixin, SparseFieldsetViewMixin, generics.ListCreateAPIView):
+    queryset = Patient.objects.for_listing()
     serializer_class = PatientSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+    filter_backends = [IndexedSearchFilter]
+    search_index = 'patient'
     filterset_fields = ['blood_type']
     search_fields = ['user__first_name', 'user__last_name', 'insurance_policy_number']
     ordering_fields = ['created_at']
 
-class PatientDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Patient.objects.all()
+    def get_queryset(self):
+        # Reads are served from the materialized summaries, joined on the patient's primary key
+        if self.request.method in permissions.SAFE_METHODS:
+            return Patient.objects.select_related('summary')
+        return super().get_queryset()
+
+    def get_serializer_class(self):
+        if self.request.method in permissions.SAFE_METHODS:
+            return PatientDocumentSerializer
+        return PatientSerializer
+
+class PatientDetailView(SparseFieldsetViewMixin, generics.RetrieveUpdateDestroyAPIView):
+    queryset = Patient.objects.for_listing()
     serializer_class = PatientSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-class MedicalRecordListView(generics.ListCreateAPIView):
+    def retrieve(self, request, *args, **kwargs):
+        stored = summaries.document(kwargs['pk'])
+        if stored is None:
+            raise Http404
+        serializer = PatientDocumentSerializer(context=self.get_serializer_context())
+        return Response(serializer.render_row({'id': kwargs['pk'], 'summary__document': stored}))
+
+class PatientSummaryListView(generics.ListAPIView):
+    """Compact patient rows (name, blood type, flags, latest visit) for pickers and dashboards."""
+    queryset = PatientSummary.objects.all()
+    serializer_class = PatientSummarySerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+    filter_backends = [IndexedSearchFilter]
+    search_index = 'patient'
+
+class MedicalRecordListView(SparseFieldsetViewMixin, generics.ListCreateAPIView):
     serializer_class = MedicalRecordSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         patient_id = self.kwargs.get('patient_id')
-        return MedicalRecord.objects.filter(patient_id=patient_id)
+        # patient_name reads record.patient.user
+        return MedicalRecord.objects.filter(patient_id=patient_id).select_related('patient__user')
 
     def perform_create(self, serializer):
         patient_id = self.kwargs.get('patient_id')
@@ -48,4 +97,56 @@ class MedicalRecordDetailView(generics.RetrieveUpdateDestroyAPIView):
             MedicalRecord,
             patient_id=patient_id,
             id=record_id
-        )
\ No newline at end of file
+        )
+
+class MedicalRecordExportView(APIView):
+    """Stream medical records as NDJSON or CSV, optionally for a cohort of patients and a date range."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        if not request.user.is_staff and request.user.user_type != 'doctor':
+            raise PermissionDenied("Only doctors and staff can export medical records")
+        params = MedicalRecordExportQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        filters = params.validated_data
+        output = filters['output']
+
+        records = exports.export_queryset(
+            patient_ids=filters.get('patient'),
+            date_from=filters.get('date_from'),
+            date_to=filters.get('date_to'),
+        )
+        # Under ASGI a sync iterator would be buffered whole before the first byte is sent
+        stream = exports.astream if isinstance(request._request, ASGIRequest) else exports.stream
+        response = StreamingHttpResponse(stream(records, output), content_type=exports.FORMATS[output])
+        response['Content-Disposition'] = f'attachment; filename="medical-records.{output}"'
+        return response
+
+class MedicalRecordChangesView(APIView):
+    """Changes to a patient's medical records after ``?since=<seq>``, for incremental sync."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, patient_id):
+        params = MedicalRecordChangesQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        return Response(journal.changes(
+            patient_id,
+            since=params.validated_data['since'],
+            limit=params.validated_data['limit'],
+            context={'request': request},
+        ))
+
+# Async version of the records list, for the ASGI request path
+
+class AsyncMedicalRecordListView(SparseFieldsetViewMixin, AsyncReadAPIView):
+    serializer_class = MedicalRecordSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    async def get(self, request, patient_id):
+        queryset = self.filter_queryset(
+            MedicalRecord.objects.filter(patient_id=patient_id).select_related('patient__user')
+        )
+        paginator = KeysetPagination()
+        records = await paginator.apaginate_queryset(queryset, request, self)
+        data = self.get_serializer(records, many=True).data
+        return paginator.get_paginated_response(data).data
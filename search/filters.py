@@ -0,0 +1,58 @@
+from django.db.models import Case, IntegerField, Value, When
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import SearchFilter
+
+from healthcaresystem.pagination import KeysetPagination
+from .index import search
+
+
+class IndexedSearchFilter(SearchFilter):
+    """
+    SearchFilter answered from the token index for views that set ``search_index``.
+
+    Matches are ranked and annotated with ``search_rank`` so KeysetPagination
+    pages them in rank order. Each request reads the ``max_results`` matches
+    that follow the page cursor, so paging walks the whole ranking. Filters
+    applied before this one are pushed into the ranking query, so they never
+    thin out a block of matches. Views without ``search_index`` fall back to
+    the regular ``icontains`` search.
+    """
+    max_results = 200
+
+    def filter_queryset(self, request, queryset, view):
+        return self.rank(request, queryset, view, cursor=KeysetPagination().decode_cursor(request))
+
+    def matches(self, request, queryset, view):
+        """The best ``max_results`` matches, wherever the page cursor is."""
+        return self.rank(request, queryset, view, cursor=None)
+
+    def rank(self, request, queryset, view, cursor):
+        kind = getattr(view, 'search_index', None)
+        terms = self.get_search_terms(request)
+        if kind is None or not terms:
+            return super().filter_queryset(request, queryset, view)
+
+        bounds = {}
+        if cursor is not None:
+            key, tie, reverse = cursor
+            try:
+                position = (int(key), tie)
+            except ValueError:
+                raise NotFound(KeysetPagination.invalid_cursor_message)
+            bounds['before' if reverse else 'after'] = position
+        if queryset.query.has_filters():
+            bounds['within'] = queryset
+        ranked = search(kind, ' '.join(terms), limit=self.max_results, **bounds)
+        if not ranked:
+            return queryset.none()
+        return queryset.filter(pk__in=[object_id for object_id, _ in ranked]).annotate(
+            search_rank=Case(
+                *[When(pk=object_id, then=Value(score)) for object_id, score in ranked],
+                output_field=IntegerField()
+            )
+        )
+
+    def get_keyset_ordering(self, request, queryset, view):
+        if 'search_rank' in queryset.query.annotations:
+            return ('-search_rank', '-pk')
+        return None
@@ -0,0 +1,144 @@
+"""
+Inverted index behind the doctor and patient search boxes.
+
+Searchable fields are split into lowercase, accent-free words and stored as
+SearchToken rows. A query word matches every stored word it is a prefix of,
+which is a range scan on the (kind, term) index instead of an ``icontains``
+scan over joined tables. Results must match every query word and are ranked
+by the summed weight of the matching fields, doubled for whole-word matches.
+"""
+import re
+import unicodedata
+from functools import reduce
+from operator import or_
+
+from django.db.models import Case, F, IntegerField, Max, Q, Sum, When
+
+from doctors.models import Doctor
+from patients.models import Patient
+from .models import SearchToken
+
+TERM_LENGTH = SearchToken._meta.get_field('term').max_length
+MAX_QUERY_TERMS = 8
+BATCH_SIZE = 2000
+
+MODELS = {
+    'doctor': Doctor,
+    'patient': Patient,
+}
+
+# Field weights, mirroring the search_fields of the list views
+FIELDS = {
+    'doctor': {'user__first_name': 3, 'user__last_name': 3, 'license_number': 2},
+    'patient': {'user__first_name': 3, 'user__last_name': 3, 'insurance_policy_number': 2},
+}
+
+WORD = re.compile(r'\w+')
+
+
+def tokenize(text):
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return [word[:TERM_LENGTH] for word in WORD.findall(text.lower())]
+
+
+def document_terms(values, fields):
+    """Return {term: weight} for one row of ``values()``, keeping the best weight per term."""
+    terms = {}
+    for field, weight in fields.items():
+        for term in tokenize(values[field]):
+            terms[term] = max(terms.get(term, 0), weight)
+    return terms
+
+
+def tokens_for(kind, rows):
+    return [
+        SearchToken(kind=kind, object_id=row['id'], term=term, weight=weight)
+        for row in rows
+        for term, weight in document_terms(row, FIELDS[kind]).items()
+    ]
+
+
+def reindex(kind, ids):
+    """Bring the tokens of the given objects up to date, writing only what changed."""
+    ids = list(ids)
+    if not ids:
+        return
+    rows = MODELS[kind].objects.filter(id__in=ids).values('id', *FIELDS[kind])
+    wanted = {(token.object_id, token.term, token.weight) for token in tokens_for(kind, rows)}
+    existing = set(SearchToken.objects.filter(kind=kind, object_id__in=ids)
+                   .values_list('object_id', 'term', 'weight'))
+    changed = {object_id for object_id, _, _ in wanted ^ existing}
+    if not changed:
+        return
+    SearchToken.objects.filter(kind=kind, object_id__in=changed).delete()
+    SearchToken.objects.bulk_create([
+        SearchToken(kind=kind, object_id=object_id, term=term, weight=weight)
+        for object_id, term, weight in wanted
+        if object_id in changed
+    ], batch_size=BATCH_SIZE)
+
+
+def rebuild(kinds=None):
+    """Recreate the index from scratch, e.g. after bulk imports that skip signals."""
+    counts = {}
+    for kind in kinds or MODELS:
+        SearchToken.objects.filter(kind=kind).delete()
+        rows = MODELS[kind].objects.order_by('id').values('id', *FIELDS[kind])
+        batch = []
+        counts[kind] = 0
+        for row in rows.iterator(chunk_size=BATCH_SIZE):
+            batch.append(row)
+            if len(batch) == BATCH_SIZE:
+                counts[kind] += len(SearchToken.objects.bulk_create(tokens_for(kind, batch)))
+                batch = []
+        counts[kind] += len(SearchToken.objects.bulk_create(tokens_for(kind, batch)))
+    return counts
+
+
+def prefix_range(term):
+    # Everything that starts with ``term`` sorts between it and its successor
+    return Q(term__gte=term, term__lt=term[:-1] + chr(ord(term[-1]) + 1))
+
+
+def search(kind, query, limit=200, after=None, before=None, within=None):
+    """
+    Return [(object_id, score)] for objects matching every word of ``query``, best first.
+
+    Matches rank by score, then by id descending. ``after`` or ``before`` is a
+    (score, object_id) pair; only matches ranked after it, or the ``limit``
+    matches just before it, are returned. ``within`` is a queryset the matches
+    must belong to, applied as a subquery before the limit.
+    """
+    terms = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+    if not terms:
+        return []
+    ranges = [prefix_range(term) for term in terms]
+    matched = {f'matched_{index}': Max(Case(When(condition, then=1), default=0))
+               for index, condition in enumerate(ranges)}
+    rows = (
+        SearchToken.objects
+        .filter(kind=kind)
+        .filter(reduce(or_, ranges))
+        .values('object_id')
+        .annotate(
+            score=Sum(Case(
+                When(term__in=terms, then=F('weight') * 2),
+                default=F('weight'),
+                output_field=IntegerField()
+            )),
+            **matched
+        )
+        .filter(**{name: 1 for name in matched})
+        .values_list('object_id', 'score')
+    )
+    if within is not None:
+        rows = rows.filter(object_id__in=within.values('pk'))
+    if after is not None:
+        score, object_id = after
+        rows = rows.filter(Q(score__lt=score) | Q(score=score, object_id__lt=object_id))
+    elif before is not None:
+        score, object_id = before
+        rows = rows.filter(Q(score__gt=score) | Q(score=score, object_id__gt=object_id))
+        return list(rows.order_by('score', 'object_id')[:limit])[::-1]
+    return list(rows.order_by('-score', '-object_id')[:limit])
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from search.index import MODELS, rebuild
+
+
+class Command(BaseCommand):
+    help = "Rebuild the doctor and patient search index from the current data"
+
+    def add_arguments(self, parser):
+        parser.add_argument('kinds', nargs='*', choices=list(MODELS), help='Only rebuild these kinds')
+
+    def handle(self, *args, **options):
+        counts = rebuild(options['kinds'] or None)
+        for kind, tokens in counts.items():
+            self.stdout.write(f"Indexed {tokens} {kind} tokens")
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.10 on 2026-10-18 10:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('doctor', 'Doctor'), ('patient', 'Patient')], max_length=10)),
+                ('object_id', models.PositiveIntegerField()),
+                ('term', models.CharField(max_length=64)),
+                ('weight', models.PositiveSmallIntegerField(default=1)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'term'], name='search_kind_term_idx'), models.Index(fields=['kind', 'object_id'], name='search_kind_object_idx')],
+            },
+        ),
+    ]
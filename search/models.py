@@ -0,0 +1,58 @@
+from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from doctors.models import Doctor
+from patients.models import Patient
+from users.models import User
+
+class SearchToken(models.Model):
+    """One normalized word of a searchable doctor or patient, with its field weight."""
+    KIND_CHOICES = (
+        ('doctor', 'Doctor'),
+        ('patient', 'Patient'),
+    )
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.PositiveIntegerField()
+    term = models.CharField(max_length=64)
+    weight = models.PositiveSmallIntegerField(default=1)
+
+    class Meta:
+        indexes = [
+            # Prefix lookups are range scans on (kind, term)
+            models.Index(fields=['kind', 'term'], name='search_kind_term_idx'),
+            models.Index(fields=['kind', 'object_id'], name='search_kind_object_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id}: {self.term}"
+
+@receiver(post_save, sender=Doctor)
+def index_doctor(sender, instance, **kwargs):
+    from .index import reindex
+    reindex('doctor', [instance.id])
+
+@receiver(post_save, sender=Patient)
+def index_patient(sender, instance, **kwargs):
+    from .index import reindex
+    reindex('patient', [instance.id])
+
+@receiver(post_save, sender=User)
+def index_user_profiles(sender, instance, created, update_fields=None, **kwargs):
+    # New users have no profile yet, and e.g. last_login updates touch no searchable field
+    if created or (update_fields and not {'first_name', 'last_name'} & set(update_fields)):
+        return
+    from .index import reindex
+    # Only the profile matching the user's type is searchable
+    if instance.user_type == 'doctor':
+        reindex('doctor', Doctor.objects.filter(user_id=instance.id).values_list('id', flat=True))
+    elif instance.user_type == 'patient':
+        reindex('patient', Patient.objects.filter(user_id=instance.id).values_list('id', flat=True))
+
+@receiver(post_delete, sender=Doctor)
+def unindex_doctor(sender, instance, **kwargs):
+    SearchToken.objects.filter(kind='doctor', object_id=instance.id).delete()
+
+@receiver(post_delete, sender=Patient)
+def unindex_patient(sender, instance, **kwargs):
+    SearchToken.objects.filter(kind='patient', object_id=instance.id).delete()
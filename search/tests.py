@@ -0,0 +1,121 @@
+from unittest import mock
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from doctors.models import Doctor, Specialization
+from patients.models import Patient
+from users.models import User
+from .filters import IndexedSearchFilter
+from .index import rebuild, search, tokenize
+from .models import SearchToken
+
+def create_doctor(first_name, last_name, license_number):
+    user = User.objects.create_user(
+        username=license_number.lower(),
+        password='doctorpass123',
+        first_name=first_name,
+        last_name=last_name,
+        user_type='doctor'
+    )
+    return Doctor.objects.create(
+        user=user,
+        specialization=Specialization.objects.get_or_create(name='Cardiology')[0],
+        license_number=license_number,
+        consultation_fee=100.00
+    )
+
+class TokenizeTests(TestCase):
+    def test_lowercases_and_strips_accents(self):
+        self.assertEqual(tokenize('José  Núñez-Otieno'), ['jose', 'nunez', 'otieno'])
+
+    def test_empty_text(self):
+        self.assertEqual(tokenize(None), [])
+
+class SearchIndexTests(TestCase):
+    def setUp(self):
+        self.amina = create_doctor('Amina', 'Otieno', 'LIC-001')
+        self.aminata = create_doctor('Aminata', 'Smith', 'LIC-002')
+        self.brian = create_doctor('Brian', 'Amin', 'LIC-003')
+
+    def ids(self, query):
+        return [object_id for object_id, _ in search('doctor', query)]
+
+    def test_prefix_matches_every_word(self):
+        self.assertEqual(self.ids('ami oti'), [self.amina.id])
+        self.assertEqual(set(self.ids('ami')), {self.amina.id, self.aminata.id, self.brian.id})
+
+    def test_whole_word_matches_rank_first(self):
+        self.assertEqual(self.ids('amin')[0], self.brian.id)
+        self.assertEqual(self.ids('amina')[0], self.amina.id)
+
+    def test_renaming_the_user_updates_the_index(self):
+        user = self.brian.user
+        user.last_name = 'Kamau'
+        user.save()
+        self.assertNotIn(self.brian.id, self.ids('amin'))
+        self.assertEqual(self.ids('kamau'), [self.brian.id])
+
+    def test_login_does_not_touch_the_index(self):
+        with self.assertNumQueries(1):
+            self.brian.user.save(update_fields=['last_login'])
+
+    def test_deleted_doctors_are_removed(self):
+        self.amina.delete()
+        self.assertFalse(SearchToken.objects.filter(kind='doctor', object_id=self.amina.id).exists())
+
+    def test_rebuild_restores_the_index(self):
+        SearchToken.objects.all().delete()
+        rebuild()
+        self.assertEqual(self.ids('lic 002'), [self.aminata.id])
+
+class SearchEndpointTests(APITestCase):
+    def setUp(self):
+        self.viewer = User.objects.create_user(username='viewer', password='viewerpass123', user_type='patient')
+        self.client.force_authenticate(user=self.viewer)
+        self.amina = create_doctor('Amina', 'Otieno', 'LIC-001')
+        self.brian = create_doctor('Brian', 'Amin', 'LIC-003')
+        for index in range(3):
+            create_doctor('Other', f'Doctor{index}', f'LIC-10{index}')
+
+    def test_doctor_search_is_ranked_and_paginated(self):
+        response = self.client.get(reverse('doctor-list'), {'search': 'amin', 'page_size': 1})
+        self.assertEqual([doctor['id'] for doctor in response.data['results']], [self.brian.id])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([doctor['id'] for doctor in response.data['results']], [self.amina.id])
+        self.assertIsNone(response.data['next'])
+
+    def test_paging_walks_past_max_results(self):
+        with mock.patch.object(IndexedSearchFilter, 'max_results', 2):
+            url, pages = reverse('doctor-list') + '?search=other&page_size=1', []
+            while url:
+                response = self.client.get(url)
+                pages.append([doctor['id'] for doctor in response.data['results']])
+                url = response.data['next']
+            others = sorted(Doctor.objects.filter(user__first_name='Other').values_list('id', flat=True), reverse=True)
+            self.assertEqual(pages, [[doctor_id] for doctor_id in others])
+            response = self.client.get(response.data['previous'])
+            self.assertEqual([doctor['id'] for doctor in response.data['results']], [others[1]])
+
+    def test_paging_a_search_within_a_facet_filter(self):
+        cardiology = Specialization.objects.get(name='Cardiology')
+        dermatology = Specialization.objects.create(name='Dermatology')
+        smiths = [create_doctor('Jo', 'Smith', f'LIC-20{index}') for index in range(10)]
+        Doctor.objects.filter(id__in=[doctor.id for doctor in smiths[3:]]).update(specialization=dermatology)
+        with mock.patch.object(IndexedSearchFilter, 'max_results', 2):
+            url, found = reverse('doctor-list') + f'?search=smith&specialization={cardiology.id}&page_size=1', []
+            while url:
+                response = self.client.get(url)
+                found += [doctor['id'] for doctor in response.data['results']]
+                url = response.data['next']
+        self.assertEqual(found, [doctor.id for doctor in reversed(smiths[:3])])
+
+    def test_no_matches(self):
+        response = self.client.get(reverse('doctor-list'), {'search': 'zzz'})
+        self.assertEqual(response.data['results'], [])
+
+    def test_patient_search(self):
+        user = User.objects.create_user(username='pat', password='patientpass123',
+                                        first_name='Hana', last_name='Sato', user_type='patient')
+        patient = Patient.objects.create(user=user, blood_type='O+', insurance_policy_number='POL777')
+        response = self.client.get(reverse('patient-list'), {'search': 'pol77'})
+        self.assertEqual([row['id'] for row in response.data['results']], [patient.id])
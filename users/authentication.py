@@ -0,0 +1,116 @@
+"""
+JWT authentication that trusts signed claims instead of loading the user row.
+
+Tokens issued by ``HealthcareTokenObtainPairSerializer`` carry ``user_type``,
+``is_staff`` and a fingerprint of the password hash. Requests authenticate as a
+``TokenUser`` built from those claims. The only database access is a status
+check per user (active flag, role and fingerprint), memoized in a small
+in-process LRU for ``JWT_STATUS_CACHE_TTL`` seconds. Deactivating a user,
+changing their role or password therefore revokes outstanding tokens within
+one TTL, and immediately in the process that made the change. Token refreshes
+read the same cache.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils.crypto import salted_hmac
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import User
+
+# Claims added to every token on top of simplejwt's defaults
+FAST_PATH_CLAIMS = ('user_type', 'is_staff', 'pwd')
+
+
+def password_fingerprint(password_hash):
+    return salted_hmac('users.authentication.password', password_hash or '').hexdigest()[:16]
+
+
+def user_status(is_active, is_staff, user_type, password_hash):
+    return is_active, is_staff, user_type, password_fingerprint(password_hash)
+
+
+def add_claims(token, user):
+    token['username'] = user.username
+    token['user_type'] = user.user_type
+    token['is_staff'] = user.is_staff
+    token['pwd'] = password_fingerprint(user.password)
+    return token
+
+
+class UserStatusCache:
+    """Thread-safe LRU of {user_id: (is_active, is_staff, user_type, fingerprint)} with a TTL."""
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def max_size(self):
+        return getattr(settings, 'JWT_STATUS_CACHE_SIZE', 1024)
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'JWT_STATUS_CACHE_TTL', 30)
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                return entry[1]
+        status = self.load(user_id)
+        with self._lock:
+            self._entries[user_id] = (now + self.ttl, status)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return status
+
+    def load(self, user_id):
+        row = User.objects.filter(pk=user_id).values_list(
+            'is_active', 'is_staff', 'user_type', 'password'
+        ).first()
+        return None if row is None else user_status(*row)
+
+    def discard(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def discard_changed(self, user_id, status):
+        """Drop the entry of ``user_id`` unless it still matches ``status``."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[1] != status:
+                del self._entries[user_id]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_status_cache = UserStatusCache()
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        if not all(claim in validated_token for claim in FAST_PATH_CLAIMS):
+            # Tokens issued before the fast path existed
+            return super().get_user(validated_token)
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise AuthenticationFailed("Token contained no recognizable user identification", code='token_not_valid')
+
+        status = user_status_cache.get(user_id)
+        if status is None or not status[0]:
+            raise AuthenticationFailed("User not found or inactive", code='user_inactive')
+        if status[1:] != (validated_token['is_staff'], validated_token['user_type'], validated_token['pwd']):
+            raise AuthenticationFailed("Token has been revoked", code='token_revoked')
+        return TokenUser(validated_token)
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.10 on 2026-10-18 11:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_user_user_created_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['user_type', 'created_at', 'id'], name='user_type_created_id_idx'),
+        ),
+    ]
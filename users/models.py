@@ -1,5 +1,7 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 
 class User(AbstractUser):
     USER_TYPE_CHOICES = (
@@ -18,6 +20,24 @@ class User(AbstractUser):
     class Meta:
         verbose_name = 'User'
         verbose_name_plural = 'Users'
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='user_created_id_idx'),
+            models.Index(fields=['user_type', 'created_at', 'id'], name='user_type_created_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.get_full_name()} ({self.user_type})"
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, **kwargs):
+    # Re-check tokens of this user against the database on their next request,
+    # unless the save left their status as it was (e.g. a profile edit)
+    from .authentication import user_status, user_status_cache
+    user_status_cache.discard_changed(instance.pk, user_status(
+        instance.is_active, instance.is_staff, instance.user_type, instance.password
+    ))
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    from .authentication import user_status_cache
+    user_status_cache.discard(instance.pk)
@@ -1 +1,77 @@
- 
\ No newline at end of file
+from rest_framework import serializers
+from django.contrib.auth import get_user_model
+from django.contrib.auth.password_validation import validate_password
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from healthcaresystem.fieldsets import SparseFieldsetMixin
+from .authentication import FAST_PATH_CLAIMS, add_claims, password_fingerprint, user_status_cache
+
+User = get_user_model()
+
+class UserSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    class Meta:
+        model = User
+        fields = ('id', 'username', 'email', 'first_name', 'last_name', 'user_type',
+                 'phone_number', 'address', 'date_of_birth', 'created_at', 'updated_at')
+        read_only_fields = ('id', 'user_type', 'created_at', 'updated_at')
+
+class UserRegistrationSerializer(serializers.ModelSerializer):
+    password = serializers.CharField(write_only=True, validators=[validate_password])
+    password2 = serializers.CharField(write_only=True)
+
+    class Meta:
+        model = User
+        fields = ('id', 'username', 'email', 'password', 'password2', 'first_name',
+                 'last_name', 'user_type', 'phone_number', 'address', 'date_of_birth')
+        read_only_fields = ('id',)
+
+    def validate(self, attrs):
+        if attrs['password'] != attrs['password2']:
+            raise serializers.ValidationError({"password": "Password fields didn't match"})
+        return attrs
+
+    def create(self, validated_data):
+        validated_data.pop('password2')
+        password = validated_data.pop('password')
+        return User.objects.create_user(password=password, **validated_data)
+
+class UserProfileUpdateSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = User
+        fields = ('first_name', 'last_name', 'email', 'phone_number', 'address', 'date_of_birth')
+
+class HealthcareTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Adds the claims ClaimsJWTAuthentication needs to skip the user lookup."""
+
+    @classmethod
+    def get_token(cls, user):
+        return add_claims(super().get_token(user), user)
+
+class HealthcareTokenRefreshSerializer(TokenRefreshSerializer):
+    """Issues access tokens with the user's current claims, refusing revoked refresh tokens."""
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        if all(claim in refresh for claim in FAST_PATH_CLAIMS):
+            return {'access': str(self.refresh_claims(refresh))}
+        # Tokens issued before the fast path existed
+        user = User.objects.filter(pk=refresh.get(api_settings.USER_ID_CLAIM)).first()
+        if user is None or not user.is_active:
+            raise AuthenticationFailed("User not found or inactive", code='user_inactive')
+        if 'pwd' in refresh and refresh['pwd'] != password_fingerprint(user.password):
+            raise AuthenticationFailed("Token has been revoked", code='token_revoked')
+        return {'access': str(add_claims(refresh.access_token, user))}
+
+    def refresh_claims(self, refresh):
+        # Served from the status cache that authenticates requests, so a refresh costs no query
+        status = user_status_cache.get(refresh[api_settings.USER_ID_CLAIM])
+        if status is None or not status[0]:
+            raise AuthenticationFailed("User not found or inactive", code='user_inactive')
+        is_staff, user_type, fingerprint = status[1:]
+        if refresh['pwd'] != fingerprint:
+            raise AuthenticationFailed("Token has been revoked", code='token_revoked')
+        access = refresh.access_token
+        access['is_staff'] = is_staff
+        access['user_type'] = user_type
+        return access
@@ -3,6 +3,10 @@ from django.urls import reverse
 from rest_framework.test import APITestCase
 from rest_framework import status
 from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from .authentication import user_status_cache
 from .models import User
 
 User = get_user_model()
@@ -95,3 +99,142 @@ class UserProfileTests(APITestCase):
         self.assertEqual(self.user.first_name, 'Updated')
         self.assertEqual(self.user.last_name, 'Name')
         self.assertEqual(self.user.phone_number, '9876543210')
+
+    def test_updating_an_admin_profile_skips_patient_and_doctor_work(self):
+        admin = User.objects.create_user(username='admin', password='adminpass123', user_type='admin')
+        self.client.force_authenticate(user=admin)
+        # The profile read and its update; no summary, doctor cache or search index lookups
+        with self.assertNumQueries(2):
+            response = self.client.patch(self.update_url, {'phone_number': '0711111111'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+class UserListPaginationTests(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            username='admin',
+            password='adminpass123',
+            user_type='admin',
+            is_staff=True
+        )
+        for index in range(6):
+            User.objects.create_user(username=f'user{index}', password='userpass123', user_type='patient')
+        # Several users share a timestamp so the id has to break ties
+        User.objects.filter(username__in=['user1', 'user2', 'user3']).update(created_at=self.admin.created_at)
+        self.client.force_authenticate(user=self.admin)
+        self.list_url = reverse('user-list')
+
+    def expected_order(self):
+        return list(User.objects.order_by('-created_at', '-id').values_list('username', flat=True))
+
+    def usernames(self, response):
+        return [user['username'] for user in response.data['results']]
+
+    def test_walks_every_row_exactly_once(self):
+        seen = []
+        response = self.client.get(self.list_url, {'page_size': 3})
+        self.assertIsNone(response.data['previous'])
+        seen += self.usernames(response)
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            seen += self.usernames(response)
+        self.assertEqual(seen, self.expected_order())
+
+    def test_previous_link_returns_the_earlier_page(self):
+        first = self.client.get(self.list_url, {'page_size': 3})
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual(self.usernames(back), self.usernames(first))
+        self.assertIsNone(back.data['previous'])
+
+    def test_count_is_only_computed_on_request(self):
+        response = self.client.get(self.list_url)
+        self.assertNotIn('count', response.data)
+        response = self.client.get(self.list_url, {'include_count': 'true'})
+        self.assertEqual(response.data['count'], 7)
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(self.list_url, {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+class ClaimsAuthenticationTests(APITestCase):
+    def setUp(self):
+        user_status_cache.clear()
+        self.user = User.objects.create_user(
+            username='doctor',
+            password='doctorpass123',
+            user_type='doctor'
+        )
+        self.specializations_url = reverse('specialization-list')
+
+    def login(self, password='doctorpass123'):
+        response = self.client.post(reverse('token_obtain_pair'), {
+            'username': 'doctor',
+            'password': password
+        }, format='json')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        return response.data
+
+    def user_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.specializations_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [query for query in queries if 'users_user' in query['sql']]
+
+    def test_token_carries_role_claims(self):
+        token = AccessToken(self.login()['access'])
+        self.assertEqual(token['user_type'], 'doctor')
+        self.assertFalse(token['is_staff'])
+
+    def test_user_row_is_checked_once_per_ttl(self):
+        self.login()
+        self.assertEqual(len(self.user_queries()), 1)
+        self.assertEqual(self.user_queries(), [])
+
+    def test_deactivated_users_are_rejected(self):
+        self.login()
+        self.user_queries()
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get(self.specializations_url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_password_change_revokes_tokens(self):
+        tokens = self.login()
+        self.user.set_password('newpass456')
+        self.user.save()
+        response = self.client.get(self.specializations_url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.post(reverse('token_refresh'), {'refresh': tokens['refresh']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_refresh_picks_up_role_changes(self):
+        tokens = self.login()
+        self.user.user_type = 'admin'
+        self.user.save()
+        self.assertEqual(self.client.get(self.specializations_url).status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.post(reverse('token_refresh'), {'refresh': tokens['refresh']}, format='json')
+        self.assertEqual(AccessToken(response.data['access'])['user_type'], 'admin')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        self.assertEqual(self.client.get(self.specializations_url).status_code, status.HTTP_200_OK)
+
+    def test_profile_edits_keep_the_cached_status(self):
+        self.login()
+        self.user_queries()
+        self.user.first_name = 'Amina'
+        self.user.save()
+        self.assertEqual(self.user_queries(), [])
+
+    def test_refresh_is_served_from_the_status_cache(self):
+        tokens = self.login()
+        self.user_queries()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('token_refresh'), {'refresh': tokens['refresh']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(AccessToken(response.data['access'])['username'], 'doctor')
+
+    def test_tokens_without_claims_fall_back_to_the_database(self):
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        response = self.client.get(reverse('user-profile'))
+        self.assertEqual(response.data['username'], 'doctor')
@@ -1,13 +1,11 @@
 from django.urls import path
-from rest_framework_simplejwt.views import (
-    TokenObtainPairView,
-    TokenRefreshView,
-)
 from .views import (
     UserRegistrationView,
     UserProfileView,
     UserProfileUpdateView,
     UserListView,
+    HealthcareTokenObtainPairView,
+    HealthcareTokenRefreshView,
 )
 
 urlpatterns = [
@@ -17,6 +15,6 @@ urlpatterns = [
     path('list/', UserListView.as_view(), name='user-list'),
     
     # JWT Authentication
-    path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
-    path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('token/', HealthcareTokenObtainPairView.as_view(), name='token_obtain_pair'),
+    path('token/refresh/', HealthcareTokenRefreshView.as_view(), name='token_refresh'),
 ] 
\ No newline at end of file
@@ -2,12 +2,17 @@ from django.shortcuts import render
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework_simplejwt.views import TokenObtainPairView
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from django.contrib.auth import get_user_model
+from healthcaresystem.fastlist import FastListMixin
+from healthcaresystem.fieldsets import SparseFieldsetViewMixin
+from healthcaresystem.pagination import KeysetPagination
 from .serializers import (
     UserSerializer,
     UserRegistrationSerializer,
-    UserProfileUpdateSerializer
+    UserProfileUpdateSerializer,
+    HealthcareTokenObtainPairSerializer,
+    HealthcareTokenRefreshSerializer
 )
 
 User = get_user_model()
@@ -22,19 +27,27 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
     serializer_class = UserSerializer
 
     def get_object(self):
-        return self.request.user
+        # request.user may be a claims-only TokenUser
+        return User.objects.get(pk=self.request.user.pk)
 
 class UserProfileUpdateView(generics.UpdateAPIView):
     permission_classes = (permissions.IsAuthenticated,)
     serializer_class = UserProfileUpdateSerializer
 
     def get_object(self):
-        return self.request.user
+        return User.objects.get(pk=self.request.user.pk)
 
-class UserListView(generics.ListAPIView):
+class UserListView(FastListMixin, SparseFieldsetViewMixin, generics.ListAPIView):
     permission_classes = (permissions.IsAdminUser,)
     queryset = User.objects.all()
     serializer_class = UserSerializer
+    pagination_class = KeysetPagination
     filterset_fields = ['user_type']
     search_fields = ['username', 'email', 'first_name', 'last_name']
     ordering_fields = ['created_at', 'username']
+
+class HealthcareTokenObtainPairView(TokenObtainPairView):
+    serializer_class = HealthcareTokenObtainPairSerializer
+
+class HealthcareTokenRefreshView(TokenRefreshView):
+    serializer_class = HealthcareTokenRefreshSerializer